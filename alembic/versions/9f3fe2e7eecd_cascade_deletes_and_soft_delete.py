@@ -0,0 +1,41 @@
+"""cascade deletes and soft delete
+
+Revision ID: 9f3fe2e7eecd
+Revises: 9c4f1e6a2d58
+Create Date: 2026-10-18 21:22:51.435053
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '9f3fe2e7eecd'
+down_revision = '9c4f1e6a2d58'
+branch_labels = None
+depends_on = None
+
+# names of the unnamed owner_id foreign keys, Postgres' own, SQLite tables are recreated with the batch naming convention
+naming_convention = {"fk": "%(table_name)s_%(column_0_name)s_fkey"}
+
+
+def replace_owner_fk(table: str, ondelete: str | None) -> None:
+    with op.batch_alter_table(table, naming_convention=naming_convention) as batch_op:
+        batch_op.drop_constraint(f'{table}_owner_id_fkey', type_='foreignkey')
+        batch_op.create_foreign_key(f'{table}_owner_id_fkey', 'users', ['owner_id'], ['id'], ondelete=ondelete)
+
+
+def upgrade() -> None:
+    op.add_column('documents', sa.Column('deleted_at', sa.DateTime(), nullable=True))
+    op.create_index(op.f('ix_documents_deleted_at'), 'documents', ['deleted_at'], unique=False)
+    op.add_column('users', sa.Column('deleted_at', sa.DateTime(), nullable=True))
+    replace_owner_fk('documents', 'CASCADE')
+    replace_owner_fk('jobs', 'CASCADE')
+
+
+def downgrade() -> None:
+    replace_owner_fk('jobs', None)
+    replace_owner_fk('documents', None)
+    op.drop_column('users', 'deleted_at')
+    op.drop_index(op.f('ix_documents_deleted_at'), table_name='documents')
+    op.drop_column('documents', 'deleted_at')
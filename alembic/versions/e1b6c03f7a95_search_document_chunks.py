@@ -0,0 +1,47 @@
+"""search document_chunks
+
+Revision ID: e1b6c03f7a95
+Revises: c8d2f4a61b07
+Create Date: 2026-10-18 14:21:37.905512
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'e1b6c03f7a95'
+down_revision = 'c8d2f4a61b07'
+branch_labels = None
+depends_on = None
+
+# must match pdf_api.models.SEARCH_CONFIG
+SEARCH_CONFIG = 'english'
+
+
+def upgrade() -> None:
+    if op.get_bind().dialect.name == 'postgresql':
+        op.execute(
+            "CREATE INDEX ix_document_chunks_search ON document_chunks "
+            f"USING gin (to_tsvector('{SEARCH_CONFIG}'::regconfig, string))"
+        )
+    elif op.get_bind().dialect.name == 'sqlite':
+        op.execute("CREATE VIRTUAL TABLE document_chunks_fts USING fts5(string, content='document_chunks', content_rowid='rowid')")
+        op.execute(
+            "CREATE TRIGGER document_chunks_fts_insert AFTER INSERT ON document_chunks BEGIN "
+            "INSERT INTO document_chunks_fts(rowid, string) VALUES (new.rowid, new.string); END"
+        )
+        op.execute(
+            "CREATE TRIGGER document_chunks_fts_delete AFTER DELETE ON document_chunks BEGIN "
+            "INSERT INTO document_chunks_fts(document_chunks_fts, rowid, string) VALUES ('delete', old.rowid, old.string); END"
+        )
+        op.execute("INSERT INTO document_chunks_fts(document_chunks_fts) VALUES ('rebuild')")
+
+
+def downgrade() -> None:
+    if op.get_bind().dialect.name == 'postgresql':
+        op.drop_index('ix_document_chunks_search', table_name='document_chunks')
+    elif op.get_bind().dialect.name == 'sqlite':
+        op.execute("DROP TRIGGER document_chunks_fts_delete")
+        op.execute("DROP TRIGGER document_chunks_fts_insert")
+        op.execute("DROP TABLE document_chunks_fts")
@@ -0,0 +1,5 @@
+import sys
+
+from benchmarks.parser import main
+
+sys.exit(main())
@@ -0,0 +1,116 @@
+import os
+import random
+from dataclasses import dataclass
+
+import pikepdf
+from pikepdf import Dictionary, Name
+
+STANDARD_FONTS = (
+    "Helvetica",
+    "Helvetica-Bold",
+    "Helvetica-Oblique",
+    "Times-Roman",
+    "Times-Bold",
+    "Times-Italic",
+    "Courier",
+    "Courier-Bold",
+)
+
+WORDS = (
+    "data survey variable question answer country wave value weight sample study respondent people "
+    "government work family religion trust society politics income education health age year the of "
+    "and to in is that for on with as by at from not or which are be this have an"
+).split()
+
+
+@dataclass
+class Shape:
+    """
+    Kind of document in the benchmark corpus.
+    """
+
+    name: str
+    pages: int
+    page_size: tuple[int, int] = (612, 792)
+    columns: int = 1
+    fonts: int = 1
+    font_size: int = 10
+    line_chars: int = 90
+
+    @property
+    def lines(self) -> int:
+        return int((self.page_size[1] - 100) / (self.font_size * 1.2))
+
+
+SHAPES = (
+    Shape("dense-1", pages=1),
+    Shape("dense-10", pages=10),
+    Shape("dense-200", pages=200),
+    Shape("dense-2000", pages=2000),
+    Shape("fonts-50", pages=50, fonts=len(STANDARD_FONTS)),
+    Shape("headings-50", pages=50, fonts=2, font_size=14, line_chars=60),
+    Shape("columns-50", pages=50, columns=3, line_chars=28),
+    Shape("huge-page", pages=1, page_size=(3000, 3000), line_chars=450),
+)
+
+
+def _line(rnd: random.Random, chars: int) -> str:
+    words = []
+    length = 0
+    while length < chars:
+        word = rnd.choice(WORDS)
+        words.append(word)
+        length += len(word) + 1
+    return " ".join(words)
+
+
+def _content(shape: Shape, rnd: random.Random) -> bytes:
+    width, height = shape.page_size
+    column_width = (width - 100) / shape.columns
+    leading = shape.font_size * 1.2
+
+    ops = []
+    for column in range(shape.columns):
+        ops.append(f"BT {50 + column * column_width:.1f} {height - 50 - shape.font_size} Td {leading:.1f} TL")
+        for n in range(shape.lines):
+            font = rnd.randrange(shape.fonts) if n % 10 == 0 else 0
+            size = shape.font_size + 4 if font else shape.font_size
+            ops.append(f"/F{font} {size} Tf ({_line(rnd, shape.line_chars)}) Tj T*")
+        ops.append("ET")
+
+    return "\n".join(ops).encode("latin-1")
+
+
+def generate(shape: Shape, path: str, seed: int = 0):
+    """
+    Writes a PDF of the given shape to path, the same shape and seed always give the same file.
+    """
+    rnd = random.Random(f"{shape.name}-{seed}")
+    pdf = pikepdf.new()
+    fonts = Dictionary(
+        {
+            f"/F{i}": pdf.make_indirect(
+                Dictionary(Type=Name.Font, Subtype=Name.Type1, BaseFont=Name("/" + font), Encoding=Name.WinAnsiEncoding)
+            )
+            for i, font in enumerate(STANDARD_FONTS[: shape.fonts])
+        }
+    )
+
+    for _ in range(shape.pages):
+        page = pdf.add_blank_page(page_size=shape.page_size)
+        page.Resources = Dictionary(Font=fonts)
+        page.Contents = pdf.make_stream(_content(shape, rnd))
+
+    pdf.save(path, deterministic_id=True)
+
+
+def ensure(shape: Shape, directory: str) -> str:
+    """
+    Returns path of the corpus document of the given shape, generating it if needed.
+    """
+    os.makedirs(directory, exist_ok=True)
+    path = os.path.join(directory, f"{shape.name}.pdf")
+    if not os.path.exists(path):
+        generate(shape, f"{path}.tmp")
+        os.replace(f"{path}.tmp", path)
+    return path
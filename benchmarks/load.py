@@ -0,0 +1,221 @@
+"""
+HTTP load test
+
+Replays a weighted mix of requests at a fixed concurrency and reports latency percentiles,
+throughput and error rate per endpoint. Runs the app in-process on SQLite unless --url is given.
+
+    python -m benchmarks.load --concurrency 32 --duration 30 --mix auth=10,list=5,get=5,parse=1,upload=1
+    python -m benchmarks.load --url http://localhost:8080 --output load.json
+"""
+import os
+import sys
+import json
+import math
+import time
+import random
+import asyncio
+import argparse
+import tempfile
+from collections import defaultdict
+
+import httpx
+
+from benchmarks.corpus import SHAPES, ensure
+
+DEFAULT_MIX = "auth=10,list=5,get=5,parse=1,upload=1"
+
+
+def percentile(latencies: list[float], p: float) -> float:
+    """
+    Nearest-rank percentile of sorted latencies.
+    """
+    return latencies[max(0, math.ceil(p / 100 * len(latencies)) - 1)]
+
+
+class LoadTest:
+    """
+    Drives the API with `concurrency` clients sending requests picked from `mix` by weight.
+
+    Each operation is recorded under its endpoint with latency and whether it failed.
+    """
+
+    def __init__(
+        self, client: httpx.AsyncClient, mix: dict[str, int], pdf: bytes, users: int, unique_uploads: bool, seed: int = 0
+    ):
+        self.client = client
+        self.mix = mix
+        self.pdf = pdf
+        self.users = users
+        self.unique_uploads = unique_uploads
+        self.rnd = random.Random(seed)
+        self.uploads = 0
+        self.sessions = []
+        self.document_ids = []
+        self.latencies = defaultdict(list)
+        self.errors = defaultdict(int)
+
+    async def setup(self):
+        """
+        Creates users, each with one public document to read.
+        """
+        for n in range(self.users):
+            response = await self.client.post("/user/new", data={"username": f"load{n}"})
+            response.raise_for_status()
+            session = (int(response.cookies["uid"]), {"Cookie": f"jwt_token={response.cookies['jwt_token']}"})
+            self.sessions.append(session)
+
+            response = await self.upload(session)
+            response.raise_for_status()
+            uid, headers = session
+            response = await self.client.get(f"/user/{uid}/documents", headers=headers, params={"limit": 1})
+            self.document_ids.extend(d["id"] for d in response.json()["documents"])
+
+    def upload_file(self) -> dict:
+        content = self.pdf
+        if self.unique_uploads:
+            # trailing comment changes the hash, not the document, so parse cache does not hit
+            self.uploads += 1
+            content += f"\n%{self.uploads}\n".encode()
+        return {"file": ("load.pdf", content, "application/pdf")}
+
+    async def upload(self, session) -> httpx.Response:
+        _, headers = session
+        return await self.client.post("/document/new", params={"public": True}, headers=headers, files=self.upload_file())
+
+    async def request(self, op: str) -> tuple[str, httpx.Response]:
+        session = self.rnd.choice(self.sessions)
+        uid, headers = session
+
+        if op == "auth":
+            return "GET /user/{id}", await self.client.get(f"/user/{uid}", headers=headers)
+        if op == "list":
+            return "GET /documents", await self.client.get("/documents", headers=headers, params={"limit": 100})
+        if op == "get":
+            document_id = self.rnd.choice(self.document_ids)
+            return "GET /document/{id}", await self.client.get(f"/document/{document_id}", headers=headers)
+        if op == "parse":
+            return "POST /pdf_text_chunks", await self.client.post("/pdf_text_chunks", files=self.upload_file())
+        if op == "upload":
+            return "POST /document/new", await self.upload(session)
+        raise ValueError(f"Unknown operation {op!r}")
+
+    async def worker(self, deadline: float):
+        ops, weights = zip(*self.mix.items())
+        while time.monotonic() < deadline:
+            op = self.rnd.choices(ops, weights)[0]
+            timer_start = time.perf_counter()
+            try:
+                endpoint, response = await self.request(op)
+                failed = response.status_code >= 400
+            except httpx.HTTPError:
+                endpoint, failed = op, True
+            self.latencies[endpoint].append(time.perf_counter() - timer_start)
+            self.errors[endpoint] += failed
+
+    async def run(self, concurrency: int, duration_s: float) -> dict:
+        deadline = time.monotonic() + duration_s
+        timer_start = time.perf_counter()
+        await asyncio.gather(*(self.worker(deadline) for _ in range(concurrency)))
+        elapsed_s = time.perf_counter() - timer_start
+
+        return {
+            "concurrency": concurrency,
+            "duration_s": round(elapsed_s, 2),
+            "endpoints": {endpoint: self.summary(endpoint, elapsed_s) for endpoint in sorted(self.latencies)},
+        }
+
+    def summary(self, endpoint: str, elapsed_s: float) -> dict:
+        latencies = sorted(self.latencies[endpoint])
+        return {
+            "requests": len(latencies),
+            "rps": round(len(latencies) / elapsed_s, 2),
+            "error_rate": round(self.errors[endpoint] / len(latencies), 4),
+            "p50_ms": round(percentile(latencies, 50) * 1000, 1),
+            "p95_ms": round(percentile(latencies, 95) * 1000, 1),
+            "p99_ms": round(percentile(latencies, 99) * 1000, 1),
+        }
+
+
+def in_process_client() -> tuple[httpx.AsyncClient, callable]:
+    """
+    Returns a client calling the app in this process on a fresh SQLite database, and a function shutting it down.
+    """
+    directory = tempfile.mkdtemp(prefix="pdf_api_load_")
+    # never the configured database or directories, they would get the tables created and filled with load test data
+    os.environ["DB_DSN"] = f"sqlite:///{directory}/db.sqlite"
+    os.environ.pop("DB_ASYNC_DSN", None)
+    os.environ["PARSE_CACHE_DIR"] = os.path.join(directory, "parse_cache")
+    os.environ["JOBS_DIR"] = os.path.join(directory, "jobs")
+    os.environ.setdefault("JWT_SECRET", "load")
+    os.environ.setdefault("RATE_LIMIT_RATE", "0")  # measure the app, not its rate limits
+
+    from pdf_api.app import app, parse_pool
+    from pdf_api.db import engine
+    from pdf_api.models import Base
+
+    Base.metadata.create_all(engine)
+    client = httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://pdf_api", timeout=None)
+    return client, parse_pool.shutdown
+
+
+def parse_mix(mix: str) -> dict[str, int]:
+    return {op: int(weight) for op, weight in (item.split("=") for item in mix.split(","))}
+
+
+async def main_async(args) -> dict:
+    if args.url:
+        client, shutdown = httpx.AsyncClient(base_url=args.url, timeout=None), None
+    else:
+        client, shutdown = in_process_client()
+
+    if args.file:
+        with open(args.file, "rb") as fin:
+            pdf = fin.read()
+    else:
+        with open(ensure(SHAPES[0], args.corpus_dir), "rb") as fin:
+            pdf = fin.read()
+
+    try:
+        async with client:
+            load_test = LoadTest(client, parse_mix(args.mix), pdf, users=args.users, unique_uploads=args.unique_uploads)
+            await load_test.setup()
+            return await load_test.run(args.concurrency, args.duration)
+    finally:
+        if shutdown is not None:
+            shutdown()
+
+
+def main(argv: list[str] | None = None) -> int:
+    parser = argparse.ArgumentParser(
+        prog="python -m benchmarks.load", description=__doc__, formatter_class=argparse.RawTextHelpFormatter
+    )
+    parser.add_argument("--url", help="base URL of a running app, the app runs in-process when omitted")
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--duration", type=float, default=30, help="seconds")
+    parser.add_argument(
+        "--mix", default=DEFAULT_MIX, help=f"weights of auth, list, get, parse and upload (default: {DEFAULT_MIX})"
+    )
+    parser.add_argument("--users", type=int, default=10)
+    parser.add_argument("--file", help="PDF to upload, a generated one-page document by default")
+    parser.add_argument("--unique-uploads", action="store_true", help="make every upload miss the parse cache")
+    parser.add_argument("--output", help="file to write results to as JSON")
+    parser.add_argument("--corpus-dir", default=os.path.join(tempfile.gettempdir(), "pdf_api_bench_corpus"))
+    args = parser.parse_args(argv)
+
+    report = asyncio.run(main_async(args))
+
+    print(f"{'endpoint':<24} {'requests':>9} {'rps':>8} {'errors':>7} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8}")
+    for endpoint, stats in report["endpoints"].items():
+        print(
+            f"{endpoint:<24} {stats['requests']:>9} {stats['rps']:>8} {stats['error_rate']:>7.1%} "
+            f"{stats['p50_ms']:>8} {stats['p95_ms']:>8} {stats['p99_ms']:>8}"
+        )
+
+    if args.output:
+        with open(args.output, "w") as fout:
+            json.dump(report, fout, indent=2)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,119 @@
+"""
+Parser benchmarks
+
+    python -m benchmarks run [--only dense] [--profile fast] [--output results.json]
+    python -m benchmarks compare baseline.json results.json [--threshold 0.1]
+"""
+import os
+import sys
+import json
+import time
+import fnmatch
+import argparse
+import platform
+import resource
+import tempfile
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+
+from pdf_api.utils.pdf_parser import PdfParser
+from benchmarks.corpus import SHAPES, ensure
+
+
+def measure(path: str, engine: str, profile: str = "full") -> dict:
+    """
+    Runs in a fresh process so that peak RSS belongs to the parse alone.
+    """
+    parser = PdfParser(engine=engine, profile=profile)
+    with open(path, "rb") as fin:
+        pages = parser.count_pages(fin)
+        fin.seek(0)
+
+        stats = {}
+        timer_start = time.perf_counter()
+        chunks, _ = parser.get_text(fin, stats)
+        elapsed_s = time.perf_counter() - timer_start
+
+    return {
+        "pages": pages,
+        "chunks": len(chunks),
+        "size_b": os.path.getsize(path),
+        "elapsed_s": round(elapsed_s, 4),
+        "pages_per_s": round(pages / elapsed_s, 2),
+        "peak_rss_mb": round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1),
+        "stages": {key: round(seconds, 4) for key, seconds in stats.items() if key.endswith("_s")},
+    }
+
+
+def run(args) -> int:
+    shapes = [shape for shape in SHAPES if any(fnmatch.fnmatch(shape.name, f"*{pattern}*") for pattern in args.only or ["*"])]
+    results = {}
+
+    for shape in shapes:
+        path = ensure(shape, args.corpus_dir)
+        runs = []
+        for _ in range(args.repeat):
+            with ProcessPoolExecutor(max_workers=1, mp_context=multiprocessing.get_context("spawn")) as executor:
+                runs.append(executor.submit(measure, path, args.engine, args.profile).result())
+        results[shape.name] = min(runs, key=lambda result: result["elapsed_s"])
+        print(
+            f"{shape.name:<12} {results[shape.name]['pages_per_s']:>8} pages/s {results[shape.name]['peak_rss_mb']:>8} MB",
+            file=sys.stderr,
+        )
+
+    report = {
+        "settings": PdfParser(engine=args.engine, profile=args.profile).settings,
+        "python": platform.python_version(),
+        "machine": platform.machine(),
+        "results": results,
+    }
+    content = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, "w") as fout:
+            fout.write(content)
+    else:
+        print(content)
+    return 0
+
+
+def compare(args) -> int:
+    with open(args.baseline) as fin:
+        baseline = json.load(fin)["results"]
+    with open(args.current) as fin:
+        current = json.load(fin)["results"]
+
+    regressions = 0
+    for name in sorted(baseline.keys() & current.keys()):
+        before, after = baseline[name], current[name]
+        throughput = after["pages_per_s"] / before["pages_per_s"] - 1
+        memory = after["peak_rss_mb"] / before["peak_rss_mb"] - 1
+        regressed = throughput < -args.threshold or memory > args.threshold
+        regressions += regressed
+        print(f"{name:<12} pages/s {throughput:+7.1%}  peak RSS {memory:+7.1%}{'  REGRESSION' if regressed else ''}")
+
+    return 1 if regressions else 0
+
+
+def main(argv: list[str] | None = None) -> int:
+    parser = argparse.ArgumentParser(
+        prog="python -m benchmarks", description=__doc__, formatter_class=argparse.RawTextHelpFormatter
+    )
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    run_parser = commands.add_parser("run", help="parse the corpus and write results as JSON")
+    run_parser.add_argument("--only", action="append", help="run shapes whose name contains this, may repeat")
+    run_parser.add_argument("--engine", default="layout", choices=PdfParser.ENGINES)
+    run_parser.add_argument("--profile", default="full", choices=PdfParser.PROFILES)
+    run_parser.add_argument("--repeat", type=int, default=1, help="runs per document, the fastest is reported")
+    run_parser.add_argument("--output", help="file to write results to, stdout by default")
+    run_parser.add_argument("--corpus-dir", default=os.path.join(tempfile.gettempdir(), "pdf_api_bench_corpus"))
+    run_parser.set_defaults(func=run)
+
+    compare_parser = commands.add_parser("compare", help="exit with 1 when results regressed from the baseline")
+    compare_parser.add_argument("baseline")
+    compare_parser.add_argument("current")
+    compare_parser.add_argument("--threshold", type=float, default=0.1, help="allowed relative regression (default: 0.1)")
+    compare_parser.set_defaults(func=compare)
+
+    args = parser.parse_args(argv)
+    return args.func(args)
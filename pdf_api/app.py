@@ -1,37 +1,360 @@
+import gzip
+import json
+import math
+import time
+import asyncio
+import zipfile
+import contextlib
 import secrets
-import hashlib
 import datetime as dt
 
-from typing import Annotated
+from typing import Annotated, Any, AsyncIterator
 
 from logging import getLogger
 
-from fastapi import FastAPI, UploadFile, Depends, Form
+from fastapi import FastAPI, UploadFile, Depends, Form, Query
 from fastapi import Request, Response, status, HTTPException
+from fastapi.responses import JSONResponse, StreamingResponse
+from fastapi.encoders import jsonable_encoder
+from prometheus_client import CONTENT_TYPE_LATEST
+from fastapi.concurrency import run_in_threadpool
 
-from slowapi import Limiter, _rate_limit_exceeded_handler
-from slowapi.errors import RateLimitExceeded
-
-from sqlalchemy import select, or_
-from sqlalchemy.orm import defer
+from sqlalchemy import select, update, delete, union_all
+from sqlalchemy.ext.asyncio import AsyncSession
 
 import jwt
 
-from pdf_api.utils.pdf_parser import PdfParser
-from pdf_api.config import JWT_SECRET
-from pdf_api.db import Session
+from pdf_api.parse_pool import ParsePool, ParsePoolFull, ParseWorkerLost, truncation
+from pdf_api.parse_cache import ParseCache, file_digest
+from pdf_api.page_cache import parse_incremental
+from pdf_api.utils.pdf_parser import PdfParser, PageRanges, ParseBudgetExceeded
+from pdf_api.jobs import JobRunner
+from pdf_api.auth_cache import AuthCache
+from pdf_api.rate_limit import RateLimiter
+from pdf_api.compression import CompressionMiddleware
+from pdf_api.formats import response_format, format_chunks, render
+from pdf_api.uploads import UploadSizeLimit, too_large, is_zip, zip_entries
+from pdf_api.documents import add_document, add_documents, get_chunks, listing_cursor, after_cursor
+from pdf_api.documents import export_documents, import_documents, readable_by, owned_by
+from pdf_api.purge import Purger, soft_delete_user
+from pdf_api.search import search_query
+from pdf_api import metrics
+from pdf_api.metrics import StageTimer
+from pdf_api.config import JWT_SECRET, PDF_PARSER_ENGINE, PARSE_PROFILE
+from pdf_api.config import PARSE_WORKERS, PARSE_QUEUE_LIMIT, PARSE_SPLIT_PAGES, PARSE_SPLIT_RANGES
+from pdf_api.config import PARSE_DEADLINE_S, PARSE_PAGE_GLYPHS, PARSE_KILL_GRACE_S
+from pdf_api.config import PARSE_CACHE_BYTES, PARSE_CACHE_DIR, PARSE_CACHE_DISK_BYTES, PARSE_PAGE_CACHE
+from pdf_api.config import JOBS_DIR, JOB_WORKERS, JOB_STALE_S
+from pdf_api.config import AUTH_CACHE_SIZE, AUTH_CACHE_TTL_S
+from pdf_api.config import RATE_LIMIT_RATE, RATE_LIMIT_BURST
+from pdf_api.config import UPLOAD_MAX_BYTES, UPLOAD_MAX_PAGES, BATCH_MAX_FILES
+from pdf_api.config import SOFT_DELETE, PURGE_BATCH, PURGE_INTERVAL_S
+from pdf_api.config import COMPRESS_MIN_BYTES
+from pdf_api.db import Session, get_session, async_session, pool_stats, engine, async_engine
 from pdf_api.models import User
 from pdf_api.models import Document
+from pdf_api.models import Job
 
 log = getLogger(__name__)
 
-limiter = Limiter(lambda: "any")
+# seconds between checks whether the client of a parse is still connected, status of responses nobody receives
+DISCONNECT_POLL_S = 1.0
+CLIENT_CLOSED_REQUEST = 499
+
+DbSession = Annotated[AsyncSession, Depends(get_session)]
+
 app = FastAPI()
 
-app.state.limiter = limiter
-app.add_exception_handler(RateLimitExceeded, _rate_limit_exceeded_handler)
+app.add_middleware(UploadSizeLimit, max_bytes=UPLOAD_MAX_BYTES)
+app.add_middleware(CompressionMiddleware, minimum_size=COMPRESS_MIN_BYTES)
+
+parse_pool = ParsePool(
+    workers=PARSE_WORKERS,
+    queue_limit=PARSE_QUEUE_LIMIT,
+    engine=PDF_PARSER_ENGINE,
+    profile=PARSE_PROFILE,
+    split_pages=PARSE_SPLIT_PAGES,
+    split_ranges=PARSE_SPLIT_RANGES,
+    page_glyphs=PARSE_PAGE_GLYPHS,
+    kill_grace_s=PARSE_KILL_GRACE_S,
+)
+parse_cache = ParseCache(max_bytes=PARSE_CACHE_BYTES, directory=PARSE_CACHE_DIR, max_disk_bytes=PARSE_CACHE_DISK_BYTES)
+job_runner = JobRunner(
+    parse_pool, parse_cache, directory=JOBS_DIR, workers=JOB_WORKERS, stale_s=JOB_STALE_S, deadline_s=PARSE_DEADLINE_S
+)
+auth_cache = AuthCache(max_entries=AUTH_CACHE_SIZE, ttl_s=AUTH_CACHE_TTL_S)
+rate_limiter = RateLimiter(async_engine, rate=RATE_LIMIT_RATE, burst=RATE_LIMIT_BURST)
+purger = Purger(batch_size=PURGE_BATCH, interval_s=PURGE_INTERVAL_S)
+
+metrics.track_db_time(async_engine.sync_engine)
+
+
+@app.middleware("http")
+async def record_metrics(request: Request, call_next):
+    db_time = metrics.begin_request()
+    timer_start = time.perf_counter()
+
+    response = await call_next(request)
+
+    elapsed_s = time.perf_counter() - timer_start
+    endpoint = next((route.path for route in app.routes if route.endpoint is request.scope.get("endpoint")), "unmatched")
+    metrics.REQUEST_DURATION.labels(request.method, endpoint, response.status_code).observe(elapsed_s)
+    metrics.REQUEST_DB_DURATION.labels(request.method, endpoint).observe(db_time[0])
+    if "content-length" in request.headers:
+        metrics.REQUEST_BYTES.labels(endpoint).inc(int(request.headers["content-length"]))
+    if "content-length" in response.headers:
+        metrics.RESPONSE_BYTES.labels(endpoint).inc(int(response.headers["content-length"]))
+
+    return response
+
+
+@app.exception_handler(ParsePoolFull)
+async def parse_pool_full_handler(request: Request, exc: ParsePoolFull):
+    log.warning("Parse queue full: %s", exc)
+    return JSONResponse(
+        status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+        content={"detail": "Too many documents being parsed, try again later"},
+        headers={"Retry-After": "5"},
+    )
+
+
+@app.exception_handler(ParseWorkerLost)
+async def parse_worker_lost_handler(request: Request, exc: ParseWorkerLost):
+    log.error("Parser process died: %s", exc)
+    return JSONResponse(
+        status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+        content={"detail": "Parser process died while parsing, try again later"},
+    )
+
+
+@app.exception_handler(ParseBudgetExceeded)
+async def parse_budget_exceeded_handler(request: Request, exc: ParseBudgetExceeded):
+    return JSONResponse(
+        status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
+        content={"detail": f"Could not read pages of the PDF file within the parse budget: {exc.reason}"},
+    )
+
+
+@app.on_event("startup")
+async def start_job_runner():
+    job_runner.start()
+    if SOFT_DELETE:
+        purger.start()
+
+
+@app.on_event("shutdown")
+async def shutdown_parse_pool():
+    await job_runner.stop()
+    await purger.stop()
+    parse_pool.shutdown()
+
+
+def page_ranges(pages: str | None, max_pages: int | None) -> PageRanges | None:
+    try:
+        return PageRanges.parse(pages, max_pages)
+    except ValueError:
+        detail = f"Invalid pages {pages!r}" + (f" with max_pages={max_pages}" if max_pages else "")
+        raise HTTPException(status_code=status.HTTP_422_UNPROCESSABLE_ENTITY, detail=detail)
+
+
+def extraction_profile(profile: str | None) -> str:
+    if profile is None:
+        return parse_pool.profile
+    if profile not in PdfParser.PROFILES:
+        raise HTTPException(
+            status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
+            detail=f"Unknown profile {profile!r}, expected one of {', '.join(PdfParser.PROFILES)}",
+        )
+    return profile
+
+
+def parse_deadline(timeout_s: float | None = None) -> float | None:
+    """
+    Returns time.time() a parse starting now stops at, after timeout_s or PARSE_DEADLINE_S seconds, whichever is sooner.
+    """
+    limits = [seconds for seconds in (timeout_s, PARSE_DEADLINE_S) if seconds]
+    return time.time() + min(limits) if limits else None
+
+
+async def until_disconnected(request: Request, awaitable):
+    """
+    Awaits awaitable, cancelling it when the client disconnects first, which stops the parse it runs.
+    """
+    task = asyncio.ensure_future(awaitable)
+    while not (await asyncio.wait({task}, timeout=DISCONNECT_POLL_S))[0]:
+        if await request.is_disconnected():
+            task.cancel()
+            with contextlib.suppress(asyncio.CancelledError):
+                await task
+            raise HTTPException(status_code=CLIENT_CLOSED_REQUEST, detail="Client disconnected")
+    return task.result()
+
+
+async def check_pages(fileobj, pages: PageRanges | None = None, deadline: float | None = None) -> int | None:
+    """
+    Rejects uploads with more than UPLOAD_MAX_PAGES pages to parse before they are parsed.
+    Pages not counted by the deadline raise ParseBudgetExceeded.
+
+    Returns the number of pages of the file, None when they were not counted
+    """
+    if not UPLOAD_MAX_PAGES or (pages is not None and pages.stop <= UPLOAD_MAX_PAGES):
+        return None
+    if (page_count := await parse_pool.count_pages(fileobj, deadline)) > UPLOAD_MAX_PAGES:
+        raise too_large(f"Upload has {page_count} pages, at most {UPLOAD_MAX_PAGES} are accepted")
+    return page_count
+
 
-pdf_parser = PdfParser()
+def rate_limit_key(request: Request) -> str:
+    """
+    Returns the key of the client's token bucket, by user id when the request has a valid JWT, by address otherwise.
+    """
+    encoded_jwt = request.cookies.get("jwt_token")
+    if encoded_jwt:
+        try:
+            return f"user:{jwt.decode(encoded_jwt, key=JWT_SECRET, algorithms='HS256')['user_id']}"
+        except (jwt.exceptions.DecodeError, KeyError):
+            pass
+    return f"ip:{request.client.host if request.client else 'unknown'}"
+
+
+async def rate_limited(request: Request) -> str:
+    """
+    Takes a token from the client's bucket or rejects the request with 429.
+
+    Returns the bucket key, to charge work done by the request to.
+    """
+    key = rate_limit_key(request)
+    if retry_after_s := await rate_limiter.acquire(key):
+        raise HTTPException(
+            status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+            detail="Rate limit exceeded, try again later",
+            headers={"Retry-After": str(math.ceil(retry_after_s))},
+        )
+    return key
+
+
+RateLimitKey = Annotated[str, Depends(rate_limited)]
+
+
+async def parse_upload(
+    fileobj,
+    timer: StageTimer,
+    pages: PageRanges | None = None,
+    profile: str | None = None,
+    rate_key: str | None = None,
+    deadline: float | None = None,
+) -> tuple[list[dict], float, dict, bytes]:
+    """
+    Parses uploaded PDF file, or only the given pages of it, with the extraction profile unless a result
+    for the same content, pages and parser settings is cached. Whole files with PARSE_PAGE_CACHE enabled reuse
+    cached results of pages seen before. Time spent in each stage is added to the timer,
+    pages parsed are charged to the rate_key bucket. The parse stops at the deadline, by default PARSE_DEADLINE_S
+    from when it starts, truncated results are not cached.
+
+    Returns chunks, elapsed seconds, parse metadata and SHA-256 digest of the file
+    """
+    timer_start = time.perf_counter()
+
+    with timer.stage("hash"):
+        digest = await run_in_threadpool(file_digest, fileobj)
+    profile = profile or parse_pool.profile
+    key = parse_cache.key(digest, parse_pool.settings_for(profile), pages)
+    selection = {"profile": profile, **({} if pages is None else {"pages": str(pages)})}
+
+    with timer.stage("cache"):
+        chunks = await run_in_threadpool(parse_cache.get, key)
+    if chunks is not None:
+        metrics.PARSE_CACHE_LOOKUPS.labels("hit").inc()
+        return chunks, (time.perf_counter() - timer_start), {"cached": True, **selection}, digest
+    metrics.PARSE_CACHE_LOOKUPS.labels("miss").inc()
+
+    deadline = parse_deadline() if deadline is None else deadline
+    await check_pages(fileobj, pages, deadline)
+    with timer.stage("parse"):
+        if PARSE_PAGE_CACHE and pages is None and parse_pool.parses_pages(profile):
+            chunks, elapsed_s, parse_metadata = await parse_incremental(parse_pool, parse_cache, fileobj, profile, deadline)
+        else:
+            chunks, elapsed_s, parse_metadata = await parse_pool.get_text(fileobj, pages, profile, deadline)
+    stats = parse_metadata.pop("stats")
+    timer.add(stats)
+    metrics.PAGES.inc(stats.get("pages", 0))
+    metrics.CHUNKS.inc(len(chunks))
+    if rate_key is not None:
+        await rate_limiter.charge(rate_key, stats.get("pages", 0))
+
+    if not parse_metadata.get("truncated"):
+        with timer.stage("cache"):
+            await run_in_threadpool(parse_cache.put, key, chunks)
+
+    return chunks, elapsed_s, {"cached": False, **selection, **parse_metadata}, digest
+
+
+def ndjson(items: list[dict]) -> bytes:
+    return b"".join(json.dumps(item, ensure_ascii=False, separators=(",", ":")).encode() + b"\n" for item in items)
+
+
+async def prepended(first: bytes, lines: AsyncIterator[bytes]) -> AsyncIterator[bytes]:
+    yield first
+    async for line in lines:
+        yield line
+
+
+async def stream_upload(
+    file: UploadFile,
+    pages: PageRanges | None = None,
+    profile: str | None = None,
+    rate_key: str | None = None,
+    deadline: float | None = None,
+) -> AsyncIterator[bytes]:
+    """
+    Yields NDJSON lines of chunks as pages of the uploaded PDF file, or the given pages of it, get parsed
+    with the extraction profile, followed by a metadata trailer. Pages parsed are charged to the rate_key bucket.
+    The parse stops at the deadline or when the client goes away.
+
+    A parser slot is held from before the first line, which raises ParsePoolFull when there is none.
+    """
+    profile = profile or parse_pool.profile
+    timer_start = time.perf_counter()
+    timer = StageTimer()
+
+    with timer.stage("hash"):
+        digest = await run_in_threadpool(file_digest, file.file)
+    key = parse_cache.key(digest, parse_pool.settings_for(profile), pages)
+    with timer.stage("cache"):
+        chunks = await run_in_threadpool(parse_cache.get, key)
+    cached = chunks is not None
+    metrics.PARSE_CACHE_LOOKUPS.labels("hit" if cached else "miss").inc()
+
+    truncated = {}
+    if cached:
+        for start in range(0, len(chunks), 1000):
+            yield ndjson(chunks[start : start + 1000])
+    else:
+        chunks = []
+        stats = {}
+        with parse_pool.slot(), timer.stage("parse"):
+            async for page_chunks in parse_pool.iter_text(file.file, pages, profile, deadline, stats, reserved=True):
+                chunks.extend(page_chunks)
+                yield ndjson(page_chunks)
+        truncated = truncation(stats)
+        metrics.CHUNKS.inc(len(chunks))
+        if rate_key is not None:
+            await rate_limiter.charge(rate_key, len({chunk["page"] for chunk in chunks} - {None}))
+        if not truncated:
+            with timer.stage("cache"):
+                await run_in_threadpool(parse_cache.put, key, chunks)
+
+    timer.observe()
+    metadata = {
+        "filesize_b": file.size,
+        "job_time_s": round(time.perf_counter() - timer_start, 2),
+        "cached": cached,
+        "profile": profile,
+        **({} if pages is None else {"pages": str(pages)}),
+        "chunks": len(chunks),
+        **truncated,
+    }
+    yield ndjson([{"metadata": metadata}])
 
 
 @app.get("/status")
@@ -39,63 +362,170 @@ async def root():
     return {"status": "OK"}
 
 
+@app.get("/status/db")
+async def db_status():
+    return {"engine": pool_stats(engine), "async_engine": pool_stats(async_engine)}
+
+
+@app.get("/metrics")
+async def metrics_get():
+    return Response(metrics.exposition(), media_type=CONTENT_TYPE_LATEST)
+
+
+@app.get("/status/cache")
+async def cache_status():
+    return {"parse": parse_cache.stats(), "auth": auth_cache.stats()}
+
+
 @app.post("/pdf_text_chunks")
-@limiter.limit("100/minute")
-async def text_chunks(request: Request, file: UploadFile):
-    chunks, elapsed_s = pdf_parser.get_text(file.file)
+async def text_chunks(
+    request: Request,
+    rate_key: RateLimitKey,
+    file: UploadFile,
+    stream: bool = False,
+    stages: bool = False,
+    pages: str | None = None,
+    max_pages: Annotated[int | None, Query(ge=1)] = None,
+    profile: str | None = None,
+    format: str | None = None,
+    timeout_s: Annotated[float | None, Query(gt=0)] = None,
+):
+    """
+    Extract text chunks
+
+    `pages` such as `1-5,10` and `max_pages` limit the pages parsed, other pages are skipped without layout analysis.
+    `profile` picks the extraction profile: `fast` extracts plain paragraphs without layout analysis,
+    font sizes or headings, `balanced` skips ordering text boxes, `full` is the complete layout analysis.
+    With `stream=true` or `Accept: application/x-ndjson` chunks are streamed as NDJSON page by page,
+    the last line holds the metadata.
+    With `stages=true` metadata holds seconds spent in each stage of the parse.
+    `format=columnar` returns chunks as an array per field, `format=msgpack` the same in MessagePack.
+    Parses stop after `timeout_s` seconds, at most PARSE_DEADLINE_S, at a page with too many glyphs
+    or when the client disconnects. Chunks of the pages parsed until then are returned with metadata
+    `truncated: true` and `truncated_reason` (`deadline`, `glyphs` or `cancelled`).
+    Requests draw from the client's rate limit bucket by pages parsed.
+    """
+    selected = page_ranges(pages, max_pages)
+    profile = extraction_profile(profile)
+    fmt = response_format(format)
+    deadline = parse_deadline(timeout_s)
+
+    if stream or "application/x-ndjson" in request.headers.get("accept", ""):
+        if fmt != "json":
+            raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=f"format={fmt} cannot be streamed")
+        await check_pages(file.file, selected, deadline)
+        lines = stream_upload(file, selected, profile, rate_key, deadline)
+        # started before the response, so that a full parser pool is a 503 instead of a cut stream
+        first = await anext(lines)
+        return StreamingResponse(prepended(first, lines), media_type="application/x-ndjson")
+
+    timer = StageTimer()
+    chunks, elapsed_s, parse_metadata, _ = await until_disconnected(
+        request, parse_upload(file.file, timer, selected, profile, rate_key, deadline)
+    )
 
-    return {
-        "metadata": {
-            "filesize_b": file.size,
-            "job_time_s": round(elapsed_s, 2),
-        },
-        "chunks": chunks,
+    metadata = {
+        "filesize_b": file.size,
+        "job_time_s": round(elapsed_s, 2),
+        **parse_metadata,
     }
+    if stages:
+        metadata["stages"] = timer.breakdown()
+
+    with timer.stage("serialize"):
+        response = render({"metadata": metadata, "chunks": format_chunks(chunks, fmt)}, fmt)
+    timer.observe()
+
+    return response
 
 
 # Auth
-async def jwt_auth_user_id(request: Request) -> Annotated[int | None, "user_id"]:
+def jwt_token(request: Request) -> dict | None:
     encoded_jwt = request.cookies.get("jwt_token")
     if not encoded_jwt:
         return None
 
     try:
-        token = jwt.decode(encoded_jwt, key=JWT_SECRET, algorithms="HS256")
+        return jwt.decode(encoded_jwt, key=JWT_SECRET, algorithms="HS256")
     except jwt.exceptions.DecodeError:
         log.error("Request containing corrupted JWT token")
         return None
 
-    with Session.begin() as sess:
-        user = sess.get(User, token["user_id"])
 
-    if (user is None) or not secrets.compare_digest(user.secret, token["secret"]):
+async def stored_user_id(sess: AsyncSession, token: dict) -> int | None:
+    """
+    Returns the id of the user the token authenticates by the database, None when it is missing, deleted or has another secret.
+    """
+    user = await sess.get(User, token["user_id"])
+    await sess.commit()  # release the connection until the handler needs one
+
+    if (user is None) or (user.deleted_at is not None) or not secrets.compare_digest(user.secret, token["secret"]):
+        auth_cache.invalidate(token["user_id"], publish=False)
         return None
 
+    auth_cache.put(user.id, user.secret)
     return user.id
 
 
+async def jwt_auth_user_id(request: Request, sess: DbSession) -> Annotated[int | None, "user_id"]:
+    token = jwt_token(request)
+    if token is None:
+        return None
+
+    cached = auth_cache.check(token["user_id"], token["secret"])
+    if cached is not None:
+        return token["user_id"] if cached else None
+
+    return await stored_user_id(sess, token)
+
+
+async def jwt_auth_stored_user_id(request: Request, sess: DbSession) -> Annotated[int | None, "user_id"]:
+    """
+    Authenticates by the database, skipping the auth cache, for requests storing rows owned by the user.
+    Other app processes keep a deleted user cached for up to AUTH_CACHE_TTL_S, rows stored for it would fail.
+    """
+    token = jwt_token(request)
+    if token is None:
+        return None
+
+    return await stored_user_id(sess, token)
+
+
 # Users
 @app.get("/users")
-async def users_get():
+async def users_get(
+    sess: DbSession,
+    after: Annotated[int, Query(ge=0)] = 0,
+    limit: Annotated[int, Query(ge=1, le=1000)] = 100,
+):
     """
     List users
     """
-    with Session.begin() as sess:
-        users = sess.execute(select(User)).scalars().fetchall()
-    return {"users": [{"user_id": user.id, "username": user.username, "created_at": user.created_at} for user in users]}
+    users = (
+        await sess.execute(
+            select(User.id, User.username, User.created_at)
+            .where(User.id > after)
+            .where(User.deleted_at.is_(None))
+            .order_by(User.id)
+            .limit(limit + 1)
+        )
+    ).fetchall()
+
+    return {
+        "users": [{"user_id": user.id, "username": user.username, "created_at": user.created_at} for user in users[:limit]],
+        "next_after": users[limit - 1].id if len(users) > limit else None,
+    }
 
 
-@app.post("/user/new")
-@limiter.limit("100/minute")
-async def user_create(request: Request, response: Response, username: Annotated[str, Form()]):
+@app.post("/user/new", dependencies=[Depends(rate_limited)])
+async def user_create(response: Response, sess: DbSession, username: Annotated[str, Form()]):
     """
     Create user
     """
     new_user = User(username=username, created_at=dt.datetime.utcnow(), secret=secrets.token_hex(32))
 
-    with Session.begin() as sess:
-        sess.add(new_user)
-        sess.commit()
+    sess.add(new_user)
+    await sess.commit()
 
     encoded_jwt = jwt.encode({"user_id": new_user.id, "secret": new_user.secret}, JWT_SECRET, algorithm="HS256")
     response.set_cookie(key="jwt_token", value=encoded_jwt)
@@ -105,9 +535,11 @@ async def user_create(request: Request, response: Response, username: Annotated[
 
 
 @app.delete("/user/{_id}")
-async def user_delete(user_id: Annotated[str, Depends(jwt_auth_user_id)], _id: int):
+async def user_delete(user_id: Annotated[str, Depends(jwt_auth_user_id)], sess: DbSession, _id: int):
     """
     Delete user
+
+    Documents and jobs of the user are deleted by the database, or with SOFT_DELETE marked deleted and purged later.
     """
     if user_id is None or (user_id != _id):
         raise HTTPException(
@@ -115,16 +547,18 @@ async def user_delete(user_id: Annotated[str, Depends(jwt_auth_user_id)], _id: i
             detail="Invalid authentication credentials",
         )
 
-    with Session.begin() as sess:
-        user = sess.get(User, user_id)
-        sess.delete(user)
-        sess.commit()
+    if SOFT_DELETE:
+        await sess.run_sync(soft_delete_user, user_id)
+    else:
+        await sess.execute(delete(User).where(User.id == user_id))
+    await sess.commit()
+    auth_cache.invalidate(user_id)
 
     return
 
 
 @app.get("/user/{_id}")
-async def user_get(user_id: Annotated[str, Depends(jwt_auth_user_id)], _id: int):
+async def user_get(user_id: Annotated[str, Depends(jwt_auth_user_id)], sess: DbSession, _id: int):
     """
     Get user details
     """
@@ -134,14 +568,22 @@ async def user_get(user_id: Annotated[str, Depends(jwt_auth_user_id)], _id: int)
             detail="Invalid authentication credentials",
         )
 
-    with Session.begin() as sess:
-        user = sess.get(User, user_id)
+    user = await sess.get(User, user_id)
+    if user is None or user.deleted_at is not None:
+        # deleted by another app process while cached by this one
+        auth_cache.invalidate(user_id, publish=False)
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="Invalid authentication credentials",
+        )
 
     return {"user": {"user_id": user.id, "username": user.username, "created_at": user.created_at}}
 
 
 @app.put("/user/{_id}/update")
-async def user_update(user_id: Annotated[str, Depends(jwt_auth_user_id)], _id: int, username: str | None = None):
+async def user_update(
+    user_id: Annotated[str, Depends(jwt_auth_stored_user_id)], sess: DbSession, _id: int, username: str | None = None
+):
     """
     Modify user
     """
@@ -151,45 +593,87 @@ async def user_update(user_id: Annotated[str, Depends(jwt_auth_user_id)], _id: i
             detail="Invalid authentication credentials",
         )
 
-    with Session.begin() as sess:
-        user = sess.get(User, user_id)
+    user = await sess.get(User, user_id)
 
-        if username is not None:
-            user.username = username
+    if username is not None:
+        user.username = username
 
-        sess.commit()
+    await sess.commit()
+    auth_cache.invalidate(user_id)
 
     return
 
 
 # Documents
-@app.get("/documents")
-async def documents_get(user_id: Annotated[str, Depends(jwt_auth_user_id)]):
-    """
-    Get all documents
-    """
-    with Session.begin() as sess:
-        documents = (
-            sess.execute(select(Document).join(User.documents).where(or_(Document.public is True, Document.owner_id == user_id)))
-            .scalars()
-            .fetchall()
-        )
+LISTED_COLUMNS = (Document.id, Document.filename, Document.submitted_at, Document.public, Document.content_size)
+
 
+def documents_listing(documents: list, limit: int) -> dict:
     return {
         "documents": [
             {
+                "id": d.id,
                 "filename": d.filename,
                 "submitted_at": d.submitted_at,
                 "public": d.public,
                 "content_size": d.content_size,
             }
-            for d in documents
-        ]
+            for d in documents[:limit]
+        ],
+        "next_after": listing_cursor(documents[limit - 1].submitted_at, documents[limit - 1].id)
+        if len(documents) > limit
+        else None,
     }
 
 
+def documents_page(query, after: str | None, limit: int):
+    """
+    Orders and limits a document listing query, continuing after the `after` cursor.
+    """
+    query = query.order_by(Document.submitted_at, Document.id).limit(limit + 1)
+    if after is not None:
+        try:
+            query = query.where(after_cursor(after))
+        except ValueError:
+            raise HTTPException(status_code=status.HTTP_422_UNPROCESSABLE_ENTITY, detail="Invalid cursor")
+    return query
+
+
+def readable_documents_page(user_id: int | None, after: str | None, limit: int):
+    """
+    Returns a page of the document listing of the user, a union of the public documents and the user's private ones,
+    so that each part is read in order from its index instead of sorting all readable documents.
+    """
+    parts = [select(*LISTED_COLUMNS).where(Document.deleted_at.is_(None)).where(Document.public.is_(True))]
+    if user_id is not None:
+        parts.append(select(*LISTED_COLUMNS).where(owned_by(user_id)).where(Document.public.is_(False)))
+    readable = union_all(*(select(documents_page(part, after, limit).subquery()) for part in parts)).subquery()
+    return select(readable).order_by(readable.c.submitted_at, readable.c.id).limit(limit + 1)
+
+
+@app.get("/documents")
+async def documents_get(
+    user_id: Annotated[str, Depends(jwt_auth_user_id)],
+    sess: DbSession,
+    after: str | None = None,
+    limit: Annotated[int, Query(ge=1, le=1000)] = 100,
+):
+    """
+    Get all documents
+    """
+    documents = (await sess.execute(readable_documents_page(user_id, after, limit))).fetchall()
+
+    return documents_listing(documents, limit)
+
+
 @app.get("/user/{_id}/documents")
-async def user_get_documents(user_id: Annotated[str, Depends(jwt_auth_user_id)], _id: int):
+async def user_get_documents(
+    user_id: Annotated[str, Depends(jwt_auth_user_id)],
+    sess: DbSession,
+    _id: int,
+    after: str | None = None,
+    limit: Annotated[int, Query(ge=1, le=1000)] = 100,
+):
     """
     Get user's documents
     """
@@ -199,64 +683,202 @@ async def user_get_documents(user_id: Annotated[str, Depends(jwt_auth_user_id)],
             detail="Invalid authentication credentials",
         )
 
+    query = select(*LISTED_COLUMNS).where(owned_by(user_id))
+    documents = (await sess.execute(documents_page(query, after, limit))).fetchall()
+
+    return documents_listing(documents, limit)
+
+
+@app.get("/user/{_id}/documents/export")
+async def user_export_documents(user_id: Annotated[str, Depends(jwt_auth_user_id)], _id: int):
+    """
+    Export user's documents
+
+    Streams every document of the user with its chunks as NDJSON, one document per line.
+    Clients sending `Accept-Encoding: gzip` get it gzip compressed.
+    """
+    if user_id is None or (user_id != _id):
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="Invalid authentication credentials",
+        )
+
+    async def lines() -> AsyncIterator[bytes]:
+        # a session of its own, open as long as the response is streamed
+        async with async_session() as sess:
+            async for line in export_documents(sess, user_id):
+                yield line
+
+    return StreamingResponse(
+        lines(),
+        media_type="application/x-ndjson",
+        headers={"Content-Disposition": f'attachment; filename="documents-{user_id}.ndjson"'},
+    )
+
+
+def import_upload(fileobj, owner_id: int) -> int:
+    """
+    Adds documents of an uploaded export, gzip compressed or not, as the user's in one transaction.
+    Runs in a threadpool thread with its own session, so that reading, decompressing and decoding the export
+    does not block the event loop.
+
+    Returns number of documents added
+    """
+    compressed = fileobj.read(2) == b"\x1f\x8b"
+    fileobj.seek(0)
+    if compressed:
+        fileobj = gzip.GzipFile(fileobj=fileobj, mode="rb")
+
     with Session.begin() as sess:
-        documents = sess.execute(select(Document).where(Document.owner_id == user_id)).scalars().fetchall()
+        return import_documents(sess, fileobj, owner_id)
 
-    return {
-        "documents": [
-            {
-                "id": d.id,
-                "filename": d.filename,
-                "submitted_at": d.submitted_at,
-                "public": d.public,
-                "content_size": d.content_size,
-            }
-            for d in documents
-        ]
-    }
+
+@app.post("/user/{_id}/documents/import")
+async def user_import_documents(
+    response: Response, user_id: Annotated[str, Depends(jwt_auth_stored_user_id)], _id: int, file: UploadFile
+):
+    """
+    Import documents
+
+    Adds documents of an export, NDJSON or gzip compressed NDJSON, as the user's in one transaction.
+    """
+    if user_id is None or (user_id != _id):
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="Invalid authentication credentials",
+        )
+
+    try:
+        imported = await run_in_threadpool(import_upload, file.file, user_id)
+    except (ValueError, OSError, EOFError) as e:
+        raise HTTPException(status_code=status.HTTP_422_UNPROCESSABLE_ENTITY, detail=f"Invalid export: {e}")
+
+    response.status_code = status.HTTP_201_CREATED
+    return {"imported": imported}
 
 
 @app.get("/document/{document_id}")
-async def user_get_document(user_id: Annotated[str, Depends(jwt_auth_user_id)], document_id: int):
+async def user_get_document(
+    user_id: Annotated[str, Depends(jwt_auth_user_id)], sess: DbSession, document_id: int, format: str | None = None
+):
     """
     Get document
+
+    `format=columnar` returns chunks as an array per field, `format=msgpack` the same in MessagePack.
     """
-    with Session.begin() as sess:
-        readable = (
-            sess.execute(
-                select(Document)
-                .join(User)
-                .where(Document.id == document_id)
-                .where(or_(Document.public is True, Document.owner_id == user_id))
+    fmt = response_format(format)
+    document = (
+        await sess.execute(
+            select(
+                Document.filename,
+                Document.submitted_at,
+                Document.public,
+                Document.content_size,
+                Document.profile,
             )
-            .scalars()
-            .one_or_none()
+            .join(User)
+            .where(Document.id == document_id)
+            .where(readable_by(user_id))
         )
-        if readable:
-            document = sess.get(Document, readable.id)
-        else:
-            raise HTTPException(
-                status_code=status.HTTP_401_UNAUTHORIZED,
-                detail="Invalid authentication credentials",
-            )
+    ).one_or_none()
+    if document is None:
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="Invalid authentication credentials",
+        )
+
+    fields = {
+        "filename": document.filename,
+        "submitted_at": document.submitted_at,
+        "public": document.public,
+        "content_size": document.content_size,
+        "profile": document.profile or "full",
+    }
+    chunks = await sess.run_sync(get_chunks, document_id)
+
+    fields = jsonable_encoder(fields)
+    fields["chunks"] = format_chunks(chunks, fmt)
+    return render({"document": fields}, fmt)
+
+
+@app.get("/document/{document_id}/chunks")
+async def user_get_document_chunks(
+    user_id: Annotated[str, Depends(jwt_auth_user_id)],
+    sess: DbSession,
+    document_id: int,
+    offset: Annotated[int, Query(ge=0)] = 0,
+    limit: Annotated[int, Query(ge=1, le=1000)] = 100,
+):
+    """
+    Get a range of document chunks
+    """
+    readable = (
+        await sess.execute(select(Document.id).where(Document.id == document_id).where(readable_by(user_id)))
+    ).one_or_none()
+    if not readable:
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="Invalid authentication credentials",
+        )
+
+    chunks = await sess.run_sync(get_chunks, document_id, offset, limit + 1)
 
     return {
-        "document": {
-            "filename": document.filename,
-            "submitted_at": document.submitted_at,
-            "public": document.public,
-            "content_size": document.content_size,
-            "chunks": document.chunks,
-        }
+        "chunks": chunks[:limit],
+        "offset": offset,
+        "next_offset": offset + limit if len(chunks) > limit else None,
+    }
+
+
+@app.get("/search")
+async def search(
+    user_id: Annotated[str, Depends(jwt_auth_user_id)],
+    sess: DbSession,
+    q: Annotated[str, Query(min_length=1, max_length=1000)],
+    limit: Annotated[int, Query(ge=1, le=100)] = 20,
+):
+    """
+    Search chunks of readable documents
+    """
+    if not q.split():
+        return {"results": []}
+
+    hits = await sess.execute(search_query(sess.bind.dialect.name, q, user_id, limit))
+
+    return {
+        "results": [
+            {
+                "document_id": hit.document_id,
+                "pos": hit.pos,
+                "string": hit.string,
+                "heading": hit.heading,
+                "score": hit.score,
+            }
+            for hit in hits
+        ]
     }
 
 
 @app.post("/document/new")
 async def user_post_document(
-    response: Response, user_id: Annotated[str, Depends(jwt_auth_user_id)], file: UploadFile, public: bool = False
+    request: Request,
+    response: Response,
+    user_id: Annotated[str, Depends(jwt_auth_stored_user_id)],
+    rate_key: RateLimitKey,
+    sess: DbSession,
+    file: UploadFile,
+    public: bool = False,
+    pages: str | None = None,
+    max_pages: Annotated[int | None, Query(ge=1)] = None,
+    profile: str | None = None,
 ):
     """
     Post document
+
+    `pages` such as `1-5,10` and `max_pages` limit the pages parsed and stored,
+    `profile` picks the extraction profile as for /pdf_text_chunks.
+    A document cut short by the parse budget is stored with the pages parsed, the response flags it truncated.
+    The parse is cancelled and nothing is stored when the client disconnects.
     """
 
     if user_id is None:
@@ -265,31 +887,193 @@ async def user_post_document(
             detail="Invalid authentication credentials",
         )
 
-    chunks, elapsed_s = pdf_parser.get_text(file.file)
-    file.file.seek(0)
-    file_content = file.file.read()
-    file.file.seek(0)
+    selected = page_ranges(pages, max_pages)
+    profile = extraction_profile(profile)
+    timer = StageTimer()
+    chunks, _, parse_metadata, digest = await until_disconnected(
+        request, parse_upload(file.file, timer, selected, profile, rate_key)
+    )
 
     new_document = Document(
         filename=file.filename,
         submitted_at=dt.datetime.utcnow(),
         owner_id=user_id,
-        hash=hashlib.sha256(file_content).digest(),
+        hash=digest,
         public=public,
         chunks=chunks,
         content_size=file.size,
+        profile=profile,
     )
 
-    with Session.begin() as sess:
-        sess.add(new_document)
-        sess.commit()
+    with timer.stage("db"):
+        await sess.run_sync(add_document, new_document)
+        await sess.commit()
+    timer.observe()
 
     response.status_code = status.HTTP_201_CREATED
+    if parse_metadata.get("truncated"):
+        return {"truncated": True, "truncated_reason": parse_metadata["truncated_reason"]}
     return
 
 
+async def parse_batch_entry(
+    concurrency: asyncio.Semaphore, timer: StageTimer, filename: str, fileobj, profile: str, rate_key: str
+) -> tuple[dict, list[dict] | None, bytes | None]:
+    """
+    Parses one file of a batch upload, a failure is reported in the returned result instead of raised.
+
+    Returns the file's result, chunks and SHA-256 digest of the file, the latter two None on failure
+    """
+    async with concurrency:
+        try:
+            chunks, _, parse_metadata, digest = await parse_upload(fileobj, timer, profile=profile, rate_key=rate_key)
+        except HTTPException as e:
+            return {"filename": filename, "status": e.status_code, "detail": e.detail}, None, None
+        except ParsePoolFull:
+            return {"filename": filename, "status": 503, "detail": "Too many documents being parsed, try again later"}, None, None
+        except ParseWorkerLost:
+            log.exception("Parser process died parsing %s", filename)
+            return (
+                {"filename": filename, "status": 503, "detail": "Parser process died while parsing, try again later"},
+                None,
+                None,
+            )
+        except Exception:
+            log.exception("Batch upload of %s failed", filename)
+            return {"filename": filename, "status": 422, "detail": "Could not parse PDF file"}, None, None
+
+    truncated = {key: value for key, value in parse_metadata.items() if key in ("truncated", "truncated_reason")}
+    return {"filename": filename, "status": 201, **truncated}, chunks, digest
+
+
+def file_size(fileobj) -> int:
+    size = fileobj.seek(0, 2)
+    fileobj.seek(0)
+    return size
+
+
+async def batch_entries(files: list[UploadFile], stack: contextlib.ExitStack) -> list[tuple[str, Any, int]]:
+    """
+    Expands ZIP archives of a batch upload into their PDF files, which the stack closes.
+
+    Returns the file name, file and size of each PDF file, no file for invalid archives
+    """
+    entries = []
+    for file in files:
+        if not is_zip(file):
+            entries.append((file.filename, file.file, file.size))
+            continue
+        try:
+            archive_entries = await run_in_threadpool(zip_entries, file.file, BATCH_MAX_FILES, UPLOAD_MAX_BYTES)
+        except zipfile.BadZipFile:
+            entries.append((file.filename, None, file.size))
+            continue
+        for filename, entry in archive_entries:
+            stack.enter_context(entry)
+            entries.append((filename, entry, file_size(entry)))
+
+    if BATCH_MAX_FILES and len(entries) > BATCH_MAX_FILES:
+        raise too_large(f"Batch has {len(entries)} files, at most {BATCH_MAX_FILES} are accepted")
+    return entries
+
+
+def batch_documents(
+    entries: list[tuple[str, Any, int]],
+    parsed: list[tuple[dict, list[dict] | None, bytes | None]],
+    owner_id: int,
+    public: bool,
+    profile: str,
+) -> tuple[list[dict], list[tuple[dict, Document]]]:
+    """
+    Accepts the entries of a batch upload and what parse_batch_entry returned for the ones with a file.
+
+    Returns the result of each entry and a Document for each parsed one along with its result
+    """
+    submitted_at = dt.datetime.utcnow()
+    results = []
+    stored = []
+    parsed = iter(parsed)
+    for filename, fileobj, size in entries:
+        if fileobj is None:
+            results.append({"filename": filename, "status": 422, "detail": "Invalid ZIP archive"})
+            continue
+        result, chunks, digest = next(parsed)
+        results.append(result)
+        if chunks is not None:
+            document = Document(
+                filename=filename,
+                submitted_at=submitted_at,
+                owner_id=owner_id,
+                hash=digest,
+                public=public,
+                chunks=chunks,
+                content_size=size,
+                profile=profile,
+            )
+            stored.append((result, document))
+    return results, stored
+
+
+@app.post("/documents/batch")
+async def user_post_documents(
+    response: Response,
+    user_id: Annotated[str, Depends(jwt_auth_stored_user_id)],
+    rate_key: RateLimitKey,
+    sess: DbSession,
+    files: list[UploadFile],
+    public: bool = False,
+    profile: str | None = None,
+):
+    """
+    Post documents in a batch
+
+    `files` are PDF files or ZIP archives of them. Files are parsed concurrently across the parser pool
+    and stored together in one transaction. A file that fails to parse does not fail the others,
+    the result of each file, or each PDF file of an archive, holds its status and document id or error detail.
+    The response is 207 when some files failed.
+    """
+
+    if user_id is None:
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="Invalid authentication credentials",
+        )
+
+    profile = extraction_profile(profile)
+    if parse_pool.full:
+        raise ParsePoolFull(f"{parse_pool.pending} parses pending")
+
+    with contextlib.ExitStack() as stack:
+        entries = await batch_entries(files, stack)
+
+        # as many parses as there are workers keeps the pool busy, leaving the queue to other requests
+        concurrency = asyncio.Semaphore(max(1, min(parse_pool.workers, parse_pool.queue_limit - parse_pool.pending)))
+        timer = StageTimer()
+        parsed = await asyncio.gather(
+            *(
+                parse_batch_entry(concurrency, timer, filename, fileobj, profile, rate_key)
+                for filename, fileobj, _ in entries
+                if fileobj is not None
+            )
+        )
+
+    results, stored = batch_documents(entries, parsed, user_id, public, profile)
+
+    with timer.stage("db"):
+        await sess.run_sync(add_documents, [document for _, document in stored])
+        await sess.commit()
+    timer.observe()
+
+    for result, document in stored:
+        result["id"] = document.id
+
+    failed = any(result["status"] != status.HTTP_201_CREATED for result in results)
+    response.status_code = status.HTTP_207_MULTI_STATUS if failed else status.HTTP_201_CREATED
+    return {"documents": results}
+
+
 @app.delete("/document/{document_id}")
-async def user_delete_document(user_id: Annotated[str, Depends(jwt_auth_user_id)], document_id: int):
+async def user_delete_document(user_id: Annotated[str, Depends(jwt_auth_user_id)], sess: DbSession, document_id: int):
     """
     Delete document
     """
@@ -300,20 +1084,79 @@ async def user_delete_document(user_id: Annotated[str, Depends(jwt_auth_user_id)
             detail="Invalid authentication credentials",
         )
 
-    with Session.begin() as sess:
-        readable = (
-            sess.execute(select(Document).join(User).where(Document.id == document_id).where(Document.owner_id == user_id))
-            .scalars()
-            .one_or_none()
+    if SOFT_DELETE:
+        statement = (
+            update(Document).where(Document.id == document_id).where(owned_by(user_id)).values(deleted_at=dt.datetime.utcnow())
         )
-        if readable:
-            document = sess.get(Document, readable.id)
-        else:
-            raise HTTPException(
-                status_code=status.HTTP_401_UNAUTHORIZED,
-                detail="Invalid authentication credentials",
-            )
-
-        sess.delete(document)
+    else:
+        statement = delete(Document).where(Document.id == document_id).where(owned_by(user_id))
+    result = await sess.execute(statement, execution_options={"synchronize_session": False})
+    if result.rowcount == 0:
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="Invalid authentication credentials",
+        )
+    await sess.commit()
 
     return
+
+
+# Jobs
+@app.post("/jobs")
+async def user_post_job(
+    response: Response,
+    user_id: Annotated[str, Depends(jwt_auth_stored_user_id)],
+    rate_key: RateLimitKey,
+    file: UploadFile,
+    public: bool = False,
+):
+    """
+    Post document to be parsed in the background
+    """
+
+    if user_id is None:
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="Invalid authentication credentials",
+        )
+
+    deadline = parse_deadline()
+    page_count = await check_pages(file.file, deadline=deadline)
+    if rate_limiter.enabled:
+        # the job parses the whole file later, charge its pages now
+        if page_count is None:
+            page_count = await parse_pool.count_pages(file.file, deadline)
+        await rate_limiter.charge(rate_key, page_count)
+    job_id = await run_in_threadpool(job_runner.submit, file.file, file.filename, file.size, user_id, public)
+
+    response.status_code = status.HTTP_202_ACCEPTED
+    response.headers["Location"] = f"/jobs/{job_id}"
+    return {"job_id": job_id}
+
+
+@app.get("/jobs/{job_id}")
+async def user_get_job(user_id: Annotated[str, Depends(jwt_auth_user_id)], sess: DbSession, job_id: int):
+    """
+    Get job status
+    """
+    job = await sess.get(Job, job_id)
+
+    if user_id is None or job is None or job.owner_id != user_id:
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="Invalid authentication credentials",
+        )
+
+    return {
+        "job": {
+            "job_id": job.id,
+            "status": job.status,
+            "filename": job.filename,
+            "submitted_at": job.submitted_at,
+            "updated_at": job.updated_at,
+            "pages_done": job.pages_done,
+            "pages_total": job.pages_total,
+            "document_id": job.document_id,
+            "error": job.error,
+        }
+    }
@@ -0,0 +1,79 @@
+import time
+import hashlib
+import secrets
+import threading
+from typing import Callable
+from collections import OrderedDict
+
+
+def secret_digest(secret: str) -> bytes:
+    return hashlib.sha256(secret.encode()).digest()
+
+
+class AuthCache:
+    """
+    Bounded cache of user id -> digest of the user's secret, so that warm users authenticate without a DB round trip.
+
+    Entries expire after `ttl_s` seconds, at most `max_entries` least recently used ones are kept.
+    Functions registered with `on_invalidate` are called with the user id of every local invalidation,
+    multi-process deployments use them to publish invalidations which other processes apply with `invalidate(..., publish=False)`.
+    """
+
+    def __init__(self, max_entries: int, ttl_s: float):
+        self.max_entries = max_entries
+        self.ttl_s = ttl_s
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._hooks = []
+        self._lock = threading.Lock()
+
+    def check(self, user_id: int, secret: str) -> bool | None:
+        """
+        Returns whether the secret matches the cached one, None when the user is not cached.
+        """
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(user_id)
+            if entry is None or entry[1] < now:
+                self._entries.pop(user_id, None)
+                self.misses += 1
+                return None
+            self._entries.move_to_end(user_id)
+            self.hits += 1
+
+        return secrets.compare_digest(entry[0], secret_digest(secret))
+
+    def put(self, user_id: int, secret: str):
+        if self.max_entries <= 0:
+            return
+
+        with self._lock:
+            self._entries[user_id] = (secret_digest(secret), time.monotonic() + self.ttl_s)
+            self._entries.move_to_end(user_id)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def invalidate(self, user_id: int, publish: bool = True):
+        with self._lock:
+            self._entries.pop(user_id, None)
+
+        if publish:
+            for hook in self._hooks:
+                hook(user_id)
+
+    def on_invalidate(self, hook: Callable[[int], None]):
+        self._hooks.append(hook)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            "entries": len(self._entries),
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / lookups, 4) if lookups else None,
+        }
@@ -0,0 +1,145 @@
+import zlib
+
+from starlette.datastructures import Headers, MutableHeaders
+
+try:
+    import zstandard
+except ImportError:  # optional, responses are not zstd encoded without it
+    zstandard = None
+
+
+def accepted_encodings(accept_encoding: str) -> dict[str, float]:
+    """
+    Returns content codings of an Accept-Encoding header with their q-values.
+    """
+    encodings = {}
+    for item in accept_encoding.split(","):
+        coding, _, params = item.strip().partition(";")
+        q = 1.0
+        for param in params.split(";"):
+            name, _, value = param.strip().partition("=")
+            if name == "q":
+                try:
+                    q = float(value)
+                except ValueError:
+                    q = 0.0
+        if coding:
+            encodings[coding.lower()] = q
+    return encodings
+
+
+class GzipCompressor:
+    def __init__(self, level: int):
+        self._compressor = zlib.compressobj(level, zlib.DEFLATED, zlib.MAX_WBITS | 16)
+
+    def compress(self, data: bytes) -> bytes:
+        return self._compressor.compress(data)
+
+    def flush(self, finish: bool) -> bytes:
+        return self._compressor.flush(zlib.Z_FINISH if finish else zlib.Z_SYNC_FLUSH)
+
+
+class ZstdCompressor:
+    def __init__(self, level: int):
+        self._compressor = zstandard.ZstdCompressor(level=level).compressobj()
+
+    def compress(self, data: bytes) -> bytes:
+        return self._compressor.compress(data)
+
+    def flush(self, finish: bool) -> bytes:
+        return self._compressor.flush(zstandard.COMPRESSOBJ_FLUSH_FINISH if finish else zstandard.COMPRESSOBJ_FLUSH_BLOCK)
+
+
+class CompressionMiddleware:
+    """
+    ASGI middleware compressing response bodies of at least `minimum_size` bytes with zstd or gzip,
+    whichever the client prefers by Accept-Encoding, zstd on a tie when zstandard is installed.
+
+    Streamed responses are compressed chunk by chunk and flushed after each, so clients still get
+    every chunk as soon as it is sent. Responses with a Content-Encoding already are passed through.
+    """
+
+    LEVELS = {"zstd": 3, "gzip": 6}
+
+    def __init__(self, app, minimum_size: int = 1024):
+        self.app = app
+        self.minimum_size = minimum_size
+
+    def encoding(self, accept_encoding: str) -> str | None:
+        accepted = accepted_encodings(accept_encoding)
+        candidates = ["zstd", "gzip"] if zstandard is not None else ["gzip"]
+        q = {coding: accepted.get(coding, accepted.get("*", 0.0)) for coding in candidates}
+        encoding = max(candidates, key=q.get)  # the first preferred one on a tie
+        return encoding if q[encoding] > 0 else None
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+
+        encoding = self.encoding(Headers(scope=scope).get("accept-encoding", ""))
+        if encoding is None:
+            return await self.app(scope, receive, send)
+
+        await self.app(scope, receive, CompressionResponder(send, encoding, self.LEVELS[encoding], self.minimum_size))
+
+
+class CompressionResponder:
+    """
+    ASGI send callable compressing the body of one response, see CompressionMiddleware.
+
+    The start message is held back until the first body message tells whether the response is compressed.
+    """
+
+    def __init__(self, send, encoding: str, level: int, minimum_size: int):
+        self.send = send
+        self.encoding = encoding
+        self.level = level
+        self.minimum_size = minimum_size
+        self.compressor = None
+        self.start_message = None
+        self.passthrough = False
+
+    async def __call__(self, message):
+        if message["type"] == "http.response.start":
+            self.start_message = message
+            self.passthrough = "content-encoding" in Headers(raw=message["headers"])
+        elif message["type"] != "http.response.body":
+            await self.send(message)
+        elif self.start_message is not None:
+            message = self.begin(message)
+            await self.send(self.start_message)
+            self.start_message = None
+            await self.send(message)
+        else:
+            await self.send(self.compress(message))
+
+    def begin(self, message: dict) -> dict:
+        """
+        Decides by the first body message whether the response is compressed and rewrites the start message's headers to match.
+
+        Returns the body message to send
+        """
+        body = message.get("body", b"")
+        more_body = message.get("more_body", False)
+        if self.passthrough or (not more_body and len(body) < self.minimum_size):
+            self.passthrough = True
+            return message
+
+        self.compressor = (ZstdCompressor if self.encoding == "zstd" else GzipCompressor)(self.level)
+        headers = MutableHeaders(raw=self.start_message["headers"])
+        headers["Content-Encoding"] = self.encoding
+        headers.add_vary_header("Accept-Encoding")
+        if "content-length" in headers:
+            del headers["Content-Length"]
+        message = self.compress(message)
+        if not more_body:
+            headers["Content-Length"] = str(len(message["body"]))
+        return message
+
+    def compress(self, message: dict) -> dict:
+        if self.passthrough:
+            return message
+        body = self.compressor.compress(message.get("body", b"")) + self.compressor.flush(
+            finish=not message.get("more_body", False)
+        )
+        return {**message, "body": body}
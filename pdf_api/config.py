@@ -1,3 +1,63 @@
 import os
+import tempfile
 
 JWT_SECRET = os.environ["JWT_SECRET"]
+
+# "layout" walks pdfminer's layout tree, "html" reparses pdfminer's HTML output
+PDF_PARSER_ENGINE = os.environ.get("PDF_PARSER_ENGINE", "layout")
+# extraction profile of requests not asking for one: "fast" (no layout analysis), "balanced" or "full"
+PARSE_PROFILE = os.environ.get("PARSE_PROFILE", "full")
+
+# parser processes, parses allowed to wait or run before requests are rejected with 503
+PARSE_WORKERS = int(os.environ.get("PARSE_WORKERS", os.cpu_count() or 1))
+PARSE_QUEUE_LIMIT = int(os.environ.get("PARSE_QUEUE_LIMIT", 4 * PARSE_WORKERS))
+
+# documents of at least PARSE_SPLIT_PAGES pages are parsed as PARSE_SPLIT_RANGES page ranges in parallel, 0 disables
+PARSE_SPLIT_PAGES = int(os.environ.get("PARSE_SPLIT_PAGES", 100))
+PARSE_SPLIT_RANGES = int(os.environ.get("PARSE_SPLIT_RANGES", PARSE_WORKERS))
+
+# parses stop with the pages done so far after PARSE_DEADLINE_S seconds or at a page drawing more than
+# PARSE_PAGE_GLYPHS glyphs, results are flagged truncated, 0 disables either
+PARSE_DEADLINE_S = float(os.environ.get("PARSE_DEADLINE_S", 300))
+PARSE_PAGE_GLYPHS = int(os.environ.get("PARSE_PAGE_GLYPHS", 200_000))
+# parser processes still running a parse PARSE_KILL_GRACE_S seconds after its deadline are killed, 0 disables
+PARSE_KILL_GRACE_S = float(os.environ.get("PARSE_KILL_GRACE_S", 30))
+
+# parse results kept in memory (bytes of JSON) and on disk, empty PARSE_CACHE_DIR disables the disk tier
+PARSE_CACHE_BYTES = int(os.environ.get("PARSE_CACHE_BYTES", 256 * 2**20))
+PARSE_CACHE_DIR = os.environ.get("PARSE_CACHE_DIR", os.path.join(tempfile.gettempdir(), "pdf_api_parse_cache"))
+PARSE_CACHE_DISK_BYTES = int(os.environ.get("PARSE_CACHE_DISK_BYTES", 4 * 2**30))
+# parse results of single pages are cached too and reused by any file with the same page, e.g. revisions of a document,
+# at the cost of fingerprinting pages and caching each one on every parse
+PARSE_PAGE_CACHE = os.environ.get("PARSE_PAGE_CACHE", "false").lower() == "true"
+
+# background document ingestion, uploads are spooled to JOBS_DIR until parsed
+JOBS_DIR = os.environ.get("JOBS_DIR", os.path.join(tempfile.gettempdir(), "pdf_api_jobs"))
+JOB_WORKERS = int(os.environ.get("JOB_WORKERS", PARSE_WORKERS))
+# running jobs not updated for JOB_STALE_S seconds are claimed again, kept above the parse deadline
+JOB_STALE_S = float(os.environ.get("JOB_STALE_S", max(120, 2 * PARSE_DEADLINE_S)))
+
+# users authenticated without a DB lookup for AUTH_CACHE_TTL_S seconds, 0 AUTH_CACHE_SIZE disables,
+# other app processes keep authenticating a deleted user for as long
+AUTH_CACHE_SIZE = int(os.environ.get("AUTH_CACHE_SIZE", 10_000))
+AUTH_CACHE_TTL_S = float(os.environ.get("AUTH_CACHE_TTL_S", 10))
+
+# uploads larger than UPLOAD_MAX_BYTES or with more than UPLOAD_MAX_PAGES pages are rejected with 413, 0 disables
+UPLOAD_MAX_BYTES = int(os.environ.get("UPLOAD_MAX_BYTES", 256 * 2**20))
+UPLOAD_MAX_PAGES = int(os.environ.get("UPLOAD_MAX_PAGES", 5000))
+
+# files or PDF entries of a ZIP archive accepted by a batch upload, 0 disables
+BATCH_MAX_FILES = int(os.environ.get("BATCH_MAX_FILES", 1000))
+
+# token buckets per user, or per address without a JWT, holding RATE_LIMIT_BURST tokens refilled at RATE_LIMIT_RATE per second,
+# requests take a token and are charged one per page parsed, 0 RATE_LIMIT_RATE disables
+RATE_LIMIT_RATE = float(os.environ.get("RATE_LIMIT_RATE", 10))
+RATE_LIMIT_BURST = float(os.environ.get("RATE_LIMIT_BURST", 2000))
+
+# deleted users and documents are only marked deleted and removed in the background, PURGE_BATCH documents at a time
+SOFT_DELETE = os.environ.get("SOFT_DELETE", "false").lower() == "true"
+PURGE_BATCH = int(os.environ.get("PURGE_BATCH", 100))
+PURGE_INTERVAL_S = float(os.environ.get("PURGE_INTERVAL_S", 10))
+
+# responses of at least COMPRESS_MIN_BYTES are zstd or gzip encoded for clients accepting it, 0 compresses all
+COMPRESS_MIN_BYTES = int(os.environ.get("COMPRESS_MIN_BYTES", 1024))
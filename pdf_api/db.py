@@ -1,10 +1,76 @@
 import os
 
-from sqlalchemy import create_engine
+from typing import AsyncIterator
+
+from sqlalchemy import create_engine, event
 from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import QueuePool
+from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker, AsyncSession
+
+
+def async_dsn(dsn: str) -> str:
+    """
+    Returns DSN of the async driver for the same database.
+    """
+    if dsn.startswith("sqlite:"):
+        return dsn.replace("sqlite:", "sqlite+aiosqlite:", 1)
+    if dsn.startswith("postgresql:"):
+        return dsn.replace("postgresql:", "postgresql+psycopg:", 1)
+    return dsn  # postgresql+psycopg serves both
 
 
 DB_DSN = os.environ["DB_DSN"]
-engine = create_engine(DB_DSN, echo=True)
+DB_ASYNC_DSN = os.environ.get("DB_ASYNC_DSN", async_dsn(DB_DSN))
+DB_ECHO = os.environ.get("DB_ECHO", "false").lower() == "true"
+DB_POOL_SIZE = int(os.environ.get("DB_POOL_SIZE", 5))
+DB_MAX_OVERFLOW = int(os.environ.get("DB_MAX_OVERFLOW", 10))
+DB_POOL_PRE_PING = os.environ.get("DB_POOL_PRE_PING", "true").lower() == "true"
+DB_STATEMENT_TIMEOUT_MS = int(os.environ.get("DB_STATEMENT_TIMEOUT_MS", 30_000))
+
+
+def engine_options(dsn: str) -> dict:
+    options = {"echo": DB_ECHO, "pool_pre_ping": DB_POOL_PRE_PING}
+    if dsn.startswith("postgresql"):
+        options["pool_size"] = DB_POOL_SIZE
+        options["max_overflow"] = DB_MAX_OVERFLOW
+        options["connect_args"] = {"options": f"-c statement_timeout={DB_STATEMENT_TIMEOUT_MS}"}
+    return options
+
+
+def sqlite_foreign_keys(dbapi_connection, connection_record):
+    # SQLite ignores foreign keys, including ON DELETE actions, unless asked not to
+    cursor = dbapi_connection.cursor()
+    cursor.execute("PRAGMA foreign_keys=ON")
+    cursor.close()
+
+
+engine = create_engine(DB_DSN, **engine_options(DB_DSN))
+async_engine = create_async_engine(DB_ASYNC_DSN, **engine_options(DB_ASYNC_DSN))
+
+if engine.dialect.name == "sqlite":
+    event.listen(engine, "connect", sqlite_foreign_keys)
+    event.listen(async_engine.sync_engine, "connect", sqlite_foreign_keys)
 
 Session = sessionmaker(engine, expire_on_commit=False)
+async_session = async_sessionmaker(async_engine, expire_on_commit=False)
+
+
+async def get_session() -> AsyncIterator[AsyncSession]:
+    """
+    Request-scoped session, to be used as a FastAPI dependency.
+    """
+    async with async_session() as sess:
+        yield sess
+
+
+def pool_stats(engine) -> dict:
+    pool = engine.pool
+    stats = {"pool": type(pool).__name__}
+    if isinstance(pool, QueuePool):
+        stats.update(
+            size=pool.size(),
+            checked_in=pool.checkedin(),
+            checked_out=pool.checkedout(),
+            overflow=pool.overflow(),
+        )
+    return stats
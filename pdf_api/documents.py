@@ -0,0 +1,205 @@
+import datetime as dt
+from typing import AsyncIterator, Iterable
+
+import orjson
+from sqlalchemy import insert, select, tuple_, and_, or_
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from pdf_api.models import Document, DocumentChunk
+
+# rows of documents and their chunks fetched from a server-side cursor at once by exports
+EXPORT_ROWS = 10_000
+# documents inserted at once by imports
+IMPORT_BATCH = 100
+
+
+def readable_by(user_id: int | None):
+    """
+    Returns a condition selecting documents the user can read, public ones and their own, not deleted.
+    """
+    return and_(Document.deleted_at.is_(None), or_(Document.public.is_(True), Document.owner_id == user_id))
+
+
+def owned_by(user_id: int | None):
+    """
+    Returns a condition selecting the user's documents, not deleted.
+    """
+    return and_(Document.deleted_at.is_(None), Document.owner_id == user_id)
+
+
+def add_document(sess, document: Document):
+    """
+    Adds the document along with its chunks as DocumentChunk rows.
+    """
+    add_documents(sess, [document])
+
+
+def add_documents(sess, documents: list[Document]):
+    """
+    Adds the documents in one multi-row insert and chunks of all of them in another.
+    """
+    sess.add_all(documents)
+    sess.flush()
+
+    rows = [row for document in documents if document.chunks for row in chunk_rows(document.id, document.chunks)]
+    if rows:
+        sess.execute(insert(DocumentChunk), rows)
+
+
+def chunk_rows(document_id: int, chunks: list[dict]) -> list[dict]:
+    return [
+        {
+            "document_id": document_id,
+            "seq": seq,
+            "pos": chunk["pos"],
+            "page": chunk.get("page"),
+            "string": chunk["string"],
+            "font_size": chunk["font_size"],
+            "type": chunk["type"],
+        }
+        for seq, chunk in enumerate(chunks)
+    ]
+
+
+CHUNK_COLUMNS = (DocumentChunk.pos, DocumentChunk.page, DocumentChunk.string, DocumentChunk.font_size, DocumentChunk.type)
+
+
+def chunk_dict(row) -> dict:
+    """
+    Returns the chunk of a row of CHUNK_COLUMNS as the parser produced it.
+    """
+    return {
+        "pos": row.pos,
+        "page": row.page,
+        "string": row.string,
+        "font_size": int(row.font_size) if row.font_size is not None and row.font_size.is_integer() else row.font_size,
+        "type": row.type,
+    }
+
+
+def get_chunks(sess, document_id: int, offset: int = 0, limit: int | None = None) -> list[dict]:
+    """
+    Returns `limit` chunks of the document starting with the `offset`-th one, all of them without a limit.
+    """
+    query = (
+        select(*CHUNK_COLUMNS)
+        .where(DocumentChunk.document_id == document_id)
+        .where(DocumentChunk.seq >= offset)
+        .order_by(DocumentChunk.seq)
+    )
+    if limit is not None:
+        query = query.limit(limit)
+
+    return [chunk_dict(row) for row in sess.execute(query)]
+
+
+def listing_cursor(submitted_at: dt.datetime, document_id: int) -> str:
+    """
+    Returns the `after` cursor of a document listing continuing past the given document.
+    """
+    return f"{submitted_at.isoformat()}_{document_id}"
+
+
+def after_cursor(after: str):
+    """
+    Returns a condition selecting documents listed after the cursor, raises ValueError for malformed cursors.
+    """
+    submitted_at, document_id = after.rsplit("_", 1)
+    return tuple_(Document.submitted_at, Document.id) > tuple_(dt.datetime.fromisoformat(submitted_at), int(document_id))
+
+
+async def export_documents(sess: AsyncSession, owner_id: int, batch_size: int = EXPORT_ROWS) -> AsyncIterator[bytes]:
+    """
+    Yields NDJSON lines of the user's documents with their chunks, oldest first.
+
+    Documents joined with their chunk rows are fetched `batch_size` rows at a time from a server-side cursor,
+    so memory use does not grow with the number of documents.
+    """
+    rows = await sess.stream(
+        select(
+            Document.id,
+            Document.filename,
+            Document.submitted_at,
+            Document.hash,
+            Document.public,
+            Document.content_size,
+            Document.profile,
+            *CHUNK_COLUMNS,
+        )
+        .outerjoin(DocumentChunk)
+        .where(owned_by(owner_id))
+        .order_by(Document.submitted_at, Document.id, DocumentChunk.seq)
+        .execution_options(yield_per=batch_size)
+    )
+    document = None
+    async for row in rows:
+        if document is None or document["id"] != row.id:
+            if document is not None:
+                yield orjson.dumps(document) + b"\n"
+            document = {
+                "id": row.id,
+                "filename": row.filename,
+                "submitted_at": row.submitted_at,
+                "hash": row.hash.hex(),  # SHA-256 digest of the file
+                "public": row.public,
+                "content_size": row.content_size,
+                "profile": row.profile,
+                "chunks": [],
+            }
+        if row.pos is not None:  # documents without chunks are one row of nulls
+            document["chunks"].append(chunk_dict(row))
+    if document is not None:
+        yield orjson.dumps(document) + b"\n"
+
+
+def exported_document(line: bytes, owner_id: int) -> Document:
+    """
+    Returns the document of an export_documents line owned by the user, raises ValueError for invalid lines.
+    """
+    try:
+        item = orjson.loads(line)
+        return Document(
+            filename=item["filename"],
+            submitted_at=dt.datetime.fromisoformat(item["submitted_at"]),
+            owner_id=owner_id,
+            hash=bytes.fromhex(item["hash"]),
+            public=bool(item["public"]),
+            chunks=item["chunks"],
+            content_size=item.get("content_size"),
+            profile=item.get("profile"),
+        )
+    except (KeyError, TypeError) as e:
+        raise ValueError(f"missing or invalid {e}")
+
+
+def import_documents(sess, lines: Iterable[bytes], owner_id: int, batch_size: int = IMPORT_BATCH) -> int:
+    """
+    Adds documents of export_documents lines as the user's, `batch_size` at a time.
+
+    Raises ValueError naming the line of an invalid document.
+
+    Returns number of documents added
+    """
+    imported = 0
+    batch = []
+    for lineno, line in enumerate(lines, 1):
+        if line.strip():
+            try:
+                batch.append(exported_document(line, owner_id))
+            except ValueError as e:
+                raise ValueError(f"Line {lineno}: {e}")
+        if len(batch) == batch_size:
+            imported += _import_batch(sess, batch, lineno)
+            batch = []
+    if batch:
+        imported += _import_batch(sess, batch, lineno)
+    return imported
+
+
+def _import_batch(sess, documents: list[Document], lineno: int) -> int:
+    try:
+        add_documents(sess, documents)
+    except (KeyError, TypeError, AttributeError) as e:
+        raise ValueError(f"Lines up to {lineno}: invalid chunks, missing or invalid {e}")
+    sess.expunge_all()  # flushed, only kept for the commit otherwise
+    return len(documents)
@@ -0,0 +1,56 @@
+from fastapi import HTTPException, status
+from fastapi.responses import ORJSONResponse, Response
+
+try:
+    import msgpack
+except ImportError:  # optional, the msgpack format is unavailable without it
+    msgpack = None
+
+# "json" lists chunks as objects, "columnar" as parallel arrays per field, "msgpack" is columnar in MessagePack
+FORMATS = ("json", "columnar", "msgpack")
+CHUNK_FIELDS = ("pos", "page", "string", "font_size")
+
+
+def response_format(fmt: str | None) -> str:
+    if fmt is None:
+        return "json"
+    if fmt not in FORMATS:
+        raise HTTPException(
+            status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
+            detail=f"Unknown format {fmt!r}, expected one of {', '.join(FORMATS)}",
+        )
+    if fmt == "msgpack" and msgpack is None:
+        raise HTTPException(status_code=status.HTTP_406_NOT_ACCEPTABLE, detail="msgpack format is not available")
+    return fmt
+
+
+def columnar(chunks: list[dict] | None) -> dict:
+    """
+    Returns chunks as an array per field, `type` dictionary encoded as indices into its distinct values, e.g.
+
+        {"pos": [0, 1], "page": [1, 1], "string": ["Page 1", "Title"], "font_size": [null, 14],
+         "type": {"values": ["p", "h1"], "indices": [0, 1]}}
+
+    Fields missing from chunks, such as `page` of documents stored before chunks recorded it, are null.
+    """
+    chunks = chunks or []
+    columns = {field: [chunk.get(field) for chunk in chunks] for field in CHUNK_FIELDS}
+
+    values = {}
+    indices = [values.setdefault(chunk.get("type"), len(values)) for chunk in chunks]
+    columns["type"] = {"values": list(values), "indices": indices}
+
+    return columns
+
+
+def format_chunks(chunks: list[dict] | None, fmt: str) -> list[dict] | dict | None:
+    return chunks if fmt == "json" else columnar(chunks)
+
+
+def render(content: dict, fmt: str) -> Response:
+    """
+    Returns a response of JSON-compatible content, MessagePack encoded for the msgpack format, JSON otherwise.
+    """
+    if fmt == "msgpack":
+        return Response(msgpack.packb(content), media_type="application/msgpack")
+    return ORJSONResponse(content)
@@ -0,0 +1,290 @@
+import os
+import time
+import uuid
+import shutil
+import asyncio
+import datetime as dt
+
+from logging import getLogger
+
+from sqlalchemy import select, update, or_, and_
+
+from pdf_api.db import Session
+from pdf_api.models import Job, Document
+from pdf_api.documents import add_document
+from pdf_api.parse_cache import ParseCache, file_digest
+from pdf_api.parse_pool import ParsePool, truncation
+
+log = getLogger(__name__)
+
+QUEUED = "queued"
+RUNNING = "running"
+DONE = "done"
+FAILED = "failed"
+
+
+class ClaimLost(Exception):
+    """
+    The job was claimed by another runner since this one claimed it.
+    """
+
+
+class JobRunner:
+    """
+    Parses uploaded documents in the background and stores them as Documents.
+
+    Jobs live in the database, so every app process runs a JobRunner that claims queued jobs
+    and jobs left running by a process that stopped updating them for `stale_s` seconds.
+    Running jobs are updated every `stale_s` / 3 seconds, a claim token stored with the claim keeps
+    a runner whose job was claimed again from updating it or storing its document.
+    Uploads are spooled to `directory` until their job finishes.
+    Parses stop after `deadline_s` seconds, 0 disables, the pages parsed until then are stored
+    and the job's error tells it was truncated.
+    """
+
+    def __init__(
+        self,
+        parse_pool: ParsePool,
+        parse_cache: ParseCache,
+        directory: str,
+        workers: int,
+        poll_s: float = 1.0,
+        stale_s: float = 120.0,
+        progress_s: float = 1.0,
+        deadline_s: float = 0.0,
+    ):
+        self.parse_pool = parse_pool
+        self.parse_cache = parse_cache
+        self.directory = directory
+        self.workers = workers
+        self.poll_s = poll_s
+        self.stale_s = stale_s
+        self.progress_s = progress_s
+        self.deadline_s = deadline_s
+        self._task = None
+        self._wake = None
+        self._loop = None
+        self._jobs = set()
+        # ids of jobs this runner is processing, never claimed again by it
+        self._running = set()
+
+        os.makedirs(self.directory, exist_ok=True)
+
+    def submit(self, fileobj, filename: str, content_size: int, owner_id: int, public: bool) -> int:
+        """
+        Spools the file and queues a job for it.
+
+        Returns the job id
+        """
+        path = os.path.join(self.directory, f"{uuid.uuid4().hex}.pdf")
+        fileobj.seek(0)
+        with open(path, "wb") as fout:
+            shutil.copyfileobj(fileobj, fout)
+
+        now = dt.datetime.utcnow()
+        job = Job(
+            owner_id=owner_id,
+            status=QUEUED,
+            filename=filename,
+            path=path,
+            content_size=content_size,
+            public=public,
+            submitted_at=now,
+            updated_at=now,
+            pages_done=0,
+        )
+        with Session.begin() as sess:
+            sess.add(job)
+
+        if self._wake is not None:
+            # submit runs in a threadpool thread, asyncio.Event is only safe to set from its loop
+            self._loop.call_soon_threadsafe(self._wake.set)
+
+        return job.id
+
+    def start(self):
+        self._loop = asyncio.get_running_loop()
+        self._wake = asyncio.Event()
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task is None:
+            return
+
+        self._task.cancel()
+        for job in list(self._jobs):
+            job.cancel()
+        await asyncio.gather(self._task, *self._jobs, return_exceptions=True)
+        self._task = None
+        self._wake = None
+
+    async def _run(self):
+        while True:
+            while len(self._jobs) < self.workers and not self.parse_pool.full:
+                claim = await asyncio.to_thread(self._claim, set(self._running))
+                if claim is None:
+                    break
+                job_id, token = claim
+                self._running.add(job_id)
+                job = asyncio.create_task(self._process(job_id, token))
+                self._jobs.add(job)
+                job.add_done_callback(self._jobs.discard)
+                job.add_done_callback(lambda _, job_id=job_id: self._running.discard(job_id))
+
+            self._wake.clear()
+            try:
+                await asyncio.wait_for(self._wake.wait(), self.poll_s)
+            except asyncio.TimeoutError:
+                pass
+
+    def _claim(self, running: set[int]) -> tuple[int, str] | None:
+        """
+        Marks the oldest claimable job, not one of the `running` ones, as running.
+
+        Returns its id and the claim token, None if there is nothing to do
+        """
+        now = dt.datetime.utcnow()
+        claimable = and_(
+            Job.id.notin_(running),
+            or_(
+                Job.status == QUEUED,
+                and_(Job.status == RUNNING, Job.updated_at < now - dt.timedelta(seconds=self.stale_s)),
+            ),
+        )
+        token = uuid.uuid4().hex
+
+        with Session.begin() as sess:
+            for job_id in sess.execute(select(Job.id).where(claimable).order_by(Job.id).limit(self.workers)).scalars():
+                claimed = sess.execute(
+                    update(Job)
+                    .where(Job.id == job_id)
+                    .where(claimable)
+                    .values(status=RUNNING, claim_token=token, updated_at=now, pages_done=0)
+                )
+                if claimed.rowcount == 1:
+                    return job_id, token
+
+        return None
+
+    @staticmethod
+    def _claimed(job_id: int, token: str):
+        return and_(Job.id == job_id, Job.status == RUNNING, Job.claim_token == token)
+
+    def _update(self, job_id: int, token: str, **values) -> bool:
+        """
+        Updates the job unless it was claimed by another runner.
+
+        Returns whether it was updated
+        """
+        with Session.begin() as sess:
+            updated = sess.execute(
+                update(Job).where(self._claimed(job_id, token)).values(updated_at=dt.datetime.utcnow(), **values)
+            )
+        return updated.rowcount == 1
+
+    async def _heartbeat(self, job_id: int, token: str):
+        """
+        Keeps the job from turning stale while it is processed, including slow stretches reporting no progress.
+        """
+        while await asyncio.to_thread(self._update, job_id, token):
+            await asyncio.sleep(self.stale_s / 3)
+        log.warning("Job %s was claimed by another runner", job_id)
+
+    def _get(self, job_id: int) -> Job:
+        with Session.begin() as sess:
+            return sess.get(Job, job_id)
+
+    def _finish(self, job: Job, token: str, digest: bytes, chunks: list[dict], error: str | None = None) -> bool:
+        """
+        Stores the document and marks the job done in one transaction,
+        nothing is stored when the job was claimed by another runner.
+
+        Returns whether the job was done
+        """
+        document = Document(
+            filename=job.filename,
+            submitted_at=job.submitted_at,
+            owner_id=job.owner_id,
+            hash=digest,
+            public=job.public,
+            chunks=chunks,
+            content_size=job.content_size,
+            profile=self.parse_pool.profile,
+        )
+        try:
+            with Session.begin() as sess:
+                add_document(sess, document)
+                done = sess.execute(
+                    update(Job)
+                    .where(self._claimed(job.id, token))
+                    .values(status=DONE, document_id=document.id, error=error, updated_at=dt.datetime.utcnow())
+                )
+                if done.rowcount != 1:
+                    # rolls back the document
+                    raise ClaimLost(job.id)
+        except ClaimLost:
+            log.warning("Job %s was claimed by another runner, its document is not stored", job.id)
+            return False
+        return True
+
+    async def _process(self, job_id: int, token: str):
+        job = await asyncio.to_thread(self._get, job_id)
+        if job is None:
+            return
+
+        heartbeat = asyncio.create_task(self._heartbeat(job_id, token))
+        try:
+            with open(job.path, "rb") as fin:
+                digest, chunks, error = await self._parse(job_id, token, fin)
+            done = await asyncio.to_thread(self._finish, job, token, digest, chunks, error)
+        except asyncio.CancelledError:
+            # left running, claimed again once stale
+            raise
+        except Exception as e:
+            log.exception("Job %s failed", job_id)
+            done = await asyncio.to_thread(self._update, job_id, token, status=FAILED, error=str(e)[:1024])
+        finally:
+            heartbeat.cancel()
+
+        if not done:
+            # the runner that claimed it again owns the upload
+            return
+
+        try:
+            os.remove(job.path)
+        except FileNotFoundError:
+            pass
+
+    async def _parse(self, job_id: int, token: str, fin) -> tuple[bytes, list[dict], str | None]:
+        digest = await asyncio.to_thread(file_digest, fin)
+        key = self.parse_cache.key(digest, self.parse_pool.settings)
+
+        deadline = time.time() + self.deadline_s if self.deadline_s else None
+        pages_total = await self.parse_pool.count_pages(fin, deadline)
+        await asyncio.to_thread(self._update, job_id, token, pages_total=pages_total)
+
+        chunks = await asyncio.to_thread(self.parse_cache.get, key)
+        if chunks is not None:
+            await asyncio.to_thread(self._update, job_id, token, pages_done=pages_total)
+            return digest, chunks, None
+
+        chunks = []
+        stats = {}
+        pages_done = 0
+        progress_at = time.monotonic()
+        async for page_chunks in self.parse_pool.iter_text(fin, deadline=deadline, stats=stats):
+            chunks.extend(page_chunks)
+            pages_done = min(pages_done + 1, pages_total)
+            if time.monotonic() - progress_at > self.progress_s:
+                await asyncio.to_thread(self._update, job_id, token, pages_done=pages_done)
+                progress_at = time.monotonic()
+
+        truncated = truncation(stats)
+        if truncated:
+            await asyncio.to_thread(self._update, job_id, token, pages_done=stats.get("pages", pages_done))
+            return digest, chunks, f"Truncated: {truncated['truncated_reason']}"
+
+        await asyncio.to_thread(self._update, job_id, token, pages_done=pages_total)
+        await asyncio.to_thread(self.parse_cache.put, key, chunks)
+
+        return digest, chunks, None
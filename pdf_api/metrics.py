@@ -0,0 +1,103 @@
+import os
+import time
+import contextlib
+import contextvars
+
+from prometheus_client import Counter, Histogram, CollectorRegistry, REGISTRY, generate_latest, multiprocess
+from sqlalchemy import event
+
+REQUEST_DURATION = Histogram(
+    "pdf_api_request_duration_seconds",
+    "Time until response headers are sent",
+    ["method", "endpoint", "status"],
+)
+REQUEST_DB_DURATION = Histogram(
+    "pdf_api_request_db_duration_seconds",
+    "Time spent executing SQL statements per request",
+    ["method", "endpoint"],
+    buckets=(0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, float("inf")),
+)
+REQUEST_BYTES = Counter("pdf_api_request_bytes", "Bytes received in request bodies", ["endpoint"])
+RESPONSE_BYTES = Counter("pdf_api_response_bytes", "Bytes sent in response bodies of known length", ["endpoint"])
+
+STAGE_DURATION = Histogram(
+    "pdf_api_parse_stage_duration_seconds",
+    "Time spent in a stage of parsing an upload",
+    ["stage"],
+    buckets=(0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1.0, 5.0, 10.0, 30.0, 60.0, 300.0, float("inf")),
+)
+PAGES = Counter("pdf_api_parsed_pages", "Pages parsed")
+CHUNKS = Counter("pdf_api_parsed_chunks", "Chunks extracted")
+PARSE_CACHE_LOOKUPS = Counter("pdf_api_parse_cache_lookups", "Parse cache lookups", ["result"])
+
+# seconds spent in SQL statements by the current request
+_db_time = contextvars.ContextVar("db_time", default=None)
+
+
+class StageTimer:
+    """
+    Measures seconds spent in named stages with a monotonic clock, e.g.
+
+        with timer.stage("hash"):
+            ...
+    """
+
+    def __init__(self):
+        self.stages = {}
+
+    @contextlib.contextmanager
+    def stage(self, name: str):
+        timer_start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.add({f"{name}_s": time.perf_counter() - timer_start})
+
+    def add(self, stats: dict):
+        """
+        Adds seconds measured elsewhere, such as parser stats from a worker process, by their "<stage>_s" keys.
+        """
+        for key, value in stats.items():
+            if key.endswith("_s"):
+                self.stages[key] = self.stages.get(key, 0.0) + value
+
+    def observe(self):
+        for key, seconds in self.stages.items():
+            STAGE_DURATION.labels(key.removesuffix("_s")).observe(seconds)
+
+    def breakdown(self) -> dict:
+        return {key: round(seconds, 4) for key, seconds in self.stages.items()}
+
+
+def track_db_time(engine):
+    """
+    Adds time spent in SQL statements executed on the engine to the current request's DB time.
+    """
+
+    @event.listens_for(engine, "before_cursor_execute")
+    def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        conn.info.setdefault("query_start", []).append(time.perf_counter())
+
+    @event.listens_for(engine, "after_cursor_execute")
+    def after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        elapsed_s = time.perf_counter() - conn.info["query_start"].pop()
+        db_time = _db_time.get()
+        if db_time is not None:
+            db_time[0] += elapsed_s
+
+
+def begin_request() -> list[float]:
+    db_time = [0.0]
+    _db_time.set(db_time)
+    return db_time
+
+
+def exposition() -> bytes:
+    """
+    Returns all metrics in Prometheus text format, of all app processes when PROMETHEUS_MULTIPROC_DIR is set.
+    """
+    if "PROMETHEUS_MULTIPROC_DIR" in os.environ:
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+        return generate_latest(registry)
+    return generate_latest(REGISTRY)
@@ -1,7 +1,7 @@
 from datetime import datetime
 
-from sqlalchemy import DateTime, ForeignKey
-from sqlalchemy import String, Boolean, Integer, JSON
+from sqlalchemy import DateTime, ForeignKey, Index, DDL, event
+from sqlalchemy import String, Boolean, Integer, Float, Text
 from sqlalchemy.orm import mapped_column
 from sqlalchemy.orm import Mapped
 from sqlalchemy.orm import relationship
@@ -19,7 +19,11 @@ class User(Base):
     username: Mapped[str] = mapped_column(String(60), nullable=False)
     created_at: Mapped[datetime] = mapped_column(DateTime(timezone=False), nullable=False)
     secret: Mapped[str] = mapped_column(String(64), nullable=False)
-    documents: Mapped["Document"] = relationship("Document", cascade="all, delete")
+    # set when deleted in soft delete mode, the user is removed later by pdf_api.purge
+    deleted_at: Mapped[datetime | None] = mapped_column(DateTime(timezone=False))
+    # deleted along with the user by the database, without loading them
+    documents: Mapped["Document"] = relationship("Document", cascade="all, delete", passive_deletes=True)
+    jobs: Mapped["Job"] = relationship("Job", cascade="all, delete", passive_deletes=True)
 
 
 class Document(Base):
@@ -28,8 +32,82 @@ class Document(Base):
     id: Mapped[int] = mapped_column(primary_key=True)
     filename: Mapped[str] = mapped_column(String(1024), nullable=False)
     submitted_at: Mapped[datetime] = mapped_column(DateTime(timezone=False), nullable=False)
-    owner_id: Mapped[int] = mapped_column(ForeignKey(User.id))
-    hash: Mapped[str] = mapped_column(String(256), nullable=False)
+    owner_id: Mapped[int] = mapped_column(ForeignKey(User.id, ondelete="CASCADE"))
+    hash: Mapped[str] = mapped_column(String(256), nullable=False, index=True)
     public: Mapped[bool] = mapped_column(Boolean(), nullable=False)
-    chunks: Mapped[str] = mapped_column(JSON())
     content_size: Mapped[int] = mapped_column(Integer())
+    # extraction profile the chunks were parsed with, "full" when missing
+    profile: Mapped[str | None] = mapped_column(String(16))
+    # set when deleted in soft delete mode, the document is removed later by pdf_api.purge
+    deleted_at: Mapped[datetime | None] = mapped_column(DateTime(timezone=False), index=True)
+    chunk_rows: Mapped["DocumentChunk"] = relationship("DocumentChunk", cascade="all, delete", passive_deletes=True)
+    # chunks of a new document, stored only as DocumentChunk rows by pdf_api.documents.add_documents
+    chunks = None
+
+    # keyset pagination of listings by (submitted_at, id), of a user's documents and of public ones
+    __table_args__ = (
+        Index("ix_documents_owner_id_submitted_at_id", "owner_id", "submitted_at", "id"),
+        Index("ix_documents_public_submitted_at_id", "public", "submitted_at", "id"),
+    )
+
+
+class DocumentChunk(Base):
+    __tablename__ = "document_chunks"
+
+    document_id: Mapped[int] = mapped_column(ForeignKey(Document.id, ondelete="CASCADE"), primary_key=True)
+    seq: Mapped[int] = mapped_column(Integer(), primary_key=True)
+    pos: Mapped[int] = mapped_column(Integer(), nullable=False)
+    page: Mapped[int | None] = mapped_column(Integer())
+    string: Mapped[str] = mapped_column(Text(), nullable=False)
+    font_size: Mapped[float | None] = mapped_column(Float())
+    type: Mapped[str] = mapped_column(String(8), nullable=False)
+
+
+# full-text index of chunks, see pdf_api.search
+SEARCH_CONFIG = "english"
+
+event.listen(
+    DocumentChunk.__table__,
+    "after_create",
+    DDL(
+        f"CREATE INDEX ix_document_chunks_search ON document_chunks USING gin (to_tsvector('{SEARCH_CONFIG}'::regconfig, string))"
+    ).execute_if(dialect="postgresql"),
+)
+for statement in (
+    "CREATE VIRTUAL TABLE document_chunks_fts USING fts5(string, content='document_chunks', content_rowid='rowid')",
+    "CREATE TRIGGER document_chunks_fts_insert AFTER INSERT ON document_chunks BEGIN "
+    "INSERT INTO document_chunks_fts(rowid, string) VALUES (new.rowid, new.string); END",
+    "CREATE TRIGGER document_chunks_fts_delete AFTER DELETE ON document_chunks BEGIN "
+    "INSERT INTO document_chunks_fts(document_chunks_fts, rowid, string) VALUES ('delete', old.rowid, old.string); END",
+):
+    event.listen(DocumentChunk.__table__, "after_create", DDL(statement).execute_if(dialect="sqlite"))
+event.listen(DocumentChunk.__table__, "before_drop", DDL("DROP TABLE IF EXISTS document_chunks_fts").execute_if(dialect="sqlite"))
+
+
+class Job(Base):
+    __tablename__ = "jobs"
+
+    id: Mapped[int] = mapped_column(primary_key=True)
+    owner_id: Mapped[int] = mapped_column(ForeignKey(User.id, ondelete="CASCADE"))
+    status: Mapped[str] = mapped_column(String(16), nullable=False, index=True)
+    # set by the runner claiming the job, see pdf_api.jobs
+    claim_token: Mapped[str | None] = mapped_column(String(32))
+    filename: Mapped[str] = mapped_column(String(1024), nullable=False)
+    path: Mapped[str] = mapped_column(String(1024), nullable=False)
+    content_size: Mapped[int] = mapped_column(Integer())
+    public: Mapped[bool] = mapped_column(Boolean(), nullable=False)
+    submitted_at: Mapped[datetime] = mapped_column(DateTime(timezone=False), nullable=False)
+    updated_at: Mapped[datetime] = mapped_column(DateTime(timezone=False), nullable=False)
+    pages_done: Mapped[int] = mapped_column(Integer(), nullable=False, default=0)
+    pages_total: Mapped[int | None] = mapped_column(Integer())
+    document_id: Mapped[int | None] = mapped_column(ForeignKey(Document.id, ondelete="SET NULL"))
+    error: Mapped[str | None] = mapped_column(String(1024))
+
+
+class RateLimit(Base):
+    __tablename__ = "rate_limits"
+
+    # token bucket of a client, see pdf_api.rate_limit
+    key: Mapped[str] = mapped_column(String(64), primary_key=True)
+    tokens: Mapped[float] = mapped_column(Float(), nullable=False)
+    updated_at: Mapped[float] = mapped_column(Float(), nullable=False)
@@ -0,0 +1,56 @@
+import time
+import asyncio
+
+import pikepdf
+
+from pdf_api.parse_pool import ParsePool, truncation
+from pdf_api.parse_cache import ParseCache
+from pdf_api.utils.pdf_parser import PdfParser, PageRanges, ParseBudgetExceeded
+
+
+async def parse_incremental(
+    parse_pool: ParsePool, parse_cache: ParseCache, fileobj, profile: str | None = None, deadline: float | None = None
+) -> tuple[list[dict], float, dict]:
+    """
+    Parses only pages of the PDF file not seen before, in this file or any other, reusing cached results
+    of the rest. Pages are recognized by fingerprints of their content streams, resources and boxes,
+    so a revision of a document with a few pages edited costs parsing those few pages.
+
+    Returns the same as ParsePool.get_text, chunks equal to parsing the whole file,
+    metadata also holds the number of pages reused from the cache under "pages_reused"
+    and the pages and time of each part parsed under "ranges".
+    A truncated parse ends the document before the first page not parsed.
+    """
+    timer_start = time.perf_counter()
+
+    profile = profile or parse_pool.profile
+    parser = PdfParser(engine=parse_pool.engine, profile=profile)
+    try:
+        fingerprints = await parse_pool.fingerprint_pages(fileobj, deadline)
+    except (pikepdf.PdfError, ParseBudgetExceeded):
+        # pdfminer may still read it, out of budget the parse stops at once
+        return await parse_pool.get_text(fileobj, profile=profile, deadline=deadline)
+    keys = [parse_cache.page_key(fingerprint, parser.settings) for fingerprint in fingerprints]
+
+    pages = await asyncio.to_thread(lambda: [parse_cache.get(key) for key in keys])
+    missing = PageRanges(range(pageno, pageno + 1) for pageno, page in enumerate(pages) if page is None)
+
+    parsed, stats, ranges = await parse_pool.get_pages(fileobj, missing, profile, deadline)
+    for pageno, elems, positions in parsed:
+        pages[pageno] = {"chunks": elems, "positions": positions}
+    await asyncio.to_thread(parse_cache.put_many, [(keys[pageno], pages[pageno]) for pageno, _, _ in parsed])
+    truncated = truncation(stats)
+    if truncated:
+        pages = pages[: pages.index(None)]
+
+    # cached pages may have been cut from other page numbers, all are copied as they are shared with the cache
+    chunks = PdfParser.merge_page_ranges(
+        [(parser.relocate_page(page["chunks"], pageno + 1), page["positions"]) for pageno, page in enumerate(pages)],
+        len(pages),
+        footer=profile != "fast",
+    )
+
+    timer_stop = time.perf_counter()
+
+    reused = len(pages) - sum(1 for pageno, _, _ in parsed if pageno < len(pages))
+    return chunks, (timer_stop - timer_start), {**truncated, "ranges": ranges, "stats": stats, "pages_reused": reused}
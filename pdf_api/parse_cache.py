@@ -0,0 +1,190 @@
+import os
+import json
+import hashlib
+import threading
+from collections import OrderedDict
+
+
+def file_digest(fileobj) -> bytes:
+    """
+    Returns SHA-256 digest of a file-like object, read in blocks.
+    """
+    fileobj.seek(0)
+    digest = hashlib.file_digest(fileobj, "sha256").digest()
+    fileobj.seek(0)
+    return digest
+
+
+class ParseCache:
+    """
+    Two-tier cache of parse results keyed by content hash and parser settings,
+    results of single pages by page fingerprint and parser settings, see pdf_api.page_cache.
+
+    Recently used results are kept in memory up to `max_bytes` of their JSON size,
+    all results are stored as JSON files in `directory` up to `max_disk_bytes`.
+    Least recently used entries are evicted first in both tiers.
+
+    The size of the directory is counted as results are stored, it is only scanned once exceeding `max_disk_bytes`,
+    then evicted down to `DISK_LOW_WATER` of it so that the next scan is many results away.
+    """
+
+    DISK_LOW_WATER = 0.9
+
+    def __init__(self, max_bytes: int, directory: str | None = None, max_disk_bytes: int = 0):
+        self.max_bytes = max_bytes
+        self.directory = directory
+        self.max_disk_bytes = max_disk_bytes
+        self.size = 0
+        self.disk_size = 0
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+        if self.directory:
+            os.makedirs(self.directory, exist_ok=True)
+            self.disk_size = sum(size for _, size, _ in self._disk_entries())
+
+    @staticmethod
+    def key(digest: bytes, settings: str, pages=None) -> str:
+        """
+        Identifies the result of parsing a file with given parser settings, of the selected pages only when given.
+        """
+        if pages is not None:
+            return f"{digest.hex()}-{settings}-pages{pages}"
+        return f"{digest.hex()}-{settings}"
+
+    @staticmethod
+    def page_key(fingerprint: str, settings: str) -> str:
+        return f"page-{fingerprint}-{settings}"
+
+    def get(self, key: str) -> list[dict] | None:
+        """
+        Returns cached chunks or None.
+        """
+        with self._lock:
+            if key in self._entries:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return self._entries[key][0]
+
+        content = None
+        path = self._path(key)
+        if path is not None:
+            try:
+                with open(path, "rb") as fin:
+                    content = fin.read()
+                os.utime(path)
+            except OSError:
+                pass
+
+        if content is None:
+            with self._lock:
+                self.misses += 1
+            return None
+
+        chunks = json.loads(content)
+        with self._lock:
+            self.disk_hits += 1
+            self._remember(key, chunks, len(content))
+        return chunks
+
+    def put(self, key: str, chunks: list[dict]):
+        self.put_many([(key, chunks)])
+
+    def put_many(self, items: list[tuple[str, list[dict] | dict]]):
+        """
+        Stores results under their keys, evicting from disk once for all of them when over `max_disk_bytes`.
+        """
+        for key, chunks in items:
+            content = json.dumps(chunks, separators=(",", ":")).encode()
+
+            with self._lock:
+                self._remember(key, chunks, len(content))
+
+            if self.directory:
+                path = self._path(key)
+                tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+                with open(tmp_path, "wb") as fout:
+                    fout.write(content)
+                try:
+                    replaced_size = os.stat(path).st_size
+                except FileNotFoundError:
+                    replaced_size = 0
+                os.replace(tmp_path, path)
+                with self._lock:
+                    self.disk_size += len(content) - replaced_size
+
+        if self.directory and self.disk_size > self.max_disk_bytes:
+            self._evict_disk()
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self.size = 0
+
+        if self.directory:
+            for entry in os.scandir(self.directory):
+                os.remove(entry.path)
+            self.disk_size = 0
+
+    def stats(self) -> dict:
+        return {
+            "entries": len(self._entries),
+            "size_b": self.size,
+            "hits": self.hits,
+            "disk_hits": self.disk_hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+        }
+
+    def _path(self, key: str) -> str | None:
+        if not self.directory:
+            return None
+        return os.path.join(self.directory, f"{key}.json")
+
+    def _remember(self, key: str, chunks: list[dict], size: int):
+        if size > self.max_bytes:
+            return
+
+        if key in self._entries:
+            self.size -= self._entries.pop(key)[1]
+        self._entries[key] = (chunks, size)
+        self.size += size
+
+        while self.size > self.max_bytes:
+            _, (_, evicted_size) = self._entries.popitem(last=False)
+            self.size -= evicted_size
+            self.evictions += 1
+
+    def _disk_entries(self) -> list[tuple[float, int, str]]:
+        entries = []
+        for entry in os.scandir(self.directory):
+            if not entry.name.endswith(".json"):
+                continue
+            try:
+                stat = entry.stat()
+            except FileNotFoundError:
+                continue
+            entries.append((stat.st_mtime, stat.st_size, entry.path))
+        return entries
+
+    def _evict_disk(self):
+        # rescanned rather than trusted, other processes may share the directory
+        entries = sorted(self._disk_entries())
+        disk_size = sum(size for _, size, _ in entries)
+
+        for _, size, path in entries:
+            if disk_size <= self.max_disk_bytes * self.DISK_LOW_WATER:
+                break
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+            disk_size -= size
+            self.evictions += 1
+
+        with self._lock:
+            self.disk_size = disk_size
@@ -0,0 +1,598 @@
+import io
+import os
+import mmap
+import time
+import signal
+import queue as queue_module
+import asyncio
+import weakref
+import contextlib
+import multiprocessing
+from typing import AsyncIterator, Iterable
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from logging import getLogger
+
+from pdf_api.utils.pdf_parser import PdfParser, PageRanges, ParseBudget, ParseBudgetExceeded, add_stats
+from pdf_api.utils.page_fingerprints import page_fingerprints
+
+log = getLogger(__name__)
+
+_engine: str | None = None
+_parsers: dict[str, PdfParser] = {}
+
+
+class ParsePoolFull(Exception):
+    """
+    Raised when the parse queue is full.
+    """
+
+
+class ParseWorkerLost(Exception):
+    """
+    Raised when a worker process died, e.g. killed on running out of memory, before finishing a parse.
+    """
+
+
+class WorkerBudget(ParseBudget):
+    """
+    ParseBudget of a parse in the pool. Workers list their pids in `workers`, a manager list, while working
+    on the parse, so that the pool can kill them when the parse does not stop at its deadline.
+    """
+
+    def __init__(self, *args, workers=None, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.workers = workers
+        self.killed = False
+
+
+@contextlib.contextmanager
+def _working(budget: ParseBudget | None):
+    """
+    Lists the worker process in the budget's workers while the block runs.
+    """
+    workers = getattr(budget, "workers", None)
+    if workers is None:
+        yield
+        return
+
+    pid = os.getpid()
+    workers.append(pid)
+    try:
+        yield
+    finally:
+        workers.remove(pid)
+
+
+def _init_worker(engine: str):
+    global _engine
+    _engine = engine
+
+
+def _parser(profile: str) -> PdfParser:
+    if profile not in _parsers:
+        _parsers[profile] = PdfParser(engine=_engine, profile=profile)
+    return _parsers[profile]
+
+
+class MappedFile(io.RawIOBase):
+    """
+    Read-only file backed by a memory map, so its pages are shared with the OS page cache instead of copied into buffers.
+    """
+
+    def __init__(self, path: str):
+        with open(path, "rb") as fin:
+            self._map = mmap.mmap(fin.fileno(), 0, access=mmap.ACCESS_READ)
+
+    def readable(self) -> bool:
+        return True
+
+    def seekable(self) -> bool:
+        return True
+
+    def read(self, size: int = -1) -> bytes:
+        return self._map.read(None if size < 0 else size)
+
+    def readinto(self, buffer) -> int:
+        data = self._map.read(len(buffer))
+        buffer[: len(data)] = data
+        return len(data)
+
+    def seek(self, offset: int, whence: int = io.SEEK_SET) -> int:
+        self._map.seek(offset, whence)
+        return self._map.tell()
+
+    def tell(self) -> int:
+        return self._map.tell()
+
+    def close(self):
+        if not self.closed:
+            self._map.close()
+        super().close()
+
+
+def _open(source: str | bytes):
+    if isinstance(source, bytes):
+        return io.BytesIO(source)
+    if os.path.getsize(source) == 0:
+        return open(source, "rb")  # empty files cannot be mapped
+    return MappedFile(source)
+
+
+def _get_text(
+    source: str | bytes, profile: str, pages: PageRanges | None = None, budget: ParseBudget | None = None
+) -> tuple[list[dict], float, dict]:
+    """
+    Runs in a worker process. Accepts a path or the content of a PDF file.
+    """
+    stats = {}
+    with _working(budget), _open(source) as fin:
+        chunks, elapsed_s = _parser(profile).get_text(fin, stats, pages, budget)
+    return chunks, elapsed_s, stats
+
+
+def _stream_text(source: str | bytes, queue, profile: str, pages: PageRanges | None, budget: ParseBudget):
+    """
+    Runs in a worker process. Puts lists of elements on the queue page by page, then parse stats, None when done.
+    """
+    try:
+        stats = {}
+        with _working(budget), _open(source) as fin:
+            for page_elems in _parser(profile).iter_text(fin, stats, pages, budget):
+                if budget.cancel.is_set():
+                    break
+                queue.put(page_elems)
+        queue.put(stats)
+    finally:
+        queue.put(None)
+
+
+def _next_item(queue, future):
+    """
+    Returns the next item the worker running future put on the queue, raises what the future raised
+    when the worker is gone without finishing the queue.
+    """
+    while True:
+        try:
+            return queue.get(timeout=1.0)
+        except queue_module.Empty:
+            if future.done():
+                future.result()
+                return None
+
+
+def _drain(queue, future):
+    with contextlib.suppress(BrokenProcessPool):
+        while _next_item(queue, future) is not None:
+            pass
+
+
+def _count_pages(source: str | bytes, budget: ParseBudget | None = None) -> int:
+    with _working(budget), _open(source) as fin:
+        return PdfParser.count_pages(fin, budget)
+
+
+def _get_page_range(
+    source: str | bytes, profile: str, start: int, stop: int, budget: ParseBudget | None = None
+) -> tuple[list[dict], int, float, dict]:
+    stats = {}
+    with _working(budget), _open(source) as fin:
+        elems, positions, elapsed_s = _parser(profile).get_page_range(fin, start, stop, stats, budget)
+    return elems, positions, elapsed_s, stats
+
+
+def _get_pages(
+    source: str | bytes, profile: str, pages: PageRanges, budget: ParseBudget | None = None
+) -> tuple[list[tuple[int, list[dict], int]], float, dict]:
+    timer_start = time.perf_counter()
+    stats = {}
+    with _working(budget), _open(source) as fin:
+        results = list(_parser(profile).iter_pages(fin, pages, stats, budget))
+    return results, (time.perf_counter() - timer_start), stats
+
+
+def _fingerprint_pages(source: str | bytes, budget: ParseBudget | None = None) -> list[str]:
+    with _working(budget), _open(source) as fin:
+        return page_fingerprints(fin, budget)
+
+
+def truncation(stats: dict) -> dict:
+    """
+    Takes the reason a parse was cut short, if it was, off its stats.
+
+    Returns metadata flagging the parse as truncated with the reason, empty when it was not
+    """
+    reason = stats.pop("truncated", None)
+    return {} if reason is None else {"truncated": True, "truncated_reason": reason}
+
+
+def merge_stats(parts: Iterable[dict]) -> dict:
+    """
+    Returns stats of parses of parts of a file added up, "truncated" with the reason the first truncated part was.
+    """
+    stats = {}
+    for part_stats in parts:
+        part_stats = dict(part_stats)
+        reason = part_stats.pop("truncated", None)
+        add_stats(stats, **part_stats)
+        if reason is not None:
+            stats.setdefault("truncated", reason)
+    return stats
+
+
+def file_source(fileobj) -> str | bytes:
+    """
+    Returns a path under which a worker process can open an uploaded file, or the file content.
+
+    Uploads rolled over to disk are passed by path so their content is not pickled,
+    only small in-memory uploads are sent as bytes.
+    """
+    if getattr(fileobj, "_rolled", True):
+        try:
+            path = f"/proc/{os.getpid()}/fd/{fileobj.fileno()}"
+        except (AttributeError, OSError, io.UnsupportedOperation):
+            path = None
+        if path is not None and os.path.exists(path):
+            return path
+
+    fileobj.seek(0)
+    content = fileobj.read()
+    fileobj.seek(0)
+    return content
+
+
+class ParsePool:
+    """
+    Pool of parser processes used to keep CPU-bound parsing off the event loop.
+
+    Parses use the `profile` extraction profile unless another one is requested.
+    They stop with the pages done so far at their deadline, at a page drawing more than `page_glyphs` glyphs,
+    or when the awaiting caller is cancelled, so that no file keeps a worker busy indefinitely.
+    Workers still running a parse `kill_grace_s` seconds after its deadline, stuck where the budget is not checked,
+    are killed, losing the pages they parsed. Other parses failing with them are retried once.
+
+    At most `queue_limit` parses may be queued or running at once, further ones raise ParsePoolFull.
+    Documents of at least `split_pages` pages are split into up to `split_ranges` page ranges parsed in parallel.
+    Streamed parses buffer up to `stream_pages` pages.
+
+    A worker process dying fails the parses running in the pool with ParseWorkerLost, the next ones get new workers.
+    """
+
+    def __init__(
+        self,
+        workers: int,
+        queue_limit: int,
+        engine: str = "layout",
+        profile: str = "full",
+        split_pages: int = 0,
+        split_ranges: int = 1,
+        stream_pages: int = 16,
+        page_glyphs: int = 0,
+        kill_grace_s: float = 0.0,
+    ):
+        self.workers = workers
+        self.queue_limit = queue_limit
+        self.engine = engine
+        self.profile = profile
+        self.settings = self.settings_for(profile)
+        self.split_pages = split_pages
+        self.split_ranges = split_ranges
+        self.stream_pages = stream_pages
+        self.page_glyphs = page_glyphs
+        self.kill_grace_s = kill_grace_s
+        self.pending = 0
+        self._executor = None
+        self._manager = None
+        # executors broken by killing workers of parses past their deadline
+        self._killed_executors = weakref.WeakSet()
+
+    def settings_for(self, profile: str | None = None) -> str:
+        """
+        Returns PdfParser.settings of parses with the profile, the pool's default one when not given.
+        """
+        return PdfParser(engine=self.engine, profile=profile or self.profile).settings
+
+    @property
+    def executor(self) -> ProcessPoolExecutor:
+        if self._executor is None:
+            self._executor = ProcessPoolExecutor(
+                max_workers=self.workers,
+                mp_context=multiprocessing.get_context("spawn"),
+                initializer=_init_worker,
+                initargs=(self.engine,),
+            )
+        return self._executor
+
+    @property
+    def manager(self):
+        if self._manager is None:
+            self._manager = multiprocessing.get_context("spawn").Manager()
+        return self._manager
+
+    @property
+    def full(self) -> bool:
+        return self.pending >= self.queue_limit
+
+    @contextlib.contextmanager
+    def slot(self):
+        """
+        Holds a place among the `queue_limit` parses allowed at once, raises ParsePoolFull when there is none.
+        """
+        if self.full:
+            raise ParsePoolFull(f"{self.pending} parses pending")
+
+        self.pending += 1
+        try:
+            yield
+        finally:
+            self.pending -= 1
+
+    @contextlib.contextmanager
+    def _budget(self, deadline: float | None):
+        """
+        Yields a WorkerBudget for workers, cancelled when the caller is cancelled or fails.
+        Its workers are killed when still running `kill_grace_s` after the deadline.
+        """
+        budget = WorkerBudget(
+            deadline=deadline, page_glyphs=self.page_glyphs, cancel=self.manager.Event(), workers=self.manager.list()
+        )
+        watchdog = None
+
+        def kill():
+            nonlocal watchdog
+            if not self._kill(budget):
+                # not started yet or between tasks, once started it stops at its first check
+                watchdog = loop.call_later(1.0, kill)
+
+        if deadline and self.kill_grace_s:
+            loop = asyncio.get_running_loop()
+            watchdog = loop.call_later(max(0.0, deadline + self.kill_grace_s - time.time()), kill)
+        try:
+            yield budget
+        except BaseException:
+            budget.cancel.set()
+            raise
+        finally:
+            if watchdog is not None:
+                watchdog.cancel()
+
+    def _kill(self, budget: WorkerBudget) -> bool:
+        """
+        Kills the workers running a parse past its deadline.
+
+        Returns whether any worker was killed
+        """
+        pids = list(budget.workers)
+        if not pids:
+            return False
+
+        log.warning("Killing parser processes %s, still parsing %ss after the deadline", pids, self.kill_grace_s)
+        budget.killed = True
+        budget.cancel.set()
+        if self._executor is not None:
+            self._killed_executors.add(self._executor)
+        for pid in pids:
+            with contextlib.suppress(ProcessLookupError):
+                os.kill(pid, signal.SIGKILL)
+        return True
+
+    def _discard_executor(self, executor: ProcessPoolExecutor):
+        """
+        Drops a broken executor, the next parse starts a new one.
+        """
+        if self._executor is executor:
+            self._executor = None
+            executor.shutdown(wait=False, cancel_futures=True)
+
+    async def _submit(self, fn, *args, budget: WorkerBudget | None = None):
+        """
+        Runs fn(*args) in a worker process, fn(*args, budget) with a budget, and awaits the result.
+
+        Raises ParseBudgetExceeded when the worker was killed for running past the budget's deadline,
+        ParseWorkerLost when it died otherwise. Parses failing because another parse's worker was killed are retried once.
+        """
+        args = args if budget is None else (*args, budget)
+        for retry in (True, False):
+            executor = self.executor
+            try:
+                return await asyncio.wrap_future(executor.submit(fn, *args))
+            except BrokenProcessPool as e:
+                self._discard_executor(executor)
+                if budget is not None and budget.killed:
+                    raise ParseBudgetExceeded("deadline") from e
+                if not (retry and executor in self._killed_executors):
+                    raise ParseWorkerLost(str(e)) from e
+
+    async def run(self, fn, *args):
+        """
+        Runs fn(*args) in a worker process and awaits the result.
+        """
+        with self.slot():
+            return await self._submit(fn, *args)
+
+    async def count_pages(self, fileobj, deadline: float | None = None) -> int:
+        """
+        Raises ParseBudgetExceeded when the pages are not counted by the deadline as time.time().
+        """
+        with self.slot(), self._budget(deadline) as budget:
+            return await self._submit(_count_pages, file_source(fileobj), budget=budget)
+
+    async def fingerprint_pages(self, fileobj, deadline: float | None = None) -> list[str]:
+        """
+        Raises ParseBudgetExceeded when the pages are not fingerprinted by the deadline as time.time().
+        """
+        with self.slot(), self._budget(deadline) as budget:
+            return await self._submit(_fingerprint_pages, file_source(fileobj), budget=budget)
+
+    def parses_pages(self, profile: str | None = None) -> bool:
+        """
+        Returns whether get_pages supports the profile, all do but with the html engine.
+        """
+        return self.engine == "layout" or (profile or self.profile) == "fast"
+
+    async def get_pages(
+        self, fileobj, pages: PageRanges, profile: str | None = None, deadline: float | None = None
+    ) -> tuple[list[tuple[int, list[dict], int]], dict, list[dict]]:
+        """
+        Accepts file-like object containing PDF file, the pages to parse and optionally the extraction profile
+        and the deadline as time.time(), parses the pages in worker processes,
+        at least `split_pages` of them split into up to `split_ranges` parts.
+
+        Returns:
+            list of what PdfParser.iter_pages yields, pages not parsed in a truncated part missing,
+            parse stats, with "truncated" holding the reason when any part was truncated,
+            the first and last page and seconds taken of each part
+        """
+        pagenos = [pageno for r in pages.ranges for pageno in r]
+        if not pagenos:
+            return [], {}, []
+
+        source = file_source(fileobj)
+        profile = profile or self.profile
+        parts = self.split_ranges if self.split_ranges > 1 and self.split_pages > 0 and len(pagenos) >= self.split_pages else 1
+        part_size = -(-len(pagenos) // parts)
+        selections = [
+            PageRanges(range(pageno, pageno + 1) for pageno in pagenos[start : start + part_size])
+            for start in range(0, len(pagenos), part_size)
+        ]
+
+        async def get_part(selection: PageRanges) -> tuple[list[tuple[int, list[dict], int]], float, dict]:
+            timer_start = time.perf_counter()
+            try:
+                return await self._submit(_get_pages, source, profile, selection, budget=budget)
+            except ParseBudgetExceeded as e:
+                return [], (time.perf_counter() - timer_start), {"truncated": e.reason}
+
+        with self.slot(), self._budget(deadline) as budget:
+            results = await asyncio.gather(*(get_part(selection) for selection in selections))
+
+        ranges = [
+            {"pages": [selection.nth(0) + 1, selection.stop], "job_time_s": round(elapsed_s, 2)}
+            for selection, (_, elapsed_s, _) in zip(selections, results)
+        ]
+        pages = [page for part, _, _ in results for page in part]
+        return pages, merge_stats(part_stats for _, _, part_stats in results), ranges
+
+    async def get_text(
+        self, fileobj, pages: PageRanges | None = None, profile: str | None = None, deadline: float | None = None
+    ) -> tuple[list[dict], float, dict]:
+        """
+        Accepts file-like object containing PDF file and optionally the pages to parse, the extraction profile
+        and the deadline as time.time(), parses it in worker processes.
+
+        Returns:
+            a list of dicts representing extracted text elements with attributes,
+            elapsed seconds,
+            dict of additional metadata, the profile under "profile", parse stats of PdfParser.iter_text under "stats"
+            and, when the parse was cut short, "truncated" and the reason under "truncated_reason"
+        """
+        source = file_source(fileobj)
+        profile = profile or self.profile
+
+        with self.slot(), self._budget(deadline) as budget:
+            timer_start = time.perf_counter()
+            split = self.engine == "layout" or profile == "fast"
+            try:
+                if split and self.split_ranges > 1 and self.split_pages > 0 and pages is None:
+                    chunks, elapsed_s, metadata = await self._get_text_split(source, profile, budget)
+                else:
+                    chunks, elapsed_s, stats = await self._submit(_get_text, source, profile, pages, budget=budget)
+                    metadata = {"stats": stats}
+            except ParseBudgetExceeded as e:
+                # killed, or out of budget counting pages, nothing parsed is left
+                chunks, elapsed_s, metadata = [], (time.perf_counter() - timer_start), {"stats": {"truncated": e.reason}}
+            return chunks, elapsed_s, {"profile": profile, **truncation(metadata["stats"]), **metadata}
+
+    async def iter_text(
+        self,
+        fileobj,
+        pages: PageRanges | None = None,
+        profile: str | None = None,
+        deadline: float | None = None,
+        stats: dict | None = None,
+        reserved: bool = False,
+    ) -> AsyncIterator[list[dict]]:
+        """
+        Accepts file-like object containing PDF file and optionally the pages to parse, the extraction profile,
+        the deadline as time.time() and a dict to add parse stats to, as PdfParser.iter_text does,
+        parses it in a worker process. A `reserved` parse runs in a slot the caller holds already.
+
+        Yields the same as PdfParser.iter_text as soon as the worker produces it,
+        at most `stream_pages` pages are buffered when the consumer is slower than the worker.
+        """
+        source = file_source(fileobj)
+        stats = {} if stats is None else stats
+
+        with contextlib.nullcontext() if reserved else self.slot(), self._budget(deadline) as budget:
+            queue = self.manager.Queue(maxsize=self.stream_pages)
+            executor = self.executor
+            future = executor.submit(_stream_text, source, queue, profile or self.profile, pages, budget)
+            item = []
+            try:
+                while (item := await asyncio.to_thread(_next_item, queue, future)) is not None:
+                    if isinstance(item, dict):
+                        stats.update(item)
+                    else:
+                        yield item
+                await asyncio.wrap_future(future)
+            except BrokenProcessPool as e:
+                item = None
+                self._discard_executor(executor)
+                if not budget.killed:
+                    raise ParseWorkerLost(str(e)) from e
+                stats["truncated"] = "deadline"
+            finally:
+                if item is not None:
+                    # consumer went away before the worker was done, let it finish early
+                    budget.cancel.set()
+                    await asyncio.to_thread(_drain, queue, future)
+
+    async def _get_text_split(self, source: str | bytes, profile: str, budget: WorkerBudget) -> tuple[list[dict], float, dict]:
+        """
+        Parses page ranges of large documents in parallel.
+
+        When a range is truncated, the document ends with the pages parsed of it, later ranges are dropped.
+        A range whose worker was killed ends it before the range.
+        """
+        timer_start = time.perf_counter()
+
+        pages = await self._submit(_count_pages, source, budget=budget)
+        if pages < self.split_pages:
+            chunks, _, stats = await self._submit(_get_text, source, profile, None, budget=budget)
+            return chunks, (time.perf_counter() - timer_start), {"stats": stats}
+
+        async def get_range(start: int, stop: int) -> tuple[list[dict], int, float, dict]:
+            range_start = time.perf_counter()
+            try:
+                return await self._submit(_get_page_range, source, profile, start, stop, budget=budget)
+            except ParseBudgetExceeded as e:
+                return [], 0, (time.perf_counter() - range_start), {"truncated": e.reason}
+
+        range_size = -(-pages // self.split_ranges)
+        bounds = [(start, min(start + range_size, pages)) for start in range(0, pages, range_size)]
+        results = await asyncio.gather(*(get_range(start, stop) for start, stop in bounds))
+        for index, ((start, _), (_, _, _, range_stats)) in enumerate(zip(bounds, results)):
+            if "truncated" in range_stats:
+                bounds, results = bounds[: index + 1], results[: index + 1]
+                pages = start + range_stats.get("pages", 0)
+                break
+        chunks = PdfParser.merge_page_ranges(
+            [(elems, positions) for elems, positions, _, _ in results], pages, footer=profile != "fast"
+        )
+
+        timer_stop = time.perf_counter()
+
+        ranges = [
+            {"pages": [start + 1, stop], "job_time_s": round(elapsed_s, 2)}
+            for (start, stop), (_, _, elapsed_s, _) in zip(bounds, results)
+        ]
+        stats = merge_stats(range_stats for _, _, _, range_stats in results)
+        return chunks, (timer_stop - timer_start), {"ranges": ranges, "stats": stats}
+
+    def shutdown(self):
+        if self._executor is not None:
+            self._executor.shutdown(cancel_futures=True)
+            self._executor = None
+        if self._manager is not None:
+            self._manager.shutdown()
+            self._manager = None
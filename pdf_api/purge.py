@@ -0,0 +1,88 @@
+import asyncio
+import datetime as dt
+
+from logging import getLogger
+
+from sqlalchemy import select, update, delete, exists
+
+from pdf_api.db import Session
+from pdf_api.models import User, Document
+
+log = getLogger(__name__)
+
+
+def soft_delete_user(sess, user_id: int):
+    """
+    Marks the user and their documents deleted, leaving removing them to a Purger.
+    """
+    now = dt.datetime.utcnow()
+    sess.execute(update(User).where(User.id == user_id).values(deleted_at=now))
+    sess.execute(update(Document).where(Document.owner_id == user_id).where(Document.deleted_at.is_(None)).values(deleted_at=now))
+
+
+def purge_batch(sess, batch_size: int) -> int:
+    """
+    Deletes up to `batch_size` documents marked deleted, their chunks with them by ON DELETE CASCADE,
+    and deleted users with no documents left.
+
+    Returns number of documents deleted
+    """
+    deleted_users = select(User.id).where(User.deleted_at.is_not(None))
+    # documents a job added for a user after the user was deleted
+    sess.execute(
+        update(Document)
+        .where(Document.owner_id.in_(deleted_users))
+        .where(Document.deleted_at.is_(None))
+        .values(deleted_at=dt.datetime.utcnow()),
+        execution_options={"synchronize_session": False},
+    )
+
+    batch = select(Document.id).where(Document.deleted_at.is_not(None)).order_by(Document.deleted_at).limit(batch_size)
+    ids = sess.execute(batch).scalars().all()
+    if ids:
+        sess.execute(delete(Document).where(Document.id.in_(ids)), execution_options={"synchronize_session": False})
+
+    sess.execute(
+        delete(User).where(User.deleted_at.is_not(None)).where(~exists().where(Document.owner_id == User.id)),
+        execution_options={"synchronize_session": False},
+    )
+    return len(ids)
+
+
+class Purger:
+    """
+    Removes users and documents deleted in soft delete mode in the background, `batch_size` documents
+    per transaction, so that deleting large documents neither blocks requests nor holds long locks.
+
+    Batches run back to back while there are deleted documents left, otherwise every `interval_s` seconds.
+    """
+
+    def __init__(self, batch_size: int, interval_s: float = 10.0):
+        self.batch_size = batch_size
+        self.interval_s = interval_s
+        self._task = None
+
+    def purge(self) -> int:
+        with Session.begin() as sess:
+            return purge_batch(sess, self.batch_size)
+
+    def start(self):
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task is None:
+            return
+
+        self._task.cancel()
+        await asyncio.gather(self._task, return_exceptions=True)
+        self._task = None
+
+    async def _run(self):
+        while True:
+            try:
+                purged = await asyncio.to_thread(self.purge)
+            except Exception:
+                log.exception("Purging deleted documents failed")
+                purged = 0
+            if purged < self.batch_size:
+                await asyncio.sleep(self.interval_s)
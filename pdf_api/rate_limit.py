@@ -0,0 +1,85 @@
+import time
+
+from sqlalchemy import select, delete, func
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.ext.asyncio import AsyncEngine
+
+from pdf_api.models import RateLimit
+
+
+class RateLimiter:
+    """
+    Token buckets of clients stored in the database, so that all app processes draw from the same buckets.
+
+    Buckets hold up to `burst` tokens and refill at `rate` tokens per second. A request needs a token to start,
+    work it did, such as pages parsed, is charged afterwards and may leave the bucket in debt until it refills.
+    Buckets are updated by single upserts, concurrent requests of a client cannot both spend the same tokens.
+    A `rate` of 0 disables limiting.
+    """
+
+    # full buckets are deleted every PURGE_EVERY requests of a process, a missing bucket is a full one
+    PURGE_EVERY = 1000
+
+    def __init__(self, engine: AsyncEngine, rate: float, burst: float):
+        self.engine = engine
+        self.rate = rate
+        self.burst = burst
+        self._updates = 0
+
+    @property
+    def enabled(self) -> bool:
+        return self.rate > 0
+
+    def _upsert(self, key: str, cost: float, now: float, conditional: bool):
+        if self.engine.dialect.name == "postgresql":
+            insert, least = postgresql.insert, func.least
+        else:
+            insert, least = sqlite.insert, func.min  # SQLite's min() of several arguments is scalar
+
+        refilled = least(self.burst, RateLimit.tokens + (now - RateLimit.updated_at) * self.rate)
+        return (
+            insert(RateLimit)
+            .values(key=key, tokens=self.burst - cost, updated_at=now)
+            .on_conflict_do_update(
+                index_elements=[RateLimit.key],
+                set_={"tokens": refilled - cost, "updated_at": now},
+                where=(refilled >= cost) if conditional else None,
+            )
+            .returning(RateLimit.tokens)
+        )
+
+    async def acquire(self, key: str, cost: float = 1) -> float:
+        """
+        Takes cost tokens from the key's bucket if it holds that many.
+
+        Returns 0 when taken, otherwise seconds until the bucket holds enough tokens.
+        """
+        if not self.enabled:
+            return 0
+
+        now = time.time()
+        async with self.engine.begin() as conn:
+            taken = (await conn.execute(self._upsert(key, cost, now, conditional=True))).first()
+            if taken is not None:
+                await self._maybe_purge(conn, now)
+                return 0
+
+            bucket = (await conn.execute(select(RateLimit.tokens, RateLimit.updated_at).where(RateLimit.key == key))).one()
+
+        tokens = min(self.burst, bucket.tokens + (now - bucket.updated_at) * self.rate)
+        return max((cost - tokens) / self.rate, 0.001)
+
+    async def charge(self, key: str, cost: float):
+        """
+        Takes cost tokens from the key's bucket, leaving it in debt when it holds fewer.
+        """
+        if not self.enabled or cost <= 0:
+            return
+
+        async with self.engine.begin() as conn:
+            await conn.execute(self._upsert(key, cost, time.time(), conditional=False))
+
+    async def _maybe_purge(self, conn, now: float):
+        self._updates += 1
+        if self._updates % self.PURGE_EVERY == 0:
+            await conn.execute(delete(RateLimit).where(RateLimit.tokens + (now - RateLimit.updated_at) * self.rate >= self.burst))
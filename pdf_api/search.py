@@ -0,0 +1,58 @@
+from sqlalchemy import select, func, literal_column, table, column
+from sqlalchemy.orm import aliased
+
+from pdf_api.models import Document, DocumentChunk, SEARCH_CONFIG
+from pdf_api.documents import readable_by
+
+# external content FTS5 table over document_chunks, kept up to date by triggers
+chunks_fts = table("document_chunks_fts", column("rowid"), column("rank"))
+
+
+def fts5_query(q: str) -> str:
+    """
+    Returns an FTS5 query matching chunks containing all words of q, without FTS5 operators.
+    """
+    return " ".join('"{}"'.format(word.replace('"', '""')) for word in q.split())
+
+
+def search_query(dialect: str, q: str, user_id: int | None, limit: int):
+    """
+    Returns a query of the chunks matching q in documents the user can read, best matches first.
+
+    Rows have document_id, pos, string, heading (text of the closest preceding h1 chunk) and score.
+    """
+    heading_chunk = aliased(DocumentChunk)
+    heading = (
+        select(heading_chunk.string)
+        .where(heading_chunk.document_id == DocumentChunk.document_id)
+        .where(heading_chunk.seq < DocumentChunk.seq)
+        .where(heading_chunk.type == "h1")
+        .order_by(heading_chunk.seq.desc())
+        .limit(1)
+        .scalar_subquery()
+    )
+
+    if dialect == "sqlite":
+        score = -chunks_fts.c.rank
+        query = (
+            select(
+                DocumentChunk.document_id, DocumentChunk.pos, DocumentChunk.string, heading.label("heading"), score.label("score")
+            )
+            .join(chunks_fts, chunks_fts.c.rowid == literal_column("document_chunks.rowid"))
+            .where(literal_column("document_chunks_fts").op("MATCH")(fts5_query(q)))
+        )
+    else:
+        config = literal_column(f"'{SEARCH_CONFIG}'::regconfig")
+        document = func.to_tsvector(config, DocumentChunk.string)
+        tsquery = func.websearch_to_tsquery(config, q)
+        score = func.ts_rank(document, tsquery)
+        query = select(
+            DocumentChunk.document_id, DocumentChunk.pos, DocumentChunk.string, heading.label("heading"), score.label("score")
+        ).where(document.bool_op("@@")(tsquery))
+
+    return (
+        query.join(Document, Document.id == DocumentChunk.document_id)
+        .where(readable_by(user_id))
+        .order_by(score.desc(), DocumentChunk.document_id, DocumentChunk.seq)
+        .limit(limit)
+    )
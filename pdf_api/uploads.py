@@ -0,0 +1,87 @@
+import shutil
+import zipfile
+import tempfile
+
+from fastapi import HTTPException, UploadFile, status
+from fastapi.responses import JSONResponse
+
+ZIP_CONTENT_TYPES = ("application/zip", "application/x-zip-compressed")
+
+
+def too_large(detail: str) -> HTTPException:
+    return HTTPException(status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE, detail=detail)
+
+
+class UploadSizeLimit:
+    """
+    ASGI middleware rejecting request bodies over `max_bytes` with 413, and invalid Content-Length headers with 400.
+
+    Requests declaring a larger Content-Length are rejected before their body is read,
+    others once the received body exceeds the limit, so oversized uploads are never spooled whole.
+    """
+
+    def __init__(self, app, max_bytes: int):
+        self.app = app
+        self.max_bytes = max_bytes
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not self.max_bytes:
+            return await self.app(scope, receive, send)
+
+        content_length = dict(scope["headers"]).get(b"content-length", b"0").strip()
+        if not content_length.isdigit():
+            response = JSONResponse({"detail": "Invalid Content-Length"}, status_code=status.HTTP_400_BAD_REQUEST)
+            return await response(scope, receive, send)
+        if int(content_length) > self.max_bytes:
+            response = JSONResponse({"detail": "Upload too large"}, status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE)
+            return await response(scope, receive, send)
+
+        received = 0
+
+        async def receive_limited():
+            nonlocal received
+            message = await receive()
+            received += len(message.get("body", b""))
+            if received > self.max_bytes:
+                raise too_large("Upload too large")
+            return message
+
+        await self.app(scope, receive_limited, send)
+
+
+def is_zip(file: UploadFile) -> bool:
+    return file.content_type in ZIP_CONTENT_TYPES or (file.filename or "").lower().endswith(".zip")
+
+
+def zip_entries(fileobj, max_entries: int, max_bytes: int) -> list[tuple[str, tempfile.TemporaryFile]]:
+    """
+    Extracts PDF files of a ZIP archive to temporary files, returns their names and open files.
+
+    Raises BadZipFile for malformed archives and 413 when the archive holds more than `max_entries` PDF files
+    or more than `max_bytes` of them uncompressed (0 disables either), checked before anything is extracted.
+    """
+    entries = []
+    with zipfile.ZipFile(fileobj) as archive:
+        infos = [
+            info
+            for info in archive.infolist()
+            if not info.is_dir() and info.filename.lower().endswith(".pdf") and not info.filename.startswith("__MACOSX/")
+        ]
+        if max_entries and len(infos) > max_entries:
+            raise too_large(f"Archive has {len(infos)} PDF files, at most {max_entries} are accepted")
+        if max_bytes and sum(info.file_size for info in infos) > max_bytes:
+            raise too_large("Archive content too large")
+
+        try:
+            for info in infos:
+                entry = tempfile.TemporaryFile()
+                entries.append((info.filename, entry))
+                with archive.open(info) as fin:
+                    shutil.copyfileobj(fin, entry)
+                entry.seek(0)
+        except BaseException:
+            for _, entry in entries:
+                entry.close()
+            raise
+
+    return entries
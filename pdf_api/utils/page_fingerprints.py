@@ -0,0 +1,94 @@
+import hashlib
+
+import pikepdf
+
+from pdf_api.utils.pdf_parser import ParseBudget
+
+# page attributes, inherited ones included, that change what a page renders to
+PAGE_KEYS = ("/Contents", "/Resources", "/MediaBox", "/CropBox", "/Rotate")
+
+
+class PageFingerprinter:
+    """
+    Hashes what pages of a PDF file are drawn from: content streams, resources (fonts, images, forms)
+    and page boxes, so that equal pages of different files, such as revisions of a document, get equal fingerprints.
+
+    Streams are hashed as stored, without decoding them. Objects shared by pages are hashed once.
+    """
+
+    def __init__(self):
+        self._digests = {}
+        self._visiting = set()
+
+    def page(self, page: pikepdf.Page) -> str:
+        h = hashlib.sha256()
+        for key in PAGE_KEYS:
+            value = self._inherited(page.obj, key)
+            h.update(key.encode())
+            if value is not None:
+                self._feed(h, value)
+        return h.hexdigest()
+
+    @staticmethod
+    def _inherited(obj: pikepdf.Dictionary, key: str):
+        while obj is not None:
+            if key in obj:
+                return obj[key]
+            obj = obj.get("/Parent")
+        return None
+
+    def _feed(self, h, obj):
+        if not getattr(obj, "is_indirect", False):
+            return self._feed_direct(h, obj)
+
+        objgen = obj.objgen
+        if objgen not in self._digests:
+            if objgen in self._visiting:
+                h.update(b"R%d %d" % objgen)  # reference cycle
+                return
+            self._visiting.add(objgen)
+            digest = hashlib.sha256()
+            self._feed_direct(digest, obj)
+            self._visiting.discard(objgen)
+            self._digests[objgen] = digest.digest()
+        h.update(self._digests[objgen])
+
+    def _feed_direct(self, h, obj):
+        if isinstance(obj, pikepdf.Stream):
+            h.update(b"stream")
+            self._feed_dictionary(h, obj.stream_dict)
+            h.update(obj.read_raw_bytes())
+        elif isinstance(obj, pikepdf.Dictionary):
+            self._feed_dictionary(h, obj)
+        elif isinstance(obj, pikepdf.Array):
+            h.update(b"[")
+            for item in obj:
+                self._feed(h, item)
+            h.update(b"]")
+        else:
+            h.update(repr(obj).encode())
+
+    def _feed_dictionary(self, h, obj):
+        h.update(b"<<")
+        for key in sorted(obj.keys()):
+            if key == "/Parent":
+                continue
+            h.update(key.encode())
+            self._feed(h, obj[key])
+        h.update(b">>")
+
+
+def page_fingerprints(buffer, budget: ParseBudget | None = None) -> list[str]:
+    """
+    Accepts file-like buffer containing PDF file and optionally a budget, checked between pages.
+
+    Returns fingerprints of its pages, see PageFingerprinter
+    """
+    with pikepdf.open(buffer) as pdf:
+        fingerprinter = PageFingerprinter()
+        fingerprints = []
+        for page in pdf.pages:
+            if budget is not None:
+                budget.check()
+            fingerprints.append(fingerprinter.page(page))
+        return fingerprints
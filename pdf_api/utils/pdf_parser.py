@@ -1,16 +1,496 @@
+from pdfminer import __version__ as pdfminer_version
 from pdfminer.high_level import extract_text_to_fp
-from pdfminer.layout import LAParams
+from pdfminer.pdfpage import PDFPage
+from pdfminer.pdfparser import PDFParser
+from pdfminer.pdfdocument import PDFDocument
+from pdfminer.pdfinterp import PDFResourceManager, PDFPageInterpreter
+from pdfminer.pdfdevice import PDFTextDevice
+from pdfminer.pdffont import PDFUnicodeNotDefined
+from pdfminer.converter import PDFPageAggregator
+from pdfminer.layout import LAParams, LTPage, LTCurve, LTFigure, LTTextLine, LTTextBox, LTChar, LTText
 from bs4 import BeautifulSoup
 
 import io
 import re
 import time
 from statistics import mean
+from typing import Iterable, Iterator
+
+
+def add_stats(stats: dict, **values):
+    for key, value in values.items():
+        stats[key] = stats.get(key, 0) + value
+
+
+def timed(iterable: Iterable, stats: dict, key: str) -> Iterator:
+    """
+    Yields from iterable, adding seconds spent producing the items to stats[key].
+    """
+    iterator = iter(iterable)
+    while True:
+        timer_start = time.perf_counter()
+        try:
+            item = next(iterator)
+        except StopIteration:
+            return
+        finally:
+            add_stats(stats, **{key: time.perf_counter() - timer_start})
+        yield item
+
+
+class PageRanges:
+    """
+    Selection of zero-based page numbers, written as 1-based ranges such as "1-5,10".
+    """
+
+    def __init__(self, ranges: Iterable[range]):
+        self.ranges = []
+        for r in sorted((r for r in ranges if r), key=lambda r: r.start):
+            if self.ranges and r.start <= self.ranges[-1].stop:
+                self.ranges[-1] = range(self.ranges[-1].start, max(self.ranges[-1].stop, r.stop))
+            else:
+                self.ranges.append(r)
+
+    @classmethod
+    def parse(cls, spec: str | None = None, max_pages: int | None = None) -> "PageRanges | None":
+        """
+        Returns pages selected by spec, limited to the first max_pages pages, None when neither limits pages.
+
+        Raises ValueError for malformed specs and specs selecting no page within max_pages.
+        """
+        if not spec and not max_pages:
+            return None
+
+        ranges = []
+        for part in spec.split(",") if spec else []:
+            first, _, last = part.strip().partition("-")
+            first, last = int(first), int(last or first)
+            if not 1 <= first <= last:
+                raise ValueError(f"Invalid page range {part!r}")
+            ranges.append(range(first - 1, last))
+        if not spec:
+            ranges.append(range(0, max_pages))
+        if max_pages:
+            ranges = [range(r.start, min(r.stop, max_pages)) for r in ranges]
+            if not any(ranges):
+                raise ValueError(f"No page of {spec!r} within the first {max_pages} pages")
+
+        return cls(ranges)
+
+    @property
+    def stop(self) -> int:
+        return self.ranges[-1].stop if self.ranges else 0
+
+    def nth(self, index: int) -> int:
+        for r in self.ranges:
+            if index < len(r):
+                return r[index]
+            index -= len(r)
+        raise IndexError(index)
+
+    def __contains__(self, pageno: int) -> bool:
+        return any(pageno in r for r in self.ranges)
+
+    def __bool__(self) -> bool:
+        return bool(self.ranges)
+
+    def __str__(self) -> str:
+        return ",".join(f"{r.start + 1}-{r.stop}" if len(r) > 1 else f"{r.start + 1}" for r in self.ranges)
+
+
+class ParseBudgetExceeded(Exception):
+    """
+    Raised while interpreting a page when the parse ran out of its ParseBudget.
+    """
+
+    def __init__(self, reason: str):
+        super().__init__(f"Parse budget exceeded: {reason}")
+        self.reason = reason
+
+    def __reduce__(self):
+        return self.__class__, (self.reason,)
+
+
+class ParseBudget:
+    """
+    Limits of a parse: a `deadline` as time.time(), at most `page_glyphs` glyphs drawn on one page
+    and a `cancel` flag, anything with is_set() such as a multiprocessing Event. 0 or None disables either.
+
+    Checked while interpreting content streams, a page exceeding the budget is abandoned and `exceeded`
+    is set to the reason, "deadline", "glyphs" or "cancelled", so that parsing stops with the pages done so far.
+    Work between content stream objects, such as layout analysis of a page, is not checked,
+    ParsePool kills workers still running well after their deadline.
+    """
+
+    # content stream objects and glyphs between checks of the deadline and the cancel flag
+    CHECK_EVERY = 5000
+
+    def __init__(self, deadline: float | None = None, page_glyphs: int = 0, cancel=None):
+        self.deadline = deadline
+        self.page_glyphs = page_glyphs
+        self.cancel = cancel
+        self.exceeded = None
+        self._glyphs = 0
+        self._ops = 0
+
+    def begin_page(self):
+        self._glyphs = 0
+        self.check()
+
+    def glyph(self):
+        self._glyphs += 1
+        if self.page_glyphs and self._glyphs > self.page_glyphs:
+            self._exceed("glyphs")
+        self.op()
+
+    def op(self):
+        self._ops += 1
+        if self._ops % self.CHECK_EVERY == 0:
+            self.check()
+
+    def check(self):
+        if self.cancel is not None and self.cancel.is_set():
+            self._exceed("cancelled")
+        if self.deadline and time.time() > self.deadline:
+            self._exceed("deadline")
+
+    def _exceed(self, reason: str):
+        self.exceeded = reason
+        raise ParseBudgetExceeded(reason)
+
+
+class BudgetedOperator:
+    """
+    Operator method of BudgetedPageInterpreter charging the interpreter's ParseBudget before it runs.
+
+    PDFPageInterpreter.execute takes the number of operands from the method's __code__, so it is kept.
+    """
+
+    def __init__(self, method, budget: ParseBudget | None = None):
+        self.method = method
+        self.budget = budget
+        self.__code__ = method.__code__
+
+    def __get__(self, interpreter, owner=None) -> "BudgetedOperator":
+        if interpreter is None:
+            return self
+        return BudgetedOperator(self.method.__get__(interpreter, owner), interpreter.budget)
+
+    def __call__(self, *args):
+        self.budget.op()
+        return self.method(*args)
+
+
+class BudgetedPageInterpreter(PDFPageInterpreter):
+    """
+    PDFPageInterpreter charging every operand and operator of the content streams it executes to a ParseBudget,
+    so that pages of operators drawing nothing, such as endless `q 1 0 0 1 0 0 cm Q`, stop at the deadline too.
+    """
+
+    def __init__(self, resource_manager, device, budget: ParseBudget):
+        super().__init__(resource_manager, device)
+        self.budget = budget
+
+    def dup(self) -> "BudgetedPageInterpreter":
+        return self.__class__(self.rsrcmgr, self.device, self.budget)
+
+    def push(self, obj):
+        self.budget.op()
+        super().push(obj)
+
+
+for name in dir(PDFPageInterpreter):
+    if name.startswith("do_"):
+        setattr(BudgetedPageInterpreter, name, BudgetedOperator(getattr(PDFPageInterpreter, name)))
+
+
+def page_interpreter(resource_manager, device, budget: ParseBudget | None) -> PDFPageInterpreter:
+    if budget is None:
+        return PDFPageInterpreter(resource_manager, device)
+    return BudgetedPageInterpreter(resource_manager, device, budget)
+
+
+class BudgetedPageAggregator(PDFPageAggregator):
+    """
+    PDFPageAggregator charging glyphs it renders to a ParseBudget.
+    """
+
+    def __init__(self, resource_manager, laparams: LAParams | None, budget: ParseBudget):
+        super().__init__(resource_manager, laparams=laparams)
+        self.budget = budget
+
+    def begin_page(self, page, ctm):
+        self.budget.begin_page()
+        super().begin_page(page, ctm)
+
+    def render_char(self, matrix, font, fontsize, scaling, rise, cid, ncs, graphicstate) -> float:
+        self.budget.glyph()
+        return super().render_char(matrix, font, fontsize, scaling, rise, cid, ncs, graphicstate)
+
+
+def interpret_pages(
+    buffer, pages: PageRanges | None, interpreter: PDFPageInterpreter, budget: ParseBudget | None
+) -> Iterator[int]:
+    """
+    Interprets the selected pages, yielding each zero-based page number once the page is done.
+
+    Stops at the page exceeding the budget, leaving the reason in budget.exceeded.
+    """
+    for pageno, page in selected_pages(buffer, pages):
+        try:
+            interpreter.process_page(page)
+        except ParseBudgetExceeded:
+            return
+        yield pageno
+
+
+def selected_pages(buffer, pages: PageRanges | None = None) -> Iterator[tuple[int, PDFPage]]:
+    for pageno, page in enumerate(PDFPage.create_pages(PDFDocument(PDFParser(buffer)))):
+        if pages is not None:
+            if pageno >= pages.stop:
+                break
+            if pageno not in pages:
+                continue
+        yield pageno, page
+
+
+def layout_pages(
+    buffer, pages: PageRanges | None = None, laparams: LAParams | None = None, budget: ParseBudget | None = None
+) -> Iterator[tuple[int, LTPage]]:
+    """
+    Yields zero-based page numbers and layouts of the selected pages, other pages are not laid out.
+    With a budget, stops at the page exceeding it.
+    """
+    resource_manager = PDFResourceManager(caching=True)
+    laparams = LAParams() if laparams is None else laparams
+    if budget is None:
+        device = PDFPageAggregator(resource_manager, laparams=laparams)
+    else:
+        device = BudgetedPageAggregator(resource_manager, laparams, budget)
+    interpreter = page_interpreter(resource_manager, device, budget)
+
+    for pageno in interpret_pages(buffer, pages, interpreter, budget):
+        yield pageno, device.get_result()
+
+
+class TextCollector(PDFTextDevice):
+    """
+    Collects the text of a page in content stream order without building a layout.
+
+    Characters are not turned into layout objects, their positions only decide where
+    spaces, line breaks and paragraph breaks (blank lines) go. Characters are charged to the budget if given.
+    """
+
+    # gaps relative to the font size
+    WORD_GAP = 0.2
+    LINE_GAP = 0.5
+    PARAGRAPH_GAP = 1.6
+
+    def __init__(self, resource_manager, budget: ParseBudget | None = None):
+        super().__init__(resource_manager)
+        self.budget = budget
+
+    def begin_page(self, page, ctm):
+        if self.budget is not None:
+            self.budget.begin_page()
+        self.text = []
+        self._end = None
+
+    def render_char(self, matrix, font, fontsize, scaling, rise, cid, ncs, graphicstate) -> float:
+        if self.budget is not None:
+            self.budget.glyph()
+        try:
+            text = font.to_unichr(cid)
+        except PDFUnicodeNotDefined:
+            text = ""
+        advance = font.char_width(cid) * fontsize * scaling
+
+        a, _, _, d, x, y = matrix
+        if self._end is not None:
+            end_x, end_y, size = self._end
+            if abs(y - end_y) > size * self.PARAGRAPH_GAP:
+                self.text.append("\n\n")
+            elif abs(y - end_y) > size * self.LINE_GAP:
+                self.text.append("\n")
+            elif x - end_x > size * self.WORD_GAP:
+                self.text.append(" ")
+        self.text.append(text)
+        self._end = (x + advance * a, y, abs(fontsize * d) or 1)
+
+        return advance
+
+
+def text_pages(buffer, pages: PageRanges | None = None, budget: ParseBudget | None = None) -> Iterator[tuple[int, str]]:
+    """
+    Yields zero-based page numbers and text of the selected pages, paragraphs separated by blank lines.
+    With a budget, stops at the page exceeding it.
+    """
+    resource_manager = PDFResourceManager(caching=True)
+    device = TextCollector(resource_manager, budget)
+    interpreter = page_interpreter(resource_manager, device, budget)
+
+    for pageno in interpret_pages(buffer, pages, interpreter, budget):
+        yield pageno, "".join(device.text)
+
+
+class LayoutWalker:
+    """
+    Builds text elements straight from pdfminer's layout tree.
+
+    Mirrors what pdfminer's HTMLConverter would render (one div per text box or figure,
+    a "Page N" div per page and a page index div at the end) and how lxml and BeautifulSoup
+    read it back, so that the elements and their positions are the same as the ones obtained
+    by parsing the HTML output.
+    """
+
+    # characters dropped by libxml2
+    INVALID_CHARS = re.compile("[\x00-\x08\x0b\x0c\x0e-\x1f\ufffe\uffff]")
+    # whitespace collapsed by BeautifulSoup
+    ASCII_SPACES = "\x20\x0a\x09\x0c\x0d"
+
+    def __init__(self, first_page: int = 1, first_pos: int = 0):
+        self.pageno = first_page
+        self.pagenos = []
+        self.pos = first_pos
+        self._font = None
+        self._fontstack = []
+        self._divs = []
+        self._elems = []
+        self._text = []
+
+    def page(self, ltpage: LTPage, pageno: int | None = None) -> list[dict]:
+        """
+        Returns elements of a single page and advances the page and position counters.
+        The page number follows the previous page's unless given.
+        """
+        if pageno is not None:
+            self.pageno = pageno
+        self.pagenos.append(self.pageno)
+        self._elems = []
+        self._begin_div()
+        self._put_text(f"Page {self.pageno}")
+        self._end_div()
+        for child in ltpage:
+            self._render(child)
+        self._tag()
+        self.pageno += 1
+
+        return [e for e in self._elems if e is not None]
+
+    def footer(self, pagenos: Iterable[int]) -> dict:
+        """
+        Returns the page index element closing the document.
+        """
+        pages = ", ".join(str(i) for i in pagenos)
+        e = PdfParser.make_elem(self.pos, f"Page: {pages}", [])
+        self.pos += 1
+        return e
+
+    def _render(self, item):
+        # images render nothing
+        if isinstance(item, LTCurve):
+            self._render_curve()
+        elif isinstance(item, (LTFigure, LTTextBox)):
+            self._render_div(item)
+        elif isinstance(item, LTTextLine):
+            self._render_line(item)
+        elif isinstance(item, LTChar):
+            self._render_char(item)
+        elif isinstance(item, LTText):
+            self._put_text(item.get_text())
+
+    def _render_curve(self):
+        self._tag()  # border span
+        self._put_text("\n")
+
+    def _render_div(self, item: LTFigure | LTTextBox):
+        self._begin_div()
+        for child in item:
+            self._render(child)
+        self._end_div()
+
+    def _render_line(self, item: LTTextLine):
+        for child in item:
+            self._render(child)
+        self._tag()  # line break
+
+    def _render_char(self, item: LTChar):
+        font = (item.fontname, item.size)
+        if font != self._font:
+            self._tag()  # font span
+            if self._divs:
+                self._divs[-1][3].append(int(item.size))
+            self._font = font
+        self._put_text(item.get_text())
+
+    def _put_text(self, text: str):
+        self._text.append(text)
+
+    def _tag(self):
+        """
+        Ends the text run preceding an HTML tag and adds it to the innermost div.
+        """
+        if not self._text:
+            return
+
+        text = self.INVALID_CHARS.sub("", "".join(self._text))
+        self._text = []
+        if text and not text.strip(self.ASCII_SPACES):
+            text = "\n" if "\n" in text else " "
+        if text and self._divs:
+            self._divs[-1][2].append(text)
+
+    def _begin_div(self):
+        self._tag()
+        self._fontstack.append(self._font)
+        self._font = None
+        self._divs.append((len(self._elems), self.pos, [], []))
+        self._elems.append(None)
+        self.pos += 1
+
+    def _end_div(self):
+        self._tag()
+        self._font = self._fontstack.pop()
+        slot, pos, texts, font_sizes = self._divs.pop()
+        if self._divs:
+            # text and spans of nested divs belong to the enclosing div too
+            self._divs[-1][2].extend(texts)
+            self._divs[-1][3].extend(font_sizes)
+
+        text = "".join(texts)
+        if text:
+            self._elems[slot] = PdfParser.make_elem(pos, text, font_sizes, self.pageno)
 
 
 class PdfParser:
-    def __init__(self):
-        pass
+    ENGINES = ("layout", "html")
+    # "fast" skips layout analysis and yields plain paragraphs without font sizes, headings or page index,
+    # "balanced" lays out text lines and boxes but does not order boxes, "full" does both
+    PROFILES = ("fast", "balanced", "full")
+    LAYOUT_PARAMS = {"balanced": {"boxes_flow": None}, "full": {}}
+    # bump when changes to the parser change its output
+    VERSION = 2
+
+    def __init__(self, engine: str = "layout", profile: str = "full"):
+        if engine not in self.ENGINES:
+            raise ValueError(f"Unknown engine {engine!r}, expected one of {self.ENGINES}")
+        if profile not in self.PROFILES:
+            raise ValueError(f"Unknown profile {profile!r}, expected one of {self.PROFILES}")
+        self.engine = engine
+        self.profile = profile
+
+    @property
+    def settings(self) -> str:
+        """
+        Identifies parser output, parsing the same file with the same settings gives the same result.
+        """
+        return f"v{self.VERSION}-{self.engine}-{self.profile}-pdfminer{pdfminer_version}"
+
+    @property
+    def laparams(self) -> LAParams | None:
+        if self.profile == "fast":
+            return None
+        return LAParams(**self.LAYOUT_PARAMS[self.profile])
 
     @staticmethod
     def str_clean(s: str) -> str:
@@ -21,6 +501,31 @@ class PdfParser:
         s = s.strip()
         return s
 
+    @classmethod
+    def make_elem(cls, pos: int, text: str, font_sizes: list[int], page: int | None = None) -> dict:
+        e = {}
+        e["pos"] = pos
+        e["page"] = page
+        e["string"] = cls.str_clean(text)
+        e["font_size"] = mean(font_sizes) if font_sizes else None
+
+        if e["font_size"] is None or e["font_size"] <= 12:
+            e["type"] = "p"
+        else:
+            e["type"] = "h1"
+        return e
+
+    @classmethod
+    def make_paragraphs(cls, pos: int, text: str, page: int | None = None) -> list[dict]:
+        """
+        Returns elements of the blank line separated paragraphs of a page's text, positioned from pos.
+        """
+        elems = []
+        for paragraph in text.split("\n\n"):
+            if paragraph.strip():
+                elems.append(cls.make_elem(pos + len(elems), paragraph, [], page))
+        return elems
+
     def get_text_fp(self, file_path: str) -> list[dict]:
         """
         Accepts file_path to a PDF file.
@@ -30,41 +535,206 @@ class PdfParser:
         with open(file_path, "rb") as fin:
             return self.get_text(fin)
 
-    def get_text(self, buffer) -> tuple[list[dict], int]:
+    def get_text(
+        self, buffer, stats: dict | None = None, pages: PageRanges | None = None, budget: ParseBudget | None = None
+    ) -> tuple[list[dict], int]:
         """
-        Accepts file-like buffer containing PDF file.
+        Accepts file-like buffer containing PDF file, optionally a dict to add parse stats to,
+        the pages to parse and a budget, as iter_text does.
 
         Returns:
             a list of dicts representing extracted text elements with attributes,
             elapsed seconds
         """
-        outbuff = io.StringIO()
+        timer_start = time.perf_counter()
+
+        elems = [e for page_elems in self.iter_text(buffer, stats, pages, budget) for e in page_elems]
+
+        timer_stop = time.perf_counter()
+
+        return elems, (timer_stop - timer_start)
+
+    def iter_text(
+        self, buffer, stats: dict | None = None, pages: PageRanges | None = None, budget: ParseBudget | None = None
+    ) -> Iterator[list[dict]]:
+        """
+        Accepts file-like buffer containing PDF file, optionally a dict to add parse stats to
+        (pages, seconds spent in pdfminer layout analysis as layout_s, or text extraction as text_s with the fast profile,
+        and in building elements as walk_s), the pages to parse, all by default, and a ParseBudget.
+        A parse running out of the budget stops with the pages done so far, the reason is added to stats as "truncated".
+
+        Yields lists of dicts representing extracted text elements page by page,
+        the last list holds the page index unless the profile is fast. The html engine yields all elements at once
+        and ignores the budget unless the profile is fast.
+        """
+        stats = {} if stats is None else stats
+
+        if self.profile == "fast":
+            yield from self._iter_text_fast(buffer, stats, pages, budget)
+            return
+
+        if self.engine == "html":
+            yield self._get_text_html(buffer, stats, pages)
+            return
+
+        walker = LayoutWalker()
+        for pageno, ltpage in timed(layout_pages(buffer, pages, self.laparams, budget), stats, "layout_s"):
+            timer_start = time.perf_counter()
+            page_elems = walker.page(ltpage, pageno + 1)
+            add_stats(stats, walk_s=time.perf_counter() - timer_start, pages=1)
+            yield page_elems
+        self._check_truncated(stats, budget)
+        yield [walker.footer(walker.pagenos)]
+
+    def get_page_range(
+        self, buffer, start: int, stop: int, stats: dict | None = None, budget: ParseBudget | None = None
+    ) -> tuple[list[dict], int, float]:
+        """
+        Accepts file-like buffer containing PDF file, a range of zero-based page numbers
+        and optionally a dict to add parse stats to and a budget, as iter_text does.
+
+        Returns:
+            a list of dicts representing text elements of the pages, positioned from the start of the range,
+            number of positions taken by the range,
+            elapsed seconds
+        """
         elems = []
+        walker = LayoutWalker(first_page=start + 1)
+        stats = {} if stats is None else stats
+        selection = PageRanges([range(start, stop)])
+
+        timer_start = time.perf_counter()
+
+        if self.profile == "fast":
+            for page_elems in self._iter_text_fast(buffer, stats, selection, budget):
+                elems.extend(page_elems)
+            return elems, len(elems), (time.perf_counter() - timer_start)
+
+        for pageno, ltpage in timed(layout_pages(buffer, selection, self.laparams, budget), stats, "layout_s"):
+            walk_start = time.perf_counter()
+            elems.extend(walker.page(ltpage, pageno + 1))
+            add_stats(stats, walk_s=time.perf_counter() - walk_start, pages=1)
+        self._check_truncated(stats, budget)
+
+        timer_stop = time.perf_counter()
+
+        return elems, walker.pos, (timer_stop - timer_start)
+
+    def iter_pages(
+        self, buffer, pages: PageRanges, stats: dict | None = None, budget: ParseBudget | None = None
+    ) -> Iterator[tuple[int, list[dict], int]]:
+        """
+        Accepts file-like buffer containing PDF file, the pages to parse and optionally a dict to add parse stats to
+        and a budget, as iter_text does. Not supported by the html engine unless the profile is fast.
+
+        Yields zero-based page numbers, text elements of each page positioned from the start of the page
+        and number of positions taken by the page, as get_page_range returns them for a range of that page alone.
+        """
+        stats = {} if stats is None else stats
 
-        timer_start = time.time()
+        if self.profile == "fast":
+            for pageno, text in timed(text_pages(buffer, pages, budget), stats, "text_s"):
+                timer_start = time.perf_counter()
+                page_elems = self.make_paragraphs(0, text, pageno + 1)
+                add_stats(stats, walk_s=time.perf_counter() - timer_start, pages=1)
+                yield pageno, page_elems, len(page_elems)
+            self._check_truncated(stats, budget)
+            return
 
-        extract_text_to_fp(
-            buffer, outbuff, laparams=LAParams(), output_type="html", codec=None
-        )
+        if self.engine == "html":
+            raise ValueError("The html engine does not parse single pages")
+
+        for pageno, ltpage in timed(layout_pages(buffer, pages, self.laparams, budget), stats, "layout_s"):
+            timer_start = time.perf_counter()
+            walker = LayoutWalker(first_page=pageno + 1)
+            page_elems = walker.page(ltpage)
+            add_stats(stats, walk_s=time.perf_counter() - timer_start, pages=1)
+            yield pageno, page_elems, walker.pos
+        self._check_truncated(stats, budget)
+
+    def relocate_page(self, elems: list[dict], page: int) -> list[dict]:
+        """
+        Returns copies of elements of a single page, as iter_pages yields them, numbered as the given page.
+        """
+        elems = [dict(e, page=page) for e in elems]
+        if self.profile != "fast" and elems and elems[0]["pos"] == 0:
+            elems[0]["string"] = f"Page {page}"  # written by LayoutWalker.page
+        return elems
+
+    @staticmethod
+    def merge_page_ranges(ranges: list[tuple[list[dict], int]], pages: int, footer: bool = True) -> list[dict]:
+        """
+        Accepts consecutive results of get_page_range as (elements, positions), the document page count
+        and whether the page index ends the document, which it does not with the fast profile.
+
+        Returns a list of dicts equal to the one get_text returns for the whole document.
+        """
+        elems = []
+        offset = 0
+        for range_elems, positions in ranges:
+            for e in range_elems:
+                e["pos"] += offset
+            elems.extend(range_elems)
+            offset += positions
+        if footer:
+            elems.append(LayoutWalker(first_pos=offset).footer(range(1, pages + 1)))
+
+        return elems
+
+    @staticmethod
+    def count_pages(buffer, budget: ParseBudget | None = None) -> int:
+        """
+        Raises ParseBudgetExceeded when the budget runs out before all pages are counted.
+        """
+        pages = 0
+        for _ in PDFPage.get_pages(buffer):
+            if budget is not None:
+                budget.op()
+            pages += 1
+        return pages
+
+    @staticmethod
+    def _check_truncated(stats: dict, budget: ParseBudget | None):
+        if budget is not None and budget.exceeded is not None:
+            stats["truncated"] = budget.exceeded
+
+    def _iter_text_fast(self, buffer, stats: dict, pages: PageRanges | None, budget: ParseBudget | None) -> Iterator[list[dict]]:
+        """
+        Yields paragraphs of collected page text, page by page.
+        """
+        pos = 0
+        for pageno, text in timed(text_pages(buffer, pages, budget), stats, "text_s"):
+            timer_start = time.perf_counter()
+            page_elems = self.make_paragraphs(pos, text, pageno + 1)
+            pos += len(page_elems)
+            add_stats(stats, walk_s=time.perf_counter() - timer_start, pages=1)
+            yield page_elems
+        self._check_truncated(stats, budget)
+
+    def _get_text_html(self, buffer, stats: dict, pages: PageRanges | None) -> list[dict]:
+        """
+        Renders the document to HTML and reparses it.
+        """
+        outbuff = io.StringIO()
+        elems = []
+        page = None
+
+        timer_start = time.perf_counter()
+        extract_text_to_fp(buffer, outbuff, laparams=self.laparams, output_type="html", codec=None, page_numbers=pages)
         html_repr = outbuff.getvalue()
+        add_stats(stats, layout_s=time.perf_counter() - timer_start)
+
+        timer_start = time.perf_counter()
         soup = BeautifulSoup(html_repr, features="lxml")
 
         for pos, tag in enumerate(soup.find_all("div")):
+            if anchor := tag.find("a"):
+                # pages are numbered in the order they were rendered, the page index links to them
+                rendered = int(anchor["name"]) if anchor.has_attr("name") else None
+                page = rendered if pages is None or rendered is None else pages.nth(rendered - 1) + 1
             if tag.get_text():
-                e = {}
-                e["pos"] = pos
-                e["string"] = self.str_clean(tag.get_text())
                 font_sizes = re.findall(r"font-size:(\d*)", str(tag))
-                e["font_size"] = (
-                    mean(int(n) for n in font_sizes) if font_sizes else None
-                )
-
-                if e["font_size"] is None or e["font_size"] <= 12:
-                    e["type"] = "p"
-                else:
-                    e["type"] = "h1"
-                elems.append(e)
+                elems.append(self.make_elem(pos, tag.get_text(), [int(n) for n in font_sizes], page))
+        add_stats(stats, walk_s=time.perf_counter() - timer_start, pages=html_repr.count('<a name="'))
 
-        timer_stop = time.time()
-
-        return elems, (timer_stop - timer_start)
+        return elems
@@ -4,9 +4,13 @@ import tempfile
 TMP_DIR = tempfile.gettempdir()
 os.environ["DB_DSN"] = f"sqlite:///{TMP_DIR}/db.sqlite?"
 os.environ["JWT_SECRET"] = "secret"
+os.environ["PARSE_CACHE_DIR"] = tempfile.mkdtemp()
+os.environ["JOBS_DIR"] = tempfile.mkdtemp()
+os.environ["RATE_LIMIT_BURST"] = "100000"
 
 
 from pdf_api.models import Base
 from pdf_api.db import engine
 
+Base.metadata.drop_all(engine)
 Base.metadata.create_all(engine)
@@ -1,7 +1,28 @@
+import os
+import gzip
+import asyncio
+import json
+import time
+import zipfile
+import datetime as dt
+
+import pytest
+from fastapi import HTTPException
 from fastapi.testclient import TestClient
 import requests
-
-from pdf_api.app import app
+import pikepdf
+from sqlalchemy import delete, select, update, func
+
+import pdf_api.app
+from pdf_api.app import app, parse_pool, parse_cache
+from pdf_api.parse_pool import ParseWorkerLost
+from pdf_api.uploads import UploadSizeLimit
+from pdf_api.utils.pdf_parser import PdfParser
+from pdf_api.rate_limit import RateLimiter
+from pdf_api.models import RateLimit, User, Document, DocumentChunk, Job
+from pdf_api.purge import Purger
+from pdf_api.jobs import JobRunner
+from pdf_api.db import engine
 from pathlib import Path
 
 client = TestClient(app)
@@ -30,6 +51,12 @@ def test_status():
     assert response.json() == {"status": "OK"}
 
 
+def test_status_db():
+    response = client.get("/status/db")
+    assert response.status_code == 200
+    assert set(response.json()) == {"engine", "async_engine"}
+
+
 def test_send_file():
     response = client.post("/pdf_text_chunks", **prepare_file(test_file))
 
@@ -37,12 +64,255 @@ def test_send_file():
     text_elems = response.json()["chunks"]
     assert text_elems[12670] == {
         "pos": 12672,
+        "page": 380,
         "string": "page 351",
         "font_size": 8,
         "type": "p",
     }
 
 
+def test_send_file_split(monkeypatch):
+    monkeypatch.setattr(parse_pool, "split_pages", 100)
+    monkeypatch.setattr(parse_pool, "split_ranges", 3)
+    parse_cache.clear()
+
+    response = client.post("/pdf_text_chunks", params={"stages": True}, **prepare_file(test_file))
+
+    assert response.status_code == 200
+    assert [r["pages"] for r in response.json()["metadata"]["ranges"]] == [[1, 127], [128, 254], [255, 380]]
+    assert {"hash_s", "cache_s", "parse_s", "layout_s", "walk_s"} <= set(response.json()["metadata"]["stages"])
+    text_elems = response.json()["chunks"]
+    assert text_elems[12670] == {
+        "pos": 12672,
+        "page": 380,
+        "string": "page 351",
+        "font_size": 8,
+        "type": "p",
+    }
+
+
+def test_send_file_pages():
+    response = client.post("/pdf_text_chunks", params={"pages": "1-2,10", "max_pages": 5}, **prepare_file(test_file))
+
+    assert response.status_code == 200
+    assert response.json()["metadata"]["pages"] == "1-2"
+    assert {chunk["page"] for chunk in response.json()["chunks"]} == {1, 2, None}
+
+    response = client.post("/pdf_text_chunks", params={"pages": "2-1"}, **prepare_file(test_file))
+    assert response.status_code == 422
+
+    response = client.post("/pdf_text_chunks", params={"pages": "10", "max_pages": 5}, **prepare_file(test_file))
+    assert response.status_code == 422
+
+
+def test_send_file_profile():
+    response = client.post("/pdf_text_chunks", params={"profile": "fast", "pages": "1-2"}, **prepare_file(test_file))
+
+    assert response.status_code == 200
+    assert response.json()["metadata"]["profile"] == "fast"
+    assert {chunk["type"] for chunk in response.json()["chunks"]} == {"p"}
+
+    response = client.post("/pdf_text_chunks", params={"profile": "fast", "pages": "1-2"}, **prepare_file(test_file))
+    assert response.json()["metadata"]["cached"] is True
+    assert response.json()["metadata"]["profile"] == "fast"
+
+    response = client.post("/pdf_text_chunks", params={"profile": "fastest"}, **prepare_file(test_file))
+    assert response.status_code == 422
+
+
+def test_send_file_formats():
+    chunks = client.post("/pdf_text_chunks", params={"pages": "1-2"}, **prepare_file(test_file)).json()["chunks"]
+
+    response = client.post("/pdf_text_chunks", params={"pages": "1-2", "format": "columnar"}, **prepare_file(test_file))
+    assert response.status_code == 200
+    assert response.headers["content-encoding"] == "gzip"
+    columns = response.json()["chunks"]
+    assert columns["string"] == [chunk["string"] for chunk in chunks]
+    assert [columns["type"]["values"][i] for i in columns["type"]["indices"]] == [chunk["type"] for chunk in chunks]
+
+    response = client.post("/pdf_text_chunks", params={"format": "csv"}, **prepare_file(test_file))
+    assert response.status_code == 422
+
+
+def test_send_file_msgpack():
+    msgpack = pytest.importorskip("msgpack")
+
+    response = client.post("/pdf_text_chunks", params={"pages": "1", "format": "msgpack"}, **prepare_file(test_file))
+    assert response.status_code == 200
+    assert response.headers["content-type"] == "application/msgpack"
+    assert msgpack.unpackb(response.content)["chunks"]["page"][0] == 1
+
+
+def test_send_file_revised(tmp_path, monkeypatch):
+    from benchmarks.corpus import Shape, generate
+
+    monkeypatch.setattr(pdf_api.app, "PARSE_PAGE_CACHE", True)
+
+    generate(Shape("revised", pages=5), tmp_path / "a.pdf")
+    with pikepdf.open(tmp_path / "a.pdf") as pdf:
+        pdf.pages[2].contents_add(pikepdf.Stream(pdf, b"BT /F1 12 Tf 72 72 Td (edited) Tj ET"))
+        pdf.save(tmp_path / "b.pdf")
+
+    response = client.post("/pdf_text_chunks", **prepare_file(tmp_path / "a.pdf"))
+    assert response.json()["metadata"]["pages_reused"] == 0
+
+    response = client.post("/pdf_text_chunks", params={"stages": True}, **prepare_file(tmp_path / "b.pdf"))
+    assert response.json()["metadata"]["pages_reused"] == 4
+    with open(tmp_path / "b.pdf", "rb") as fin:
+        assert response.json()["chunks"] == PdfParser().get_text(fin)[0]
+
+
+def test_send_file_cached():
+    client.post("/pdf_text_chunks", **prepare_file(test_file))
+    response = client.post("/pdf_text_chunks", **prepare_file(test_file))
+
+    assert response.status_code == 200
+    assert response.json()["metadata"]["cached"] is True
+    assert len(response.json()["chunks"]) == 12672
+
+
+def test_send_file_truncated(monkeypatch):
+    params = {"profile": "balanced", "pages": "1-20"}
+    for _ in range(2):
+        response = client.post("/pdf_text_chunks", params={**params, "timeout_s": 0.001}, **prepare_file(test_file))
+        assert response.status_code == 200
+        assert response.json()["metadata"]["cached"] is False
+        assert response.json()["metadata"]["truncated"] is True
+        assert response.json()["metadata"]["truncated_reason"] == "deadline"
+
+    monkeypatch.setattr(parse_pool, "page_glyphs", 100)
+    response = client.post("/pdf_text_chunks", params=params, **prepare_file(test_file))
+    assert response.json()["metadata"]["truncated_reason"] == "glyphs"
+    monkeypatch.undo()
+
+    response = client.post("/pdf_text_chunks", params=params, **prepare_file(test_file))
+    assert "truncated" not in response.json()["metadata"]
+    assert response.json()["metadata"]["cached"] is False
+
+    response = client.post("/pdf_text_chunks", params={**params, "timeout_s": 0}, **prepare_file(test_file))
+    assert response.status_code == 422
+
+
+async def test_until_disconnected(monkeypatch):
+    class DisconnectedRequest:
+        async def is_disconnected(self):
+            return True
+
+    monkeypatch.setattr(pdf_api.app, "DISCONNECT_POLL_S", 0.01)
+    parse = asyncio.ensure_future(asyncio.sleep(10))
+    with pytest.raises(HTTPException) as excinfo:
+        await pdf_api.app.until_disconnected(DisconnectedRequest(), parse)
+    assert excinfo.value.status_code == 499
+    assert parse.cancelled()
+
+
+def test_metrics():
+    client.post("/pdf_text_chunks", **prepare_file(test_file))
+    response = client.get("/metrics")
+
+    assert response.status_code == 200
+    assert 'pdf_api_request_duration_seconds_count{endpoint="/pdf_text_chunks",method="POST",status="200"}' in response.text
+    assert 'pdf_api_parse_stage_duration_seconds_count{stage="hash"}' in response.text
+
+
+def test_send_file_stream():
+    parse_cache.clear()
+    response = client.post("/pdf_text_chunks", params={"stream": True}, **prepare_file(test_file))
+
+    assert response.status_code == 200
+    assert response.headers["content-type"] == "application/x-ndjson"
+    lines = [json.loads(line) for line in response.text.splitlines()]
+    assert lines[-1]["metadata"]["chunks"] == 12672
+    assert lines[12670] == {
+        "pos": 12672,
+        "page": 380,
+        "string": "page 351",
+        "font_size": 8,
+        "type": "p",
+    }
+
+    response = client.post("/pdf_text_chunks", params={"stream": True, "format": "columnar"}, **prepare_file(test_file))
+    assert response.status_code == 400
+
+
+async def test_parse_worker_lost():
+    with pytest.raises(ParseWorkerLost):
+        await parse_pool.run(os._exit, 1)
+
+    response = client.post("/pdf_text_chunks", params={"pages": "1"}, **prepare_file(test_file))
+    assert response.status_code == 200
+
+
+def test_send_file_queue_full(monkeypatch):
+    monkeypatch.setattr(parse_pool, "queue_limit", 0)
+    parse_cache.clear()
+
+    response = client.post("/pdf_text_chunks", **prepare_file(test_file))
+    assert response.status_code == 503
+
+    # pages of a range within UPLOAD_MAX_PAGES are not counted, the stream takes the first parser slot
+    response = client.post("/pdf_text_chunks", params={"stream": True, "pages": "1"}, **prepare_file(test_file))
+    assert response.status_code == 503
+
+
+def test_send_file_too_large(monkeypatch):
+    limited_client = TestClient(UploadSizeLimit(app, max_bytes=1000))
+    payload = prepare_file(test_file)
+
+    response = limited_client.post("/pdf_text_chunks", **payload)
+    assert response.status_code == 413
+
+    response = limited_client.post("/pdf_text_chunks", content=iter([payload["content"]]), headers=payload["headers"])
+    assert response.status_code == 413
+
+    response = limited_client.post("/pdf_text_chunks", content=b"", headers={"Content-Length": "abc"})
+    assert response.status_code == 400
+
+    monkeypatch.setattr(pdf_api.app, "UPLOAD_MAX_PAGES", 10)
+    response = client.post("/pdf_text_chunks", params={"stream": True}, **payload)
+    assert response.status_code == 413
+
+
+def test_send_file_rate_limited(monkeypatch):
+    limiter = RateLimiter(pdf_api.app.async_engine, rate=0.01, burst=5)
+    monkeypatch.setattr(pdf_api.app, "rate_limiter", limiter)
+
+    response = client.post("/pdf_text_chunks", params={"profile": "fast", "pages": "1-10"}, **prepare_file(test_file))
+    assert response.status_code == 200
+
+    # parsing 10 pages left the bucket in debt
+    response = client.post("/pdf_text_chunks", params={"profile": "fast", "pages": "1-10"}, **prepare_file(test_file))
+    assert response.status_code == 429
+    assert int(response.headers["Retry-After"]) > 500
+
+    with engine.begin() as conn:
+        conn.execute(delete(RateLimit))
+
+
+def test_post_job_rate_limited(monkeypatch):
+    limiter = RateLimiter(pdf_api.app.async_engine, rate=0.01, burst=5)
+    monkeypatch.setattr(pdf_api.app, "rate_limiter", limiter)
+    counted = []
+    count_pages = parse_pool.count_pages
+
+    async def counting_pages(*args, **kwargs):
+        counted.append(await count_pages(*args, **kwargs))
+        return counted[-1]
+
+    monkeypatch.setattr(parse_pool, "count_pages", counting_pages)
+    client.post("/user/new", data={"username": "Alice"})
+
+    response = client.post("/jobs", **prepare_file(test_file))
+    assert response.status_code == 202
+    assert counted == [380], "pages counted for UPLOAD_MAX_PAGES are charged"
+
+    response = client.post("/jobs", **prepare_file(test_file))
+    assert response.status_code == 429
+
+    with engine.begin() as conn:
+        conn.execute(delete(RateLimit))
+
+
 def test_get_users():
     response = client.get("/users")
     assert response.status_code == 200
@@ -115,6 +385,70 @@ def test_post_document():
     assert response.status_code == 201
 
 
+def test_post_documents_batch(tmp_path):
+    from benchmarks.corpus import Shape, generate
+
+    client.post("/user/new", data={"username": "Alice"})
+    uid = int(client.cookies["uid"])
+
+    generate(Shape("batch", pages=2), tmp_path / "a.pdf")
+    with zipfile.ZipFile(tmp_path / "batch.zip", "w") as archive:
+        archive.write(tmp_path / "a.pdf", "a.pdf")
+        archive.writestr("b.pdf", b"%PDF-1.4 corrupt")
+        archive.writestr("readme.txt", b"skipped")
+
+    files = [
+        ("files", ("a.pdf", (tmp_path / "a.pdf").read_bytes(), "application/pdf")),
+        ("files", ("batch.zip", (tmp_path / "batch.zip").read_bytes(), "application/zip")),
+        ("files", ("broken.zip", b"not a zip", "application/zip")),
+    ]
+    response = client.post("/documents/batch", files=files)
+    assert response.status_code == 207
+
+    results = response.json()["documents"]
+    assert [(r["filename"], r["status"]) for r in results] == [
+        ("a.pdf", 201),
+        ("a.pdf", 201),
+        ("b.pdf", 422),
+        ("broken.zip", 422),
+    ]
+
+    response = client.get(f"/user/{uid}/documents")
+    assert sorted(d["id"] for d in response.json()["documents"]) == [results[0]["id"], results[1]["id"]]
+
+
+def test_export_import_documents(tmp_path):
+    from benchmarks.corpus import Shape, generate
+
+    generate(Shape("export", pages=2), tmp_path / "a.pdf")
+    client.post("/user/new", data={"username": "Alice"})
+    uid = int(client.cookies["uid"])
+    for _ in range(3):
+        client.post("/document/new", **prepare_file(tmp_path / "a.pdf"))
+
+    response = client.get(f"/user/{uid}/documents/export")
+    assert response.status_code == 200
+    exported = [json.loads(line) for line in response.text.splitlines()]
+    assert len(exported) == 3
+    assert exported[0]["chunks"] == client.get(f"/document/{exported[0]['id']}").json()["document"]["chunks"]
+
+    client.post("/user/new", data={"username": "Bob"})
+    uid = int(client.cookies["uid"])
+    files = {"file": ("export.ndjson.gz", gzip.compress(response.content), "application/gzip")}
+    response = client.post(f"/user/{uid}/documents/import", files=files)
+    assert response.status_code == 201
+    assert response.json() == {"imported": 3}
+
+    documents = client.get(f"/user/{uid}/documents").json()["documents"]
+    assert [d["filename"] for d in documents] == [d["filename"] for d in exported]
+    assert client.get(f"/document/{documents[2]['id']}").json()["document"]["chunks"] == exported[2]["chunks"]
+
+    files = {"file": ("export.ndjson", b'{"filename": "a.pdf"}\n', "application/x-ndjson")}
+    response = client.post(f"/user/{uid}/documents/import", files=files)
+    assert response.status_code == 422
+    assert len(client.get(f"/user/{uid}/documents").json()["documents"]) == 3
+
+
 def test_delete_user():
     client.post("/user/new", data={"username": "Alice"})
 
@@ -122,12 +456,59 @@ def test_delete_user():
     response = client.delete(f"/user/{uid}")
     assert response.status_code == 200
 
+    response = client.get(f"/user/{uid}")
+    assert response.status_code == 401
+
+
+def test_delete_user_cached():
+    client.post("/user/new", data={"username": "Alice"})
+    uid = int(client.cookies["uid"])
+    assert client.get(f"/user/{uid}").status_code == 200
+
+    # deleted by another app process, still cached by this one
+    with engine.begin() as conn:
+        secret = conn.execute(select(User.secret).where(User.id == uid)).scalar()
+        conn.execute(delete(User).where(User.id == uid))
+
+    assert client.get(f"/user/{uid}").status_code == 401
+    pdf_api.app.auth_cache.put(uid, secret)
+    assert client.post("/document/new", **prepare_file(test_file)).status_code == 401
+
 
 def test_get_documents():
     response = client.get("/documents")
     assert response.status_code == 200
 
 
+def test_get_documents_paginated():
+    client.post("/user/new", data={"username": "Alice"})
+    uid = int(client.cookies["uid"])
+    for _ in range(3):
+        client.post("/document/new", params={"public": True}, **prepare_file(test_file))
+
+    response = client.get(f"/user/{uid}/documents", params={"limit": 2})
+    page = response.json()
+    assert len(page["documents"]) == 2
+    assert "chunks" not in page["documents"][0]
+
+    response = client.get(f"/user/{uid}/documents", params={"limit": 2, "after": page["next_after"]})
+    assert [d["id"] for d in response.json()["documents"]] == [page["documents"][-1]["id"] + 1]
+    assert response.json()["next_after"] is None
+
+    client.post("/document/new", **prepare_file(test_file))
+    private_id = client.get(f"/user/{uid}/documents", params={"limit": 4}).json()["documents"][-1]["id"]
+    listed = [d["id"] for d in client.get("/documents", params={"limit": 1000}).json()["documents"]]
+    assert listed[-2:] == [page["documents"][-1]["id"] + 1, private_id], "private documents are listed in order with public ones"
+
+    client.cookies.delete("jwt_token")
+    response = client.get("/documents", params={"limit": 1000})
+    assert page["documents"][0]["id"] in [d["id"] for d in response.json()["documents"]]
+    assert private_id not in [d["id"] for d in response.json()["documents"]]
+
+    response = client.get("/documents", params={"after": "x"})
+    assert response.status_code == 422
+
+
 def test_get_document():
     client.post("/user/new", data={"username": "Alice"})
 
@@ -143,6 +524,67 @@ def test_get_document():
 
     response = client.get(f"/document/{inserted_doc_id}")
     assert response.status_code == 200
+    assert response.json()["document"]["profile"] == "full"
+    assert response.json()["document"]["chunks"][12670]["string"] == "page 351"
+
+    columns = client.get(f"/document/{inserted_doc_id}", params={"format": "columnar"}).json()["document"]["chunks"]
+    assert columns["pos"] == [chunk["pos"] for chunk in response.json()["document"]["chunks"]]
+
+    # documents stored before chunks recorded their page, or without chunks
+    for statement, pages in (
+        (update(DocumentChunk).values(page=None), [None] * len(columns["pos"])),
+        (delete(DocumentChunk), []),
+    ):
+        with engine.begin() as conn:
+            conn.execute(statement.where(DocumentChunk.document_id == inserted_doc_id))
+        response = client.get(f"/document/{inserted_doc_id}", params={"format": "columnar"})
+        assert response.status_code == 200
+        assert response.json()["document"]["chunks"]["page"] == pages
+
+
+def test_get_document_chunks():
+    client.post("/user/new", data={"username": "Alice"})
+
+    uid = int(client.cookies["uid"])
+    client.post("/document/new", **prepare_file(test_file))
+    inserted_doc_id = client.get(f"/user/{uid}/documents").json()["documents"][0]["id"]
+
+    response = client.get(f"/document/{inserted_doc_id}/chunks", params={"offset": 12670, "limit": 10})
+    assert response.status_code == 200
+    assert response.json()["chunks"][0] == {
+        "pos": 12672,
+        "page": 380,
+        "string": "page 351",
+        "font_size": 8,
+        "type": "p",
+    }
+    assert response.json()["next_offset"] is None
+
+    response = client.get(f"/document/{inserted_doc_id}/chunks", params={"offset": 0, "limit": 10})
+    assert len(response.json()["chunks"]) == 10
+    assert response.json()["next_offset"] == 10
+
+
+def test_search():
+    client.post("/user/new", data={"username": "Alice"})
+    uid = int(client.cookies["uid"])
+    client.post("/document/new", **prepare_file(test_file))
+    document_id = client.get(f"/user/{uid}/documents").json()["documents"][0]["id"]
+
+    response = client.get("/search", params={"q": "joint dataset"})
+    assert response.status_code == 200
+    hits = [hit for hit in response.json()["results"] if hit["document_id"] == document_id]
+    assert hits
+    assert all("joint" in hit["string"].lower() for hit in hits)
+    assert any(hit["heading"] for hit in hits)
+
+    client.delete(f"/document/{document_id}")
+    response = client.get("/search", params={"q": "joint dataset", "limit": 100})
+    assert document_id not in [hit["document_id"] for hit in response.json()["results"]]
+
+    client.cookies.delete("jwt_token")
+    response = client.get("/search", params={"q": "joint dataset", "limit": 100})
+    assert document_id not in [hit["document_id"] for hit in response.json()["results"]]
 
 
 def test_delete_document():
@@ -156,3 +598,88 @@ def test_delete_document():
 
     response = client.delete(f"/document/{inserted_doc_id}")
     assert response.status_code == 200
+    assert client.get(f"/document/{inserted_doc_id}").status_code == 401
+    assert client.delete(f"/document/{inserted_doc_id}").status_code == 401
+    with engine.connect() as conn:
+        assert conn.execute(select(func.count()).where(DocumentChunk.document_id == inserted_doc_id)).scalar() == 0
+
+
+def test_soft_delete(monkeypatch, tmp_path):
+    from benchmarks.corpus import Shape, generate
+
+    monkeypatch.setattr(pdf_api.app, "SOFT_DELETE", True)
+    generate(Shape("deleted", pages=2), tmp_path / "a.pdf")
+    client.post("/user/new", data={"username": "Alice"})
+    uid = int(client.cookies["uid"])
+    for _ in range(3):
+        client.post("/document/new", params={"public": True}, **prepare_file(tmp_path / "a.pdf"))
+    document_ids = [d["id"] for d in client.get(f"/user/{uid}/documents").json()["documents"]]
+
+    assert client.delete(f"/document/{document_ids[0]}").status_code == 200
+    assert client.get(f"/document/{document_ids[0]}").status_code == 401
+    assert len(client.get(f"/user/{uid}/documents").json()["documents"]) == 2
+
+    assert client.delete(f"/user/{uid}").status_code == 200
+    assert client.get(f"/user/{uid}").status_code == 401
+    client.post("/user/new", data={"username": "Bob"})
+    assert client.get(f"/document/{document_ids[1]}").status_code == 401, "public documents of deleted users are hidden"
+
+    purger = Purger(batch_size=2)
+    assert purger.purge() == 2
+    assert purger.purge() == 1
+    with engine.connect() as conn:
+        assert conn.execute(select(User.id).where(User.id == uid)).one_or_none() is None
+        assert conn.execute(select(func.count()).where(DocumentChunk.document_id.in_(document_ids))).scalar() == 0
+
+
+def test_post_job():
+    with TestClient(app) as job_client:
+        job_client.post("/user/new", data={"username": "Alice"})
+
+        response = job_client.post("/jobs", **prepare_file(test_file))
+        assert response.status_code == 202
+        job_id = response.json()["job_id"]
+
+        for _ in range(600):
+            job = job_client.get(f"/jobs/{job_id}").json()["job"]
+            if job["status"] in ("done", "failed"):
+                break
+            time.sleep(0.1)
+
+        assert job["status"] == "done"
+        assert job["pages_done"] == job["pages_total"]
+        response = job_client.get(f"/document/{job['document_id']}")
+        assert response.status_code == 200
+
+
+def test_job_claimed_again(tmp_path):
+    client.post("/user/new", data={"username": "Alice"})
+    uid = int(client.cookies["uid"])
+    runners = [JobRunner(parse_pool, parse_cache, directory=str(tmp_path), workers=1, stale_s=60) for _ in range(2)]
+    with open(test_file, "rb") as fin:
+        job_id = runners[0].submit(fin, "a.pdf", 1, uid, False)
+
+    job_id, token = runners[0]._claim(set())
+    assert runners[1]._claim(set()) is None, "running jobs are not claimed again until stale"
+    assert runners[0]._claim({job_id}) is None, "jobs being processed are not claimed again by their runner"
+    with engine.begin() as conn:
+        conn.execute(update(Job).where(Job.id == job_id).values(updated_at=Job.updated_at - dt.timedelta(seconds=61)))
+    _, stolen_token = runners[1]._claim(set())
+
+    job = runners[0]._get(job_id)
+    chunks = [{"pos": 0, "page": 1, "string": "x", "font_size": None, "type": "p"}]
+    assert not runners[0]._finish(job, token, b"digest", chunks)
+    assert not runners[0]._update(job_id, token, status="failed")
+    assert runners[1]._finish(job, stolen_token, b"digest", chunks)
+    with engine.connect() as conn:
+        assert conn.execute(select(func.count()).where(Document.hash == b"digest")).scalar() == 1
+        assert conn.execute(select(Job.status).where(Job.id == job_id)).scalar() == "done"
+
+
+def test_get_job_unauth():
+    client.post("/user/new", data={"username": "Alice"})
+    job_id = client.post("/jobs", **prepare_file(test_file)).json()["job_id"]
+
+    client.post("/user/new", data={"username": "Bob"})
+    response = client.get(f"/jobs/{job_id}")
+    assert response.status_code == 401
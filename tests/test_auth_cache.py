@@ -0,0 +1,20 @@
+from pdf_api.auth_cache import AuthCache
+
+
+def test_auth_cache():
+    invalidated = []
+    cache = AuthCache(max_entries=1, ttl_s=60)
+    cache.on_invalidate(invalidated.append)
+
+    assert cache.check(1, "secret") is None
+    cache.put(1, "secret")
+    assert cache.check(1, "secret") is True
+    assert cache.check(1, "other") is False
+
+    cache.put(2, "secret")
+    assert cache.check(1, "secret") is None, "evicted"
+
+    cache.invalidate(2)
+    assert cache.check(2, "secret") is None
+    assert invalidated == [2]
+    assert cache.stats()["hit_rate"] == 0.4
@@ -0,0 +1,51 @@
+import zlib
+
+from fastapi import FastAPI
+from fastapi.responses import PlainTextResponse, StreamingResponse
+from fastapi.testclient import TestClient
+
+from pdf_api.compression import CompressionMiddleware, accepted_encodings
+
+app = FastAPI()
+app.add_middleware(CompressionMiddleware, minimum_size=100)
+
+
+@app.get("/small")
+async def small():
+    return PlainTextResponse("small")
+
+
+@app.get("/stream")
+async def stream():
+    async def lines():
+        for i in range(100):
+            yield f"line {i}\n"
+
+    return StreamingResponse(lines(), media_type="text/plain")
+
+
+client = TestClient(app)
+
+
+def test_accepted_encodings():
+    assert accepted_encodings("gzip, zstd;q=0.5, br;q=x") == {"gzip": 1.0, "zstd": 0.5, "br": 0.0}
+
+
+def test_compression_middleware():
+    expected = "".join(f"line {i}\n" for i in range(100))
+
+    response = client.get("/stream", headers={"Accept-Encoding": "gzip"})
+    assert response.headers["content-encoding"] == "gzip"
+    assert response.headers["vary"] == "Accept-Encoding"
+    assert response.text == expected
+
+    with client.stream("GET", "/stream", headers={"Accept-Encoding": "gzip"}) as response:
+        assert zlib.decompress(b"".join(response.iter_raw()), zlib.MAX_WBITS | 16).decode() == expected
+
+    response = client.get("/stream", headers={"Accept-Encoding": "gzip;q=0"})
+    assert "content-encoding" not in response.headers
+    assert response.text == expected
+
+    response = client.get("/small", headers={"Accept-Encoding": "gzip"})
+    assert "content-encoding" not in response.headers
+    assert response.text == "small"
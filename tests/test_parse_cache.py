@@ -0,0 +1,37 @@
+from pdf_api.parse_cache import ParseCache
+
+
+def test_parse_cache_eviction(tmp_path):
+    chunks = [{"pos": 0, "string": "x" * 100, "font_size": None, "type": "p"}]
+    cache = ParseCache(max_bytes=300, directory=str(tmp_path), max_disk_bytes=10_000)
+
+    cache.put("a", chunks)
+    cache.put("b", chunks)
+    assert cache.stats()["entries"] == 1
+    assert cache.evictions == 1
+
+    assert cache.get("b") is chunks
+    assert cache.hits == 1
+    assert cache.get("a") == chunks
+    assert cache.disk_hits == 1
+    assert cache.get("c") is None
+    assert cache.misses == 1
+
+
+def test_parse_cache_disk_eviction(tmp_path, monkeypatch):
+    chunks = [{"pos": 0, "string": "x" * 100, "font_size": None, "type": "p"}]
+    cache = ParseCache(max_bytes=0, directory=str(tmp_path), max_disk_bytes=1000)
+    scans = []
+    monkeypatch.setattr(cache, "_evict_disk", lambda evict=cache._evict_disk: scans.append(1) or evict())
+
+    for key in range(6):
+        cache.put(str(key), chunks)
+    assert not scans
+    cache.put("6", chunks)
+    assert len(scans) == 1
+
+    disk_size = sum(path.stat().st_size for path in tmp_path.iterdir())
+    assert cache.disk_size == disk_size <= 900
+    assert cache.get("0") is None
+    assert cache.get("6") == chunks
+    assert ParseCache(max_bytes=0, directory=str(tmp_path)).disk_size == disk_size
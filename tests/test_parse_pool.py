@@ -0,0 +1,43 @@
+import asyncio
+import time
+
+import pikepdf
+
+from benchmarks.corpus import Shape, generate
+from pdf_api.parse_pool import ParsePool
+from pdf_api.utils.pdf_parser import PageRanges
+
+
+async def test_parse_pool_kill(tmp_path):
+    # scattered glyphs keep the layout analysis of page 2 busy for minutes
+    generate(Shape("kill", pages=3), tmp_path / "a.pdf")
+    ops = [b"BT /F0 4 Tf"]
+    for i in range(1000):
+        ops.append(b"1 0 0 1 %d %d Tm (x) Tj" % (10 + i % 32 * 18, 10 + i // 32 * 24))
+    ops.append(b"ET")
+    with pikepdf.open(tmp_path / "a.pdf") as pdf:
+        pdf.pages[1].contents_add(pikepdf.Stream(pdf, b"\n".join(ops)))
+        pdf.save(tmp_path / "slow.pdf")
+
+    pool = ParsePool(2, 4, kill_grace_s=1.0)
+    try:
+        with open("tests/files/ZA7505_cdb.pdf", "rb") as fin:
+            assert await pool.count_pages(fin) == 380
+
+        timer_start = time.time()
+        with open(tmp_path / "slow.pdf", "rb") as slow, open("tests/files/ZA7505_cdb.pdf", "rb") as fin:
+            (chunks, _, metadata), (other, _, _) = await asyncio.gather(
+                pool.get_text(slow, deadline=time.time() + 1), pool.get_text(fin, PageRanges.parse("1-20"))
+            )
+        assert time.time() - timer_start < 15
+        assert metadata["truncated_reason"] == "deadline"
+        assert chunks == []
+        assert {e["page"] for e in other} - {None} == set(range(1, 21))
+
+        stats = {}
+        with open(tmp_path / "slow.pdf", "rb") as slow:
+            pages = [page async for page in pool.iter_text(slow, deadline=time.time() + 1, stats=stats)]
+        assert stats["truncated"] == "deadline"
+        assert len(pages) <= 1
+    finally:
+        pool.shutdown()
@@ -0,0 +1,15 @@
+from pdf_api.db import async_engine
+from pdf_api.rate_limit import RateLimiter
+
+
+async def test_rate_limiter():
+    limiter = RateLimiter(async_engine, rate=1, burst=3)
+
+    assert [await limiter.acquire("test:a") for _ in range(3)] == [0, 0, 0]
+    assert 0 < await limiter.acquire("test:a") <= 1
+    assert await limiter.acquire("test:b") == 0
+
+    await limiter.charge("test:b", 10)
+    assert 8 < await limiter.acquire("test:b") <= 9
+
+    assert await RateLimiter(async_engine, rate=0, burst=0).acquire("test:a") == 0
@@ -1,4 +1,11 @@
-from pdf_api.utils.pdf_parser import PdfParser
+import time
+import threading
+
+import pytest
+import pikepdf
+
+from pdf_api.utils.pdf_parser import PdfParser, PageRanges, ParseBudget
+from pdf_api.utils.page_fingerprints import page_fingerprints
 
 
 def test_pdf_file_parser():
@@ -10,7 +17,124 @@ def test_pdf_file_parser():
 
     assert text_elems[12670] == {
         "pos": 12672,
+        "page": 380,
         "string": "page 351",
         "font_size": 8,
         "type": "p",
     }
+
+
+def test_pdf_file_parser_engines():
+    test_file_path = "tests/files/ZA7505_cdb.pdf"
+
+    layout_elems, _ = PdfParser(engine="layout").get_text_fp(test_file_path)
+    html_elems, _ = PdfParser(engine="html").get_text_fp(test_file_path)
+
+    assert layout_elems == html_elems
+
+
+def test_pdf_file_parser_page_ranges():
+    parser = PdfParser()
+
+    with open("tests/files/ZA7505_cdb.pdf", "rb") as fin:
+        whole_elems, whole_positions, _ = parser.get_page_range(fin, 0, 30)
+        ranges = [parser.get_page_range(fin, start, start + 10)[:2] for start in (0, 10, 20)]
+
+    assert parser.merge_page_ranges(ranges, 30) == parser.merge_page_ranges([(whole_elems, whole_positions)], 30)
+
+
+def test_benchmark_corpus(tmp_path):
+    from benchmarks.corpus import Shape, generate
+
+    shape = Shape("test", pages=2, fonts=2)
+    generate(shape, tmp_path / "a.pdf")
+    generate(shape, tmp_path / "b.pdf")
+    assert (tmp_path / "a.pdf").read_bytes() == (tmp_path / "b.pdf").read_bytes()
+
+    stats = {}
+    with open(tmp_path / "a.pdf", "rb") as fin:
+        text_elems, _ = PdfParser().get_text(fin, stats)
+    assert text_elems[-1]["string"] == "Page: 1, 2"
+    assert stats["pages"] == 2
+    assert set(stats) == {"pages", "layout_s", "walk_s"}
+
+
+def test_pdf_file_parser_pages():
+    pages = PageRanges.parse("2,5-6,400")
+    assert str(pages) == "2,5-6,400"
+    assert str(PageRanges.parse("3-8", max_pages=5)) == "3-5"
+    with pytest.raises(ValueError):
+        PageRanges.parse("10", max_pages=5)
+
+    for engine in PdfParser.ENGINES:
+        with open("tests/files/ZA7505_cdb.pdf", "rb") as fin:
+            text_elems, _ = PdfParser(engine=engine).get_text(fin, pages=pages)
+        assert {e["page"] for e in text_elems} == {2, 5, 6, None}
+
+
+def test_pdf_file_parser_profiles():
+    pages = PageRanges.parse("1-3")
+    with open("tests/files/ZA7505_cdb.pdf", "rb") as fin:
+        full_elems, _ = PdfParser(profile="full").get_text(fin, pages=pages)
+        fin.seek(0)
+        fast_elems, _ = PdfParser(profile="fast").get_text(fin, pages=pages)
+
+    assert PdfParser(profile="fast").settings != PdfParser(profile="full").settings
+    assert [e["pos"] for e in fast_elems] == list(range(len(fast_elems)))
+    assert {e["page"] for e in fast_elems} == {1, 2, 3}
+    assert {e["type"] for e in fast_elems} == {"p"}
+    assert "Variable Report - Documentation" in {e["string"] for e in fast_elems}
+    assert "Variable Report - Documentation" in {e["string"] for e in full_elems}
+
+
+def test_pdf_file_parser_budget(tmp_path):
+    from benchmarks.corpus import Shape, generate
+
+    generate(Shape("budget", pages=3), tmp_path / "a.pdf")
+    with pikepdf.open(tmp_path / "a.pdf") as pdf:
+        pdf.pages[1].contents_add(pikepdf.Stream(pdf, b"BT /F0 1 Tf " + b"(x) Tj " * 50_000 + b"ET"))
+        pdf.save(tmp_path / "glyphs.pdf")
+
+    for profile in PdfParser.PROFILES:
+        stats = {}
+        with open(tmp_path / "glyphs.pdf", "rb") as fin:
+            elems, _ = PdfParser(profile=profile).get_text(fin, stats, budget=ParseBudget(page_glyphs=20_000))
+        assert stats["truncated"] == "glyphs"
+        assert {e["page"] for e in elems} - {None} == {1}
+
+    with pikepdf.open(tmp_path / "a.pdf") as pdf:
+        pdf.pages[1].contents_add(pikepdf.Stream(pdf, b"q 1 0 0 1 0 0 cm Q " * 400_000))
+        pdf.save(tmp_path / "ops.pdf")
+
+    for profile in PdfParser.PROFILES:
+        stats = {}
+        timer_start = time.time()
+        with open(tmp_path / "ops.pdf", "rb") as fin:
+            elems, _ = PdfParser(profile=profile).get_text(fin, stats, budget=ParseBudget(deadline=time.time() + 1))
+        assert time.time() - timer_start < 5
+        assert stats["truncated"] == "deadline"
+        assert {e["page"] for e in elems} - {None} == {1}
+
+    cancel = threading.Event()
+    cancel.set()
+    for budget, reason in ((ParseBudget(cancel=cancel), "cancelled"), (ParseBudget(deadline=time.time() - 1), "deadline")):
+        stats = {}
+        with open(tmp_path / "a.pdf", "rb") as fin:
+            elems, _ = PdfParser().get_text(fin, stats, budget=budget)
+        assert stats["truncated"] == reason
+        assert stats.get("pages", 0) == 0
+
+
+def test_page_fingerprints(tmp_path):
+    with pikepdf.open("tests/files/ZA7505_cdb.pdf") as pdf:
+        pdf.pages[2].contents_add(pikepdf.Stream(pdf, b"BT /F1 12 Tf 72 72 Td (edited) Tj ET"))
+        del pdf.pages[0]
+        pdf.save(tmp_path / "revised.pdf")
+
+    with open("tests/files/ZA7505_cdb.pdf", "rb") as fin:
+        original = page_fingerprints(fin)
+    with open(tmp_path / "revised.pdf", "rb") as fin:
+        revised = page_fingerprints(fin)
+
+    assert len(set(original)) == len(original) == 380
+    assert [n for n, fingerprint in enumerate(revised) if fingerprint != original[n + 1]] == [1]